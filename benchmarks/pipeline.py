@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Benchmark del pipeline del generador: cargar_values, validar_values,
+generar_manifiesto, validar_manifiesto_k8s y guardar_manifiesto sobre
+flotas sinteticas, con tiempos y memoria pico por etapa
+
+    python -m benchmarks.pipeline run --apps 1,100,10000 -o actual.json
+    python -m benchmarks.pipeline compare base.json actual.json
+
+benchmarks/baseline.json es la base que compara el CI (ver README)
+"""
+import argparse
+import contextlib
+import glob
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from src import manifest_generator, output_writer, yaml_io
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUB_KUBECTL = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "stub")
+ETAPAS = ("cargar_values", "validar_values", "generar_manifiesto",
+          "validar_manifiesto_k8s", "guardar_manifiesto")
+VERSION_FORMATO = 1
+
+# Template grande: un deployment con muchas variables de entorno, un
+# configmap y anotaciones, para medir el render de templates con bucles
+TEMPLATE_GRANDE = """\
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: {{app_name}}-deployment
+  labels:
+    app: {{app_name}}
+  annotations:
+{% for clave, valor in anotaciones.items() %}
+    {{clave}}: "{{valor}}"
+{% endfor %}
+spec:
+  replicas: {{replicas}}
+  selector:
+    matchLabels:
+      app: {{app_name}}
+  template:
+    metadata:
+      labels:
+        app: {{app_name}}
+    spec:
+      containers:
+      - name: {{app_name}}
+        image: {{image}}
+        ports:
+        - containerPort: {{container_port}}
+        env:
+{% for variable in entorno %}
+        - name: {{variable.nombre}}
+          value: "{{variable.valor}}"
+{% endfor %}
+---
+apiVersion: v1
+kind: ConfigMap
+metadata:
+  name: {{app_name}}-config
+data:
+{% for clave, valor in configuracion.items() %}
+  {{clave}}: "{{valor}}"
+{% endfor %}
+"""
+
+
+def values_app(numero, grande=False):
+    """
+    Values sinteticos y deterministas de la app numero
+    """
+    values = {
+        "app_name": f"app-{numero}",
+        "protocol": "TCP",
+        "image": f"registry/app-{numero}:1.{numero % 10}",
+        "replicas": 1 + numero % 5,
+        "container_port": 8000 + numero % 1000,
+        "service_port": 80,
+    }
+    if grande:
+        values["anotaciones"] = {f"equipo/clave-{i}": f"valor-{i}"
+                                 for i in range(20)}
+        values["entorno"] = [{"nombre": f"VARIABLE_{i}",
+                              "valor": f"{numero}-{i}"}
+                             for i in range(100)]
+        values["configuracion"] = {f"clave_{i}": "x" * 40
+                                   for i in range(100)}
+    return values
+
+
+def templates_escenario(tamano):
+    if tamano == "grande":
+        return [("deployment", TEMPLATE_GRANDE)]
+    return [
+        (os.path.basename(ruta)[:-len(".yaml.template")],
+         manifest_generator.cargar_template(ruta))
+        for ruta in sorted(glob.glob(os.path.join(RAIZ, "templates",
+                                                  "*.template")))
+    ]
+
+
+class Etapas:
+    """
+    Acumula el mejor tiempo de cada etapa entre varias pasadas; con
+    memoria=True mide en cambio el pico de memoria de tracemalloc
+    """
+
+    def __init__(self, memoria=False):
+        self.memoria = memoria
+        self.resultados = {}
+
+    @contextlib.contextmanager
+    def medir(self, etapa, llamadas):
+        if self.memoria:
+            tracemalloc.start()
+        inicio = time.perf_counter()
+        # Los prints de las funciones no deben llegar a la terminal
+        with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+            yield
+        segundos = time.perf_counter() - inicio
+        resultado = self.resultados.setdefault(etapa, {})
+        if self.memoria:
+            resultado["pico_kb"] = round(
+                tracemalloc.get_traced_memory()[1] / 1024, 1
+            )
+            tracemalloc.stop()
+        elif segundos < resultado.get("segundos", float("inf")):
+            resultado.update({
+                "llamadas": llamadas,
+                "segundos": round(segundos, 6),
+                "por_llamada_ms": round(segundos * 1000 / max(llamadas, 1),
+                                        4),
+            })
+
+
+def ejecutar_pasada(directorio, cantidad_apps, templates, etapas,
+                    muestra_kubectl, pasada=0):
+    """
+    Corre todas las etapas sobre los values de directorio, escribiendo en
+    un output nuevo en cada pasada
+    """
+    rutas = [os.path.join(directorio, "values", f"app-{numero}.yaml")
+             for numero in range(cantidad_apps)]
+    # cargar_values mide el parseo: sin el cache de values parseados las
+    # pasadas 2..N no leerian de memoria
+    yaml_io.limpiar_cache()
+    with etapas.medir("cargar_values", len(rutas)):
+        todos = [manifest_generator.cargar_values(ruta) for ruta in rutas]
+    with etapas.medir("validar_values", len(todos)):
+        for values in todos:
+            manifest_generator.validar_values(values)
+    renderizados = []
+    with etapas.medir("generar_manifiesto", len(todos) * len(templates)):
+        for values in todos:
+            for nombre, contenido in templates:
+                renderizados.append((
+                    os.path.join(directorio, f"output-{pasada}",
+                                 values["app_name"], f"{nombre}.yaml"),
+                    manifest_generator.generar_manifiesto(contenido, values)
+                ))
+    # Un proceso por manifiesto: se mide sobre una muestra
+    muestra = renderizados[:muestra_kubectl]
+    with etapas.medir("validar_manifiesto_k8s", len(muestra)):
+        for ruta, manifiesto in muestra:
+            manifest_generator.validar_manifiesto_k8s(manifiesto, ruta)
+    escritor = output_writer.EscritorManifiestos()
+    with etapas.medir("guardar_manifiesto", len(renderizados)):
+        for ruta, manifiesto in renderizados:
+            manifest_generator.guardar_manifiesto(manifiesto, ruta, escritor)
+
+
+def ejecutar_escenario(cantidad_apps, tamano, muestra_kubectl=200,
+                       memoria=True, repeticiones=3):
+    """
+    Crea una flota sintetica en un directorio temporal y mide cada etapa
+    con el mejor de varias pasadas. La memoria se mide en una pasada
+    aparte para que tracemalloc no altere los tiempos
+    """
+    templates = templates_escenario(tamano)
+    with tempfile.TemporaryDirectory(prefix="bench-") as directorio:
+        os.makedirs(os.path.join(directorio, "values"))
+        for numero in range(cantidad_apps):
+            ruta = os.path.join(directorio, "values", f"app-{numero}.yaml")
+            with open(ruta, 'w') as f:
+                yaml_io.volcar(values_app(numero, tamano == "grande"), f)
+        etapas = Etapas()
+        for pasada in range(max(1, repeticiones)):
+            ejecutar_pasada(directorio, cantidad_apps, templates, etapas,
+                            muestra_kubectl, pasada)
+        if memoria:
+            etapas.memoria = True
+            ejecutar_pasada(directorio, cantidad_apps, templates, etapas,
+                            muestra_kubectl, "memoria")
+    return {"apps": cantidad_apps, "template": tamano,
+            "etapas": etapas.resultados}
+
+
+def calibrar(repeticiones=5):
+    """
+    ms de una carga fija de CPU que no usa codigo del proyecto (json y
+    ordenar con la stdlib): compare la usa para escalar la base a la
+    velocidad de la maquina actual
+    """
+    datos = [{"nombre": f"clave-{i}", "valor": "x" * (i % 50), "orden": -i}
+             for i in range(2000)]
+    mejor = float("inf")
+    for _ in range(max(1, repeticiones)):
+        inicio = time.perf_counter()
+        for _ in range(10):
+            copia = json.loads(json.dumps(datos))
+            copia.sort(key=lambda d: (d["orden"], d["nombre"]))
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return round(mejor * 1000, 3)
+
+
+@contextlib.contextmanager
+def kubectl_falso():
+    """
+    Pone el kubectl falso primero en el PATH, para tiempos deterministas
+    """
+    path = os.environ.get("PATH", "")
+    os.environ["PATH"] = STUB_KUBECTL + os.pathsep + path
+    try:
+        yield
+    finally:
+        os.environ["PATH"] = path
+
+
+def ejecutar_suite(flotas, tamanos, muestra_kubectl=200, memoria=True,
+                   repeticiones=3, progreso=None):
+    resultados = {}
+    with kubectl_falso():
+        for cantidad_apps in flotas:
+            for tamano in tamanos:
+                escenario = f"{cantidad_apps}-{tamano}"
+                if progreso:
+                    progreso(escenario)
+                resultados[escenario] = ejecutar_escenario(
+                    cantidad_apps, tamano, muestra_kubectl, memoria,
+                    repeticiones
+                )
+    return {
+        "formato": VERSION_FORMATO,
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "generador": manifest_generator.VERSION_GENERADOR,
+        "repeticiones": repeticiones,
+        "calibracion_ms": calibrar(),
+        "resultados": resultados,
+    }
+
+
+def comparar(base, actual, umbral=20.0, minimo_ms=0.01, etapas=ETAPAS):
+    """
+    Compara el tiempo por llamada de cada (escenario, etapa). Devuelve
+    filas (escenario, etapa, base_ms, actual_ms, cambio %, regresion);
+    las etapas de menos de minimo_ms se ignoran por ruido. Si los dos
+    resultados traen calibracion_ms, la base se escala a la velocidad de
+    la maquina actual
+    """
+    filas = []
+    factor = factor_calibracion(base, actual)
+    for escenario, resultado in sorted(actual["resultados"].items()):
+        anterior = base["resultados"].get(escenario)
+        if anterior is None:
+            continue
+        for etapa in etapas:
+            nuevo = resultado["etapas"].get(etapa)
+            viejo = anterior["etapas"].get(etapa)
+            if not nuevo or not viejo:
+                continue
+            ms_base = round(viejo["por_llamada_ms"] * factor, 4)
+            ms_actual = nuevo["por_llamada_ms"]
+            if max(ms_base, ms_actual) < minimo_ms:
+                continue
+            cambio = (ms_actual - ms_base) * 100 / max(ms_base, 1e-9)
+            filas.append((escenario, etapa, ms_base, ms_actual, cambio,
+                          cambio > umbral))
+    return filas
+
+
+def factor_calibracion(base, actual):
+    if base.get("calibracion_ms") and actual.get("calibracion_ms"):
+        return actual["calibracion_ms"] / base["calibracion_ms"]
+    return 1.0
+
+
+def imprimir_tabla(encabezados, filas):
+    anchos = [max(len(str(valor)) for valor in columna)
+              for columna in zip(encabezados, *filas)]
+    for fila in [encabezados] + filas:
+        print("   ".join(str(valor).ljust(ancho)
+                         for valor, ancho in zip(fila, anchos)).rstrip())
+
+
+def mostrar_suite(resultado):
+    filas = []
+    for escenario, datos in resultado["resultados"].items():
+        for etapa in ETAPAS:
+            etapa_datos = datos["etapas"].get(etapa, {})
+            filas.append((escenario, etapa, etapa_datos.get("llamadas", "-"),
+                          f"{etapa_datos.get('segundos', 0):.3f}",
+                          f"{etapa_datos.get('por_llamada_ms', 0):.3f}",
+                          etapa_datos.get("pico_kb", "-")))
+    imprimir_tabla(("ESCENARIO", "ETAPA", "LLAMADAS", "SEGUNDOS",
+                    "MS/LLAMADA", "PICO-KB"), filas)
+
+
+def leer_lista(texto, tipo=str):
+    return [tipo(valor) for valor in texto.split(",") if valor]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark del pipeline generar/validar/escribir"
+    )
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    run = comandos.add_parser("run", help="Correr la suite")
+    run.add_argument('--apps', default='1,100,10000',
+                     help='Tamaños de flota (default: 1,100,10000)')
+    run.add_argument('--templates', default='pequeno,grande',
+                     help='Templates: pequeno (los de templates/) y/o '
+                          'grande (default: pequeno,grande)')
+    run.add_argument('--kubectl-sample', type=int, default=200,
+                     help='Manifiestos validados con kubectl por '
+                          'escenario (default: 200)')
+    run.add_argument('--repeat', type=int, default=3,
+                     help='Pasadas por escenario, se guarda la mejor '
+                          '(default: 3)')
+    run.add_argument('--no-memory', action='store_true',
+                     help='No medir la memoria pico (una pasada menos)')
+    run.add_argument('--output', '-o',
+                     help='Archivo JSON de resultados (default: stdout)')
+    compare = comandos.add_parser(
+        "compare", help="Comparar contra una base y fallar si hay "
+                        "regresiones"
+    )
+    compare.add_argument('base', help='JSON de la base')
+    compare.add_argument('actual', help='JSON de la ejecucion actual')
+    compare.add_argument('--threshold', type=float, default=20.0,
+                         help='Regresion maxima permitida en %% por etapa '
+                              '(default: 20)')
+    compare.add_argument('--min-ms', type=float, default=0.01,
+                         help='Ignorar etapas de menos de estos ms por '
+                              'llamada (default: 0.01)')
+    compare.add_argument('--etapas', default=",".join(ETAPAS),
+                         help='Etapas a comparar, separadas por comas '
+                              '(default: todas)')
+    args = parser.parse_args(argv)
+
+    if args.comando == "run":
+        tamanos = leer_lista(args.templates)
+        if set(tamanos) - {"pequeno", "grande"}:
+            parser.error("--templates acepta pequeno y grande")
+        resultado = ejecutar_suite(
+            leer_lista(args.apps, int), tamanos, args.kubectl_sample,
+            not args.no_memory, args.repeat,
+            progreso=lambda e: print(f"Escenario {e}...", file=sys.stderr)
+        )
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(resultado, f, indent=2, sort_keys=True)
+            mostrar_suite(resultado)
+            print(f"Resultados guardados en {args.output}")
+        else:
+            json.dump(resultado, sys.stdout, indent=2, sort_keys=True)
+            print()
+        return 0
+
+    etapas = leer_lista(args.etapas)
+    if set(etapas) - set(ETAPAS):
+        parser.error(f"--etapas acepta {', '.join(ETAPAS)}")
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.actual) as f:
+        actual = json.load(f)
+    filas = comparar(base, actual, args.threshold, args.min_ms, etapas)
+    factor = factor_calibracion(base, actual)
+    if factor != 1.0:
+        print(f"Base escalada x{factor:.2f} segun la calibracion de CPU")
+    if not filas:
+        print("No hay escenarios en comun para comparar")
+        return 1
+    imprimir_tabla(
+        ("ESCENARIO", "ETAPA", "BASE-MS", "ACTUAL-MS", "CAMBIO", ""),
+        [(escenario, etapa, f"{ms_base:.3f}", f"{ms_actual:.3f}",
+          f"{cambio:+.1f}%", "REGRESION" if regresion else "")
+         for escenario, etapa, ms_base, ms_actual, cambio, regresion
+         in filas]
+    )
+    regresiones = sum(1 for fila in filas if fila[-1])
+    if regresiones:
+        print(f"{regresiones} etapas empeoraron mas de {args.threshold}%")
+        return 1
+    print("Sin regresiones")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la lectura de values: yaml.safe_load de Python puro contra
+el parser de libyaml de yaml_io y contra el cache de values parseados
+
+    python -m benchmarks.yaml_parsing --apps 1000 --repeat 3
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import yaml
+
+from benchmarks.pipeline import imprimir_tabla, values_app
+from src import yaml_io
+
+MODOS = ("python", "libyaml", "cache")
+
+
+def escribir_values(directorio, cantidad_apps):
+    rutas = []
+    for numero in range(cantidad_apps):
+        ruta = os.path.join(directorio, f"app-{numero}.yaml")
+        with open(ruta, 'w', encoding='utf-8') as f:
+            yaml_io.volcar(values_app(numero, grande=True), f)
+        rutas.append(ruta)
+    return rutas
+
+
+def leer_python(ruta):
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return yaml.load(f, Loader=yaml.SafeLoader)
+
+
+def leer_libyaml(ruta):
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return yaml_io.cargar(f)
+
+
+def medir(lector, rutas, lecturas, repeticiones):
+    """
+    Mejor tiempo de leer cada archivo lecturas veces
+    """
+    mejor = None
+    for _ in range(repeticiones):
+        yaml_io.limpiar_cache()
+        inicio = time.perf_counter()
+        for _ in range(lecturas):
+            for ruta in rutas:
+                lector(ruta)
+        segundos = time.perf_counter() - inicio
+        mejor = segundos if mejor is None else min(mejor, segundos)
+    return mejor
+
+
+def ejecutar(cantidad_apps=200, lecturas=3, repeticiones=3):
+    """
+    Lee la flota lecturas veces (como el generador mas --validate-only
+    mas un ciclo de watch) con cada modo
+    """
+    lectores = {"python": leer_python, "libyaml": leer_libyaml,
+                "cache": yaml_io.leer_archivo}
+    with tempfile.TemporaryDirectory(prefix="bench-yaml-") as directorio:
+        rutas = escribir_values(directorio, cantidad_apps)
+        segundos = {modo: medir(lectores[modo], rutas, lecturas,
+                                repeticiones)
+                    for modo in MODOS}
+    yaml_io.limpiar_cache()
+    return {
+        "apps": cantidad_apps,
+        "lecturas": lecturas,
+        "libyaml_disponible": yaml_io.CON_LIBYAML,
+        "modos": {modo: {"segundos": round(segundos[modo], 6),
+                         "aceleracion": round(segundos["python"]
+                                              / max(segundos[modo], 1e-9),
+                                              2)}
+                  for modo in MODOS},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark de la lectura de values YAML"
+    )
+    parser.add_argument('--apps', type=int, default=200,
+                        help='Archivos de values (default: 200)')
+    parser.add_argument('--reads', type=int, default=3,
+                        help='Lecturas de cada archivo (default: 3)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Pasadas por modo, se guarda la mejor '
+                             '(default: 3)')
+    parser.add_argument('--json', action='store_true',
+                        help='Mostrar el resultado en JSON')
+    args = parser.parse_args(argv)
+    resultado = ejecutar(args.apps, args.reads, args.repeat)
+    if args.json:
+        json.dump(resultado, sys.stdout, indent=2, sort_keys=True)
+        print()
+        return 0
+    if not resultado["libyaml_disponible"]:
+        print("PyYAML no tiene libyaml: libyaml usa el parser de Python")
+    imprimir_tabla(("MODO", "SEGUNDOS", "ACELERACION"),
+                   [(modo, f"{datos['segundos']:.3f}",
+                     f"{datos['aceleracion']:.1f}x")
+                    for modo, datos in resultado["modos"].items()])
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
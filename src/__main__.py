@@ -0,0 +1,8 @@
+import sys
+
+try:
+    from .cli import main
+except ImportError:
+    from cli import main
+
+sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+Almacen de blobs direccionado por contenido
+Cada archivo se guarda una sola vez bajo el sha256 de su contenido,
+opcionalmente comprimido con gzip
+"""
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+
+TAMANO_BLOQUE = 1024 * 1024
+
+
+def hash_archivo(ruta):
+    """
+    sha256 del contenido de un archivo, leido por bloques
+    """
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(TAMANO_BLOQUE), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def copiar_contenido(origen, destino):
+    """
+    Copia entre dos archivos abiertos con copy_file_range (copia dentro del
+    kernel, sin pasar por Python) y vuelve a una copia normal si no se puede
+    """
+    try:
+        while os.copy_file_range(origen.fileno(), destino.fileno(),
+                                 TAMANO_BLOQUE):
+            pass
+    except (AttributeError, OSError):
+        origen.seek(0)
+        destino.seek(0)
+        destino.truncate()
+        shutil.copyfileobj(origen, destino, TAMANO_BLOQUE)
+
+
+class AlmacenBlobs:
+    """
+    Blobs en <directorio>/<hash[:2]>/<hash>, con sufijo .gz si estan
+    comprimidos
+    """
+
+    def __init__(self, directorio, comprimir=False):
+        self.directorio = directorio
+        self.comprimir = comprimir
+
+    def _ruta(self, suma, comprimido):
+        nombre = f"{suma}.gz" if comprimido else suma
+        return os.path.join(self.directorio, suma[:2], nombre)
+
+    def ubicar(self, suma):
+        """
+        Ruta del blob guardado y si esta comprimido, o (None, None)
+        """
+        for comprimido in (False, True):
+            ruta = self._ruta(suma, comprimido)
+            if os.path.exists(ruta):
+                return ruta, comprimido
+        return None, None
+
+    def existe(self, suma):
+        return self.ubicar(suma)[0] is not None
+
+    def _escribir(self, suma, escribir):
+        """
+        Escribe un blob nuevo de forma atomica; con escrituras concurrentes
+        del mismo contenido gana cualquiera, el resultado es el mismo
+        """
+        ruta = self._ruta(suma, self.comprimir)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta),
+                                                suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, 'wb') as f:
+                if self.comprimir:
+                    with gzip.GzipFile(fileobj=f, mode='wb', mtime=0) as gz:
+                        escribir(gz)
+                else:
+                    escribir(f)
+            os.replace(temporal, ruta)
+        except BaseException:
+            os.unlink(temporal)
+            raise
+
+    def guardar_archivo(self, ruta_origen):
+        """
+        Guarda un archivo en el almacen si no estaba y devuelve su hash
+        """
+        suma = hash_archivo(ruta_origen)
+        if not self.existe(suma):
+            def escribir(destino):
+                with open(ruta_origen, 'rb') as origen:
+                    shutil.copyfileobj(origen, destino, TAMANO_BLOQUE)
+            self._escribir(suma, escribir)
+        return suma
+
+    def guardar_bytes(self, datos):
+        """
+        Guarda un contenido en el almacen si no estaba y devuelve su hash
+        """
+        suma = hashlib.sha256(datos).hexdigest()
+        if not self.existe(suma):
+            self._escribir(suma, lambda destino: destino.write(datos))
+        return suma
+
+    def abrir(self, suma):
+        """
+        Abre un blob para lectura binaria, descomprimiendo si hace falta
+        """
+        ruta, comprimido = self.ubicar(suma)
+        if ruta is None:
+            raise FileNotFoundError(f"blob {suma} no existe")
+        return gzip.open(ruta, 'rb') if comprimido else open(ruta, 'rb')
+
+    def leer(self, suma):
+        with self.abrir(suma) as f:
+            return f.read()
+
+    def restaurar(self, suma, destino):
+        """
+        Copia un blob a destino de forma atomica
+        No se usan hardlinks: editar el archivo restaurado en su lugar
+        modificaria el blob guardado
+        """
+        directorio = os.path.dirname(os.path.abspath(destino))
+        descriptor, temporal = tempfile.mkstemp(dir=directorio, suffix=".tmp")
+        try:
+            with self.abrir(suma) as origen, os.fdopen(descriptor, 'wb') as f:
+                if isinstance(origen, gzip.GzipFile):
+                    shutil.copyfileobj(origen, f, TAMANO_BLOQUE)
+                else:
+                    copiar_contenido(origen, f)
+            if os.path.exists(destino):
+                shutil.copymode(destino, temporal)
+            else:
+                os.chmod(temporal, 0o644)
+            os.replace(temporal, destino)
+        except BaseException:
+            os.unlink(temporal)
+            raise
@@ -0,0 +1,100 @@
+"""
+Cache incremental de build para el generador de manifiestos
+Guarda el manifiesto renderizado y validado por hash de sus entradas, asi
+los pares template/values sin cambios no se vuelven a renderizar ni validar
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+CACHE_DIR = os.path.join(".manifest-cache", "builds")
+
+
+def calcular_clave(contenido_template, values, *extras):
+    """
+    Hash del contenido del template, los values canonicalizados y los
+    extras (version del generador, validador, etc.)
+    """
+    h = hashlib.sha256()
+    h.update(contenido_template.encode('utf-8'))
+    h.update(b"\0")
+    h.update(json.dumps(values, sort_keys=True, separators=(",", ":"),
+                        default=str).encode('utf-8'))
+    for extra in extras:
+        h.update(b"\0")
+        h.update(str(extra).encode('utf-8'))
+    return h.hexdigest()
+
+
+class CacheBuild:
+    """
+    Cache en disco de manifiestos ya validados, con estadisticas de uso
+    Con memoria (un dict que sobrevive entre builds, como en --watch) las
+    entradas tambien se guardan en memoria y no se releen del disco
+    """
+
+    def __init__(self, directorio=None, habilitado=True, memoria=None):
+        self.directorio = directorio or CACHE_DIR
+        self.habilitado = habilitado
+        self.memoria = memoria
+        self.hits = 0
+        self.misses = 0
+        self.segundos_ahorrados = 0.0
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, clave[:2], f"{clave}.json")
+
+    def obtener(self, clave):
+        """
+        Devuelve el manifiesto guardado para la clave, o None
+        """
+        if not self.habilitado:
+            return None
+        entrada = None
+        if self.memoria is not None:
+            entrada = self.memoria.get(clave)
+        if entrada is None:
+            try:
+                with open(self._ruta(clave), 'r', encoding='utf-8') as f:
+                    entrada = json.load(f)
+            except (OSError, ValueError):
+                self.misses += 1
+                return None
+            if self.memoria is not None:
+                self.memoria[clave] = entrada
+        self.hits += 1
+        self.segundos_ahorrados += entrada.get("segundos", 0.0)
+        return entrada["manifiesto"]
+
+    def guardar(self, clave, manifiesto, segundos):
+        """
+        Guarda un manifiesto valido junto al tiempo que costo producirlo
+        Solo se guardan manifiestos validos: un error de validacion puede
+        depender del entorno (kubectl, cluster) y se vuelve a revisar
+        """
+        if not self.habilitado:
+            return
+        if self.memoria is not None:
+            self.memoria[clave] = {"manifiesto": manifiesto,
+                                   "segundos": segundos}
+        ruta = self._ruta(clave)
+        try:
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            descriptor, temporal = tempfile.mkstemp(
+                dir=os.path.dirname(ruta), suffix=".tmp"
+            )
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as f:
+                json.dump({"manifiesto": manifiesto, "segundos": segundos}, f)
+            os.replace(temporal, ruta)
+        except OSError as e:
+            print(f"Aviso: no se pudo guardar en cache de build ({e})")
+
+    def resumen(self):
+        """
+        Linea con hits, misses y tiempo ahorrado
+        """
+        if not self.habilitado:
+            return "Cache de build: deshabilitado"
+        return (f"Cache de build: {self.hits} hits, {self.misses} misses, "
+                f"~{self.segundos_ahorrados:.2f}s ahorrados")
@@ -1,35 +1,72 @@
 #!/usr/bin/env python3
 import argparse
-import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
+try:
+    from . import cluster_client, fleet_status, progressive_canary
+except ImportError:
+    import cluster_client
+    import fleet_status
+    import progressive_canary
 
-def desplegar_canary(app_name, nueva_imagen):
+
+def nombre_contenedor(imagen):
+    """
+    Nombre del contenedor a partir de la imagen, como kubectl create
+    deployment: "registro/nginx:1.25" -> "nginx"
+    """
+    nombre = imagen.split("@")[0].rsplit("/", 1)[-1]
+    return nombre.split(":")[0]
+
+
+def objetos_canary(app_name, nueva_imagen, dueno=None):
+    """
+    Deployment y service del canary
+    """
+    nombre = f"{app_name}-canary"
+    etiquetas = {"app": nombre}
+    metadata = dict(etiquetas,
+                    **progressive_canary.etiquetas_canary(app_name, dueno))
+    deployment = {
+        "apiVersion": "apps/v1",
+        "kind": "Deployment",
+        "metadata": {"name": nombre, "labels": dict(metadata)},
+        "spec": {
+            "replicas": 1,
+            "selector": {"matchLabels": etiquetas},
+            "template": {
+                "metadata": {"labels": etiquetas},
+                "spec": {"containers": [{
+                    "name": nombre_contenedor(nueva_imagen),
+                    "image": nueva_imagen
+                }]}
+            }
+        }
+    }
+    service = {
+        "apiVersion": "v1",
+        "kind": "Service",
+        "metadata": {"name": f"{nombre}-service", "labels": dict(metadata)},
+        "spec": {
+            "selector": etiquetas,
+            "ports": [{"port": 80, "protocol": "TCP", "targetPort": 80}]
+        }
+    }
+    return deployment, service
+
+
+def desplegar_canary(app_name, nueva_imagen, dueno=None):
     """
     Despliega version canary con nueva imagen
     """
     print(f"Desplegando canary: {nueva_imagen}")
     try:
-        comandos = [
-            (
-                f"kubectl create deployment {app_name}-canary "
-                f"--image={nueva_imagen}"
-            ),
-            (
-                f"kubectl label deployment {app_name}-canary "
-                f"app={app_name}-canary"
-            ),
-            (
-                f"kubectl expose deployment {app_name}-canary --port=80 "
-                f"--name={app_name}-canary-service"
-            )
-        ]
-        for cmd in comandos:
-            result = subprocess.run(
-                cmd.split(), capture_output=True, text=True, check=False
-            )
-            if result.returncode != 0:
-                print(f"Error: {result.stderr.strip()}")
-                return False
+        cliente = cluster_client.obtener_cliente()
+        for objeto in objetos_canary(app_name, nueva_imagen, dueno):
+            cliente.crear(objeto)
         print("Canary desplegado")
         return True
     except Exception as e:
@@ -37,31 +74,34 @@ def desplegar_canary(app_name, nueva_imagen):
         return False
 
 
+def eliminar_objetos_canary(cliente, app_name):
+    cliente.eliminar("deployment", f"{app_name}-canary")
+    cliente.eliminar("service", f"{app_name}-canary-service")
+
+
 def promover_canary(app_name, nueva_imagen):
     """
     Promueve canary a stable
     """
     print("Promoviendo canary a stable")
     try:
-        result = subprocess.run(
-            [
-                "kubectl", "set", "image",
-                f"deployment/{app_name}-deployment",
-                f"{app_name}={nueva_imagen}"
-            ],
-            capture_output=True, text=True, check=False
-        )
-        if result.returncode != 0:
-            print(f"Error: {result.stderr.strip()}")
+        cliente = cluster_client.obtener_cliente()
+        deployment_name = f"{app_name}-deployment"
+        deployment = cliente.obtener("deployment", deployment_name)
+        if deployment is None:
+            print(f'Error: deployment "{deployment_name}" no encontrado')
             return False
-        subprocess.run(
-            ["kubectl", "delete", "deployment", f"{app_name}-canary"],
-            capture_output=True
-        )
-        subprocess.run(
-            ["kubectl", "delete", "service", f"{app_name}-canary-service"],
-            capture_output=True
-        )
+        contenedores = deployment["spec"]["template"]["spec"]["containers"]
+        if not any(c.get("name") == app_name for c in contenedores):
+            print(f"Error: el deployment no tiene un contenedor {app_name}")
+            return False
+        # Merge patch estrategico: solo cambia la imagen de ese contenedor
+        cliente.parchear("deployment", deployment_name, {
+            "spec": {"template": {"spec": {"containers": [
+                {"name": app_name, "image": nueva_imagen}
+            ]}}}
+        })
+        eliminar_objetos_canary(cliente, app_name)
         print("Canary promovido")
         return True
     except Exception as e:
@@ -75,14 +115,7 @@ def limpiar_canary(app_name):
     """
     print("Eliminando canary")
     try:
-        subprocess.run(
-            ["kubectl", "delete", "deployment", f"{app_name}-canary"],
-            capture_output=True
-        )
-        subprocess.run(
-            ["kubectl", "delete", "service", f"{app_name}-canary-service"],
-            capture_output=True
-        )
+        eliminar_objetos_canary(cluster_client.obtener_cliente(), app_name)
         print("Canary eliminado")
         return True
     except Exception as e:
@@ -93,31 +126,263 @@ def limpiar_canary(app_name):
 def ver_estado(app_name):
     """
     Muestra estado de version STABLE y CANARY
+    Devuelve False si no se pudo consultar alguno de los dos
     """
+    cliente = cluster_client.obtener_cliente()
     print(f"Estado de {app_name}")
-    print()
-    print("STABLE")
-    subprocess.run(
-        ["kubectl", "get", "deployment", f"{app_name}-deployment"],
-        capture_output=False
+    ok = True
+    for titulo, nombre in (("STABLE", f"{app_name}-deployment"),
+                           ("CANARY", f"{app_name}-canary")):
+        print()
+        print(titulo)
+        try:
+            deployment = cliente.obtener("deployment", nombre)
+        except (cluster_client.ErrorCluster, OSError) as e:
+            print(f"Error: {e}")
+            ok = False
+            continue
+        cluster_client.imprimir_objetos(
+            "deployment", [deployment] if deployment else []
+        )
+    return ok
+
+
+def mostrar_estado_flota(estado):
+    if sys.stdout.isatty():
+        # Se redibuja la tabla en el mismo lugar de la terminal
+        print("\033[H\033[J", end="")
+    filas = estado.filas()
+    if not filas:
+        print("No se encontraron deployments stable ni canary")
+    else:
+        cluster_client.imprimir_tabla(fleet_status.ENCABEZADOS, filas)
+    print(f"\nActualizado {time.strftime('%H:%M:%S')} "
+          f"(resourceVersion {estado.version})", flush=True)
+
+
+def ver_estado_flota(apps=None, vigilar=False, duracion=None):
+    """
+    Estado de stable y canary de todas las apps (o de las indicadas) con
+    un solo listado; con vigilar se actualiza con watch hasta Ctrl+C
+    """
+    cliente = cluster_client.obtener_cliente()
+    estado = fleet_status.EstadoFlota(apps)
+    try:
+        estado.cargar(cliente)
+        mostrar_estado_flota(estado)
+        if vigilar:
+            fleet_status.vigilar(cliente, estado, mostrar_estado_flota,
+                                 duracion)
+    except cluster_client.ErrorCluster as e:
+        print(f"Error: {e}")
+        return False
+    except KeyboardInterrupt:
+        pass
+    return True
+
+
+def canary_progresivo(apps, nueva_imagen, pasos, espera, gate, intervalo,
+                      timeout_paso, dueno=None):
+    """
+    Canary progresivo de una o varias apps, avanzadas en paralelo por el
+    planificador de eventos
+    """
+    print(f"Canary progresivo de {len(apps)} apps a {nueva_imagen}: pasos "
+          f"{'/'.join(str(paso) for paso in pasos)}%, {espera}s por paso")
+    canaries = progressive_canary.ejecutar_canaries(
+        cluster_client.obtener_cliente(), apps, nueva_imagen, pasos, espera,
+        gate, intervalo, timeout_paso, dueno=dueno
     )
-    print()
-    print("CANARY")
-    subprocess.run(
-        ["kubectl", "get", "deployment", f"{app_name}-canary"],
-        capture_output=False
+    mostrar_resultados_canary(canaries)
+    return all(canary.resultado == "completado" for canary in canaries)
+
+
+def mostrar_resultados_canary(canaries):
+    cluster_client.imprimir_tabla(
+        ("APP", "RESULTADO", "PASO", "DURACION", "DETALLE"),
+        [(canary.app, canary.resultado, f"{canary.pasos[canary.paso]}%",
+          f"{canary.segundos:.1f}s", canary.detalle) for canary in canaries]
+    )
+
+
+TIPOS_CANARY = ("deployment", "service")
+
+
+def canaries_viejos(cliente, antiguedad, dueno=None, ahora=None):
+    """
+    Objetos canary de todos los namespaces con mas de `antiguedad`
+    segundos, con un solo listado por etiqueta para cada tipo. Devuelve
+    una lista de (tipo, objeto, edad)
+    """
+    selector = f"{progressive_canary.ETIQUETA_CANARY}=true"
+    if dueno:
+        selector += f",{progressive_canary.ETIQUETA_DUENO}={dueno}"
+    viejos = []
+    for tipo in TIPOS_CANARY:
+        for objeto in cliente.listar(tipo, selector=selector,
+                                     todos_namespaces=True):
+            segundos = cluster_client.edad(objeto, ahora)
+            if segundos is not None and segundos >= antiguedad:
+                viejos.append((tipo, objeto, segundos))
+    return viejos
+
+
+def lotes_eliminacion(viejos, tamano_lote):
+    """
+    Agrupa los objetos por (tipo, namespace) en lotes de hasta
+    tamano_lote nombres
+    """
+    grupos = defaultdict(list)
+    for tipo, objeto, _ in viejos:
+        metadata = objeto["metadata"]
+        grupos[(tipo, metadata.get("namespace"))].append(metadata["name"])
+    return [(tipo, namespace, nombres[inicio:inicio + tamano_lote])
+            for (tipo, namespace), nombres in sorted(
+                grupos.items(), key=lambda grupo: (grupo[0][0],
+                                                   grupo[0][1] or ""))
+            for inicio in range(0, len(nombres), tamano_lote)]
+
+
+def selector_lote(apps):
+    """
+    Selector de etiquetas que elige los canaries de esas apps: como hay
+    uno por app, tipo y namespace, elige justo los objetos del lote.
+    None si a alguno le falta la etiqueta de app o se repite
+    """
+    if not apps or None in apps or len(set(apps)) != len(apps):
+        return None
+    return (f"{progressive_canary.ETIQUETA_CANARY}=true,"
+            f"{progressive_canary.ETIQUETA_APP} in ({','.join(sorted(apps))})")
+
+
+def recolectar_canaries(cliente, antiguedad, dueno=None, jobs=4,
+                        tamano_lote=50, simulacion=False, ahora=None):
+    """
+    Elimina los canaries abandonados: un listado por tipo, filtro por edad
+    y dueño, y eliminacion por lotes con a lo sumo `jobs` lotes en
+    paralelo. Devuelve (viejos, eliminados, errores)
+    """
+    viejos = canaries_viejos(cliente, antiguedad, dueno, ahora)
+    if simulacion or not viejos:
+        return viejos, 0, []
+    lotes = lotes_eliminacion(viejos, tamano_lote)
+    apps = {(tipo, objeto["metadata"].get("namespace"),
+             objeto["metadata"]["name"]):
+            (objeto["metadata"].get("labels") or {}).get(
+                progressive_canary.ETIQUETA_APP)
+            for tipo, objeto, _ in viejos}
+
+    def eliminar(lote):
+        tipo, namespace, nombres = lote
+        selector = selector_lote([apps[(tipo, namespace, nombre)]
+                                  for nombre in nombres])
+        try:
+            return cliente.eliminar_lote(tipo, nombres, namespace,
+                                         selector), None
+        except cluster_client.ErrorCluster as e:
+            return 0, f"{tipo} en {namespace}: {e}"
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        resultados = list(executor.map(eliminar, lotes))
+    return (viejos, sum(eliminados for eliminados, _ in resultados),
+            [error for _, error in resultados if error])
+
+
+def _fila_canary(tipo, objeto, segundos):
+    metadata = objeto["metadata"]
+    etiquetas = metadata.get("labels") or {}
+    return (tipo, metadata.get("namespace", ""), metadata["name"],
+            etiquetas.get(progressive_canary.ETIQUETA_APP, ""),
+            cluster_client.formatear_edad(segundos),
+            etiquetas.get(progressive_canary.ETIQUETA_DUENO, ""))
+
+
+def mostrar_canaries_viejos(viejos):
+    cluster_client.imprimir_tabla(
+        ("KIND", "NAMESPACE", "NAME", "APP", "AGE", "OWNER"),
+        [_fila_canary(*viejo) for viejo in viejos]
     )
 
 
-def main():
+def limpiar_canaries_viejos(antiguedad, dueno=None, jobs=4, tamano_lote=50,
+                            simulacion=False):
+    """
+    Recolector de canaries abandonados por pipelines fallidos
+    """
+    try:
+        viejos, eliminados, errores = recolectar_canaries(
+            cluster_client.obtener_cliente(), antiguedad, dueno, jobs,
+            tamano_lote, simulacion
+        )
+    except cluster_client.ErrorCluster as e:
+        print(f"Error: {e}")
+        return False
+    if not viejos:
+        print("No hay canaries para eliminar")
+        return True
+    mostrar_canaries_viejos(viejos)
+    por_tipo = Counter(tipo for tipo, _, _ in viejos)
+    detalle = ", ".join(f"{cantidad} {tipo}"
+                        for tipo, cantidad in sorted(por_tipo.items()))
+    if simulacion:
+        print(f"{len(viejos)} objetos canary se eliminarian ({detalle})")
+        return True
+    for error in errores:
+        print(f"Error: {error}")
+    print(f"{eliminados} objetos canary eliminados ({detalle})")
+    return not errores
+
+
+def leer_duracion(texto):
+    """
+    Duracion como 90s, 30m, 2h o 1d, en segundos
+    """
+    unidades = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    texto = texto.strip()
+    if texto[-1:] in unidades:
+        return float(texto[:-1]) * unidades[texto[-1]]
+    return float(texto)
+
+
+def simular_canaries(cantidad_apps, pasos, espera):
+    """
+    Simula el canary progresivo de muchas apps contra un cluster en
+    memoria, con reloj virtual, y muestra el rendimiento del planificador
+    """
+    canaries, planificador, segundos = progressive_canary.simular(
+        cantidad_apps, pasos, espera
+    )
+    completados = sum(1 for canary in canaries
+                      if canary.resultado == "completado")
+    print(f"Simulacion: {completados} de {cantidad_apps} canaries "
+          f"completados en {planificador.reloj():.0f}s simulados")
+    print(f"{planificador.ejecuciones} eventos en {segundos:.2f}s reales "
+          f"({planificador.ejecuciones / max(segundos, 1e-9):.0f} "
+          f"eventos/s)")
+    return completados == cantidad_apps
+
+
+def leer_pasos(texto):
+    """
+    Pasos de peso separados por comas, crecientes y terminando en 100
+    """
+    pasos = [int(paso) for paso in texto.split(",")]
+    if (any(not 0 < paso <= 100 for paso in pasos) or pasos != sorted(pasos)
+            or pasos[-1] != 100):
+        raise ValueError("los pasos deben ser crecientes, entre 1 y 100 y "
+                         "terminar en 100")
+    return pasos
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(
         description="Gestor de canary releases"
     )
     parser.add_argument(
         '--app',
         metavar='APP_NAME',
-        required=True,
-        help='Nombre de la app'
+        nargs='+',
+        help='Nombre de la app (o varias)'
     )
     parser.add_argument(
         '--deploy',
@@ -139,21 +404,142 @@ def main():
         action='store_true',
         help='Ver estado de canary y stable'
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        '--fleet',
+        action='store_true',
+        help='Tabla de stable y canary de todas las apps (o las de --app) '
+             'con un solo listado'
+    )
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='Con --fleet, actualizar la tabla con los cambios del cluster'
+    )
+    parser.add_argument(
+        '--progressive',
+        metavar='IMAGEN',
+        help='Canary progresivo: mover el trafico al canary por pasos y '
+             'promoverlo al final'
+    )
+    parser.add_argument(
+        '--steps',
+        default='10,25,50,100',
+        help='Pesos del canary en %% por paso (default: 10,25,50,100)'
+    )
+    parser.add_argument(
+        '--dwell',
+        type=float,
+        default=60,
+        help='Segundos en cada paso antes del control de salud '
+             '(default: 60)'
+    )
+    parser.add_argument(
+        '--gate',
+        default='listo',
+        help='Control de salud entre pasos: listo, ninguno o '
+             'modulo:funcion (default: listo)'
+    )
+    parser.add_argument(
+        '--step-timeout',
+        type=float,
+        default=300,
+        help='Segundos maximos esperando el control de salud de un paso '
+             '(default: 300)'
+    )
+    parser.add_argument(
+        '--interval',
+        type=float,
+        default=5,
+        help='Segundos entre consultas del control de salud (default: 5)'
+    )
+    parser.add_argument(
+        '--simulate',
+        metavar='N_APPS',
+        type=int,
+        help='Simular el canary progresivo de N apps contra un cluster en '
+             'memoria'
+    )
+    parser.add_argument(
+        '--owner',
+        help='Dueño de los canaries (etiqueta manifest-generator/owner, '
+             'default: $USER); con --gc limita la limpieza a ese dueño'
+    )
+    parser.add_argument(
+        '--gc',
+        action='store_true',
+        help='Eliminar los canaries abandonados de todas las apps y '
+             'namespaces'
+    )
+    parser.add_argument(
+        '--older-than',
+        default='24h',
+        help='Con --gc, antiguedad minima de los canaries a eliminar '
+             '(p.ej. 30m, 2h, 1d; default: 24h)'
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Con --gc, solo mostrar lo que se eliminaria'
+    )
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=4,
+        help='Con --gc, lotes de eliminacion en paralelo (default: 4)'
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=50,
+        help='Con --gc, objetos por lote de eliminacion (default: 50)'
+    )
+    args = parser.parse_args(argv)
+    if args.gc:
+        try:
+            antiguedad = leer_duracion(args.older_than)
+        except ValueError:
+            print(f"Error: duracion invalida: {args.older_than}")
+            return 1
+        dueno = progressive_canary.dueno_actual(args.owner) \
+            if args.owner else None
+        return 0 if limpiar_canaries_viejos(
+            antiguedad, dueno, args.jobs, args.batch_size, args.dry_run
+        ) else 1
+    if args.fleet:
+        return 0 if ver_estado_flota(args.app, args.watch) else 1
+    if args.progressive or args.simulate:
+        try:
+            pasos = leer_pasos(args.steps)
+            gate = progressive_canary.cargar_gate(args.gate)
+        except (ValueError, ImportError, AttributeError) as e:
+            print(f"Error: {e}")
+            return 1
+    if args.simulate:
+        return 0 if simular_canaries(args.simulate, pasos, args.dwell) else 1
+    if not args.app:
+        parser.error("--app es requerido")
+    if args.progressive:
+        if not canary_progresivo(args.app, args.progressive, pasos,
+                                 args.dwell, gate, args.interval,
+                                 args.step_timeout, args.owner):
+            return 1
+        return 0
     if args.deploy:
-        if not desplegar_canary(args.app, args.deploy):
+        if not all([desplegar_canary(app, args.deploy, args.owner)
+                    for app in args.app]):
             return 1
         return 0
     if args.promote:
-        if not promover_canary(args.app, args.promote):
+        if not all([promover_canary(app, args.promote) for app in args.app]):
             return 1
         return 0
     if args.clean:
-        if not limpiar_canary(args.app):
+        if not all([limpiar_canary(app) for app in args.app]):
             return 1
         return 0
     if args.status:
-        ver_estado(args.app)
+        if not all([ver_estado(app) for app in args.app]):
+            return 1
         return 0
     return 1
 
@@ -2,43 +2,179 @@
 Sistema simple de versionado para templates de Kubernetes
 Permite guardar y recuperar versiones de templates existentes
 """
+import difflib
 import os
 import json
+import shutil
+import sqlite3
 import sys
+import time
+
+try:
+    from .blob_store import AlmacenBlobs, copiar_contenido, hash_archivo
+except ImportError:
+    from blob_store import AlmacenBlobs, copiar_contenido, hash_archivo
 
 TEMPLATE_DIR = "templates"
 VERSIONS_DIR = "templates_versions"
 INDEX_FILE = os.path.join(VERSIONS_DIR, "index.json")
+INDEX_DB = os.path.join(VERSIONS_DIR, "index.db")
+BLOBS_DIR = os.path.join(VERSIONS_DIR, "blobs")
+SNAPSHOTS_DIR = os.path.join(VERSIONS_DIR, "snapshots")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS versions (
+    version TEXT PRIMARY KEY,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    version TEXT NOT NULL REFERENCES versions(version),
+    filename TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    PRIMARY KEY (version, filename)
+);
+CREATE INDEX IF NOT EXISTS files_by_filename ON files(filename, version);
+"""
 
 
-def save_all_templates(version):
+def connect():
     """
-    Guardar todo los templatees y values en version especifica
+    Abre el index SQLite de versiones
+    WAL + busy timeout: varios jobs de CI pueden guardar versiones en
+    paralelo, las escrituras se serializan en vez de pisarse
     """
-    version_dir = os.path.join(VERSIONS_DIR, version)
-    os.makedirs(version_dir, exist_ok=True)
+    os.makedirs(VERSIONS_DIR, exist_ok=True)
+    conn = sqlite3.connect(INDEX_DB, timeout=60, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    migrate_legacy(conn)
+    return conn
 
-    saved = False
-    for filename in os.listdir(TEMPLATE_DIR):
-        if filename.endswith((".template", ".yaml")):
-            src_path = os.path.join(TEMPLATE_DIR, filename)
-            dest_path = os.path.join(version_dir, filename)
 
-            with open(src_path, 'r') as src, open(dest_path, 'w') as dest:
-                dest.write(src.read())
+def migrate_legacy(conn):
+    """
+    Importa al index las versiones de index.json: snapshots de blobs y
+    copias completas en templates_versions/<version>/
+    """
+    if (not os.path.exists(INDEX_FILE) or
+            conn.execute("SELECT 1 FROM versions LIMIT 1").fetchone()):
+        return
+    # Se vuelve a comprobar con el lock tomado por si otro proceso migro
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if conn.execute("SELECT 1 FROM versions LIMIT 1").fetchone():
+            conn.execute("COMMIT")
+            return
+        with open(INDEX_FILE, 'r') as f:
+            index = json.load(f)
+        versions = sorted({v for vs in index.values() for v in vs})
+        store = AlmacenBlobs(BLOBS_DIR)
+        for version in versions:
+            snapshot = os.path.join(SNAPSHOTS_DIR, f"{version}.json")
+            version_dir = os.path.join(VERSIONS_DIR, version)
+            if os.path.exists(snapshot):
+                with open(snapshot, 'r') as f:
+                    files = json.load(f)
+            elif os.path.isdir(version_dir):
+                files = {
+                    filename: store.guardar_archivo(
+                        os.path.join(version_dir, filename)
+                    )
+                    for filename in os.listdir(version_dir)
+                }
+            else:
+                continue
+            insert_version(conn, version, {
+                filename: (file_hash, blob_size(store, file_hash), 0.0)
+                for filename, file_hash in files.items()
+            })
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
 
-            update_index(filename, version)
-            saved = True
+def blob_size(store, file_hash):
+    with store.abrir(file_hash) as f:
+        return len(f.read())
+
+
+def insert_version(conn, version, files):
+    """
+    Registra (o reemplaza) una version: files es nombre -> (hash, size,
+    mtime). Se llama dentro de una transaccion
+    """
+    conn.execute("DELETE FROM files WHERE version = ?", (version,))
+    conn.execute("INSERT OR REPLACE INTO versions VALUES (?, ?)",
+                 (version, time.time()))
+    conn.executemany(
+        "INSERT INTO files VALUES (?, ?, ?, ?, ?)",
+        [(version, filename, file_hash, size, mtime)
+         for filename, (file_hash, size, mtime) in files.items()]
+    )
+
+
+def version_files(conn, version):
+    """
+    nombre -> hash de los archivos de una version, o None si no existe
+    """
+    if not conn.execute("SELECT 1 FROM versions WHERE version = ?",
+                        (version,)).fetchone():
+        return None
+    return dict(conn.execute(
+        "SELECT filename, hash FROM files WHERE version = ?", (version,)
+    ))
+
+
+def save_all_templates(version, compress=False):
+    """
+    Guardar todo los templatees y values en version especifica
+    Cada archivo se guarda una sola vez en el almacen de blobs por su
+    contenido, la version solo registra nombre -> hash en el index
+    """
+    store = AlmacenBlobs(BLOBS_DIR, comprimir=compress)
+    files = {}
+    for filename in sorted(os.listdir(TEMPLATE_DIR)):
+        if filename.endswith((".template", ".yaml")):
+            src_path = os.path.join(TEMPLATE_DIR, filename)
+            stat = os.stat(src_path)
+            files[filename] = (store.guardar_archivo(src_path),
+                               stat.st_size, stat.st_mtime)
             print(f"Guardado: {filename} en version {version}")
 
-    if not saved:
+    if not files:
         print("No se encontro ningun archivo .template y .yaml en templates/")
+        return
+
+    # Los blobs ya estan escritos: la transaccion solo toca el index
+    conn = connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        insert_version(conn, version, files)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
 
 
 def load_all_templates(version):
     """
     Restaura todos los templates y values desde una version
     """
+    conn = connect()
+    try:
+        files = version_files(conn, version)
+    finally:
+        conn.close()
+    if files is not None:
+        load_snapshot(version, files)
+        return
+
+    # Versiones antiguas: copia completa en templates_versions/<version>/
     version_dir = os.path.join(VERSIONS_DIR, version)
     if not os.path.exists(version_dir):
         print(f"Version {version} no existe")
@@ -50,7 +186,7 @@ def load_all_templates(version):
         dest_path = os.path.join(TEMPLATE_DIR, filename)
 
         with open(src_path, 'rb') as src, open(dest_path, 'wb') as dst:
-            dst.write(src.read())
+            copiar_contenido(src, dst)
 
         restored = True
         print(f"Restaurado: {filename} desde version {version}")
@@ -59,57 +195,152 @@ def load_all_templates(version):
         print(f"No hay archivos en la version {version}")
 
 
-def list_template_versions():
+def load_snapshot(version, files):
+    """
+    Restaura una version desde el almacen de blobs, sin tocar los archivos
+    que ya tienen el mismo contenido
+    """
+    store = AlmacenBlobs(BLOBS_DIR)
+    for filename, file_hash in sorted(files.items()):
+        dest_path = os.path.join(TEMPLATE_DIR, filename)
+        if os.path.exists(dest_path) and hash_archivo(dest_path) == file_hash:
+            print(f"Sin cambios: {filename} en version {version}")
+            continue
+        store.restaurar(file_hash, dest_path)
+        print(f"Restaurado: {filename} desde version {version}")
+
+
+def list_template_versions(filename=None):
     """
-    Lista todas las versiones guardadas
+    Lista todas las versiones guardadas, o las de un archivo con su hash,
+    tamaño y fecha
     """
-    if not os.path.exists(INDEX_FILE):
+    conn = connect()
+    try:
+        if filename:
+            rows = conn.execute(
+                "SELECT f.version, f.hash, f.size, v.created_at "
+                "FROM files f JOIN versions v USING (version) "
+                "WHERE f.filename = ? ORDER BY v.created_at", (filename,)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT filename, group_concat(version, ', ') FROM "
+                "(SELECT filename, version FROM files "
+                "ORDER BY filename, version) GROUP BY filename"
+            ).fetchall()
+    finally:
+        conn.close()
+
+    if not rows:
         print("No hay versiones guardadas")
         return
 
-    with open(INDEX_FILE, 'r') as f:
-        index = json.load(f)
+    if filename:
+        print(f"Versiones de {filename}:")
+        for version, file_hash, size, created_at in rows:
+            fecha = time.strftime("%Y-%m-%d %H:%M:%S",
+                                  time.localtime(created_at))
+            print(f"  {version}  {file_hash[:12]}  {size} bytes  {fecha}")
+        return
 
     print("Versiones disponibles:")
-    for filename, versions in index.items():
-        print(f"  {filename}: {', '.join(sorted(versions))}")
+    for name, versions in rows:
+        print(f"  {name}: {versions}")
 
 
-def update_index(filename, version):
+def show_file(version, filename):
     """
-    Actualizar los index de versiones en el index.json
+    Escribe en stdout un archivo de una version, leido desde el almacen
     """
-    if os.path.exists(INDEX_FILE):
-        with open(INDEX_FILE, 'r') as f:
-            index = json.load(f)
-    else:
-        index = {}
+    conn = connect()
+    try:
+        row = conn.execute(
+            "SELECT hash FROM files WHERE version = ? AND filename = ?",
+            (version, filename)
+        ).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        print(f"{filename} no existe en la version {version}")
+        return False
+    sys.stdout.flush()
+    with AlmacenBlobs(BLOBS_DIR).abrir(row[0]) as blob:
+        shutil.copyfileobj(blob, sys.stdout.buffer)
+    sys.stdout.buffer.flush()
+    return True
 
-    if filename not in index:
-        index[filename] = []
 
-    if version not in index[filename]:
-        index[filename].append(version)
+def diff_versions(version_a, version_b):
+    """
+    Muestra las diferencias entre dos versiones
+    Primero se comparan los hashes, solo los archivos que cambiaron se leen
+    del almacen para calcular el diff
+    """
+    conn = connect()
+    try:
+        files_a = version_files(conn, version_a)
+        files_b = version_files(conn, version_b)
+    finally:
+        conn.close()
+    for version, files in ((version_a, files_a), (version_b, files_b)):
+        if files is None:
+            print(f"Version {version} no existe")
+            return False
 
-    with open(INDEX_FILE, 'w') as f:
-        json.dump(index, f, indent=2)
+    store = AlmacenBlobs(BLOBS_DIR)
+    unchanged = 0
+    for filename in sorted(set(files_a) | set(files_b)):
+        hash_a = files_a.get(filename)
+        hash_b = files_b.get(filename)
+        if hash_a == hash_b:
+            unchanged += 1
+            continue
+        lines_a = (store.leer(hash_a).decode('utf-8').splitlines(True)
+                   if hash_a else [])
+        lines_b = (store.leer(hash_b).decode('utf-8').splitlines(True)
+                   if hash_b else [])
+        sys.stdout.writelines(difflib.unified_diff(
+            lines_a, lines_b,
+            fromfile=f"{version_a}/{filename}" if hash_a else "/dev/null",
+            tofile=f"{version_b}/{filename}" if hash_b else "/dev/null"
+        ))
+    print(f"{unchanged} archivos sin cambios")
+    return True
 
 
-if __name__ == "__main__":
+def main(argv=None):
     """
     Uso:
-       python3 src/chart_versions.py save-all <version>
-       python3 src/chart_versions.py load-all <version>
-       python3 src/chart_versions.py list
+       python3 src/chart_version.py save-all <version> [--compress]
+       python3 src/chart_version.py load-all <version>
+       python3 src/chart_version.py list [--file <archivo>]
+       python3 src/chart_version.py show <version> <archivo>
+       python3 src/chart_version.py diff <version1> <version2>
     """
+    args = sys.argv[1:] if argv is None else argv
+    command = args[0] if args else None
 
-    command = sys.argv[1]
-
-    if command == "save-all" and len(sys.argv) == 3:
-        save_all_templates(sys.argv[2])
-    elif command == "load-all" and len(sys.argv) == 3:
-        load_all_templates(sys.argv[2])
-    elif command == "list":
+    if command == "save-all" and len(args) == 2:
+        save_all_templates(args[1])
+    elif command == "save-all" and len(args) == 3 and args[2] == "--compress":
+        save_all_templates(args[1], compress=True)
+    elif command == "load-all" and len(args) == 2:
+        load_all_templates(args[1])
+    elif command == "list" and len(args) == 1:
         list_template_versions()
+    elif command == "list" and len(args) == 3 and args[1] == "--file":
+        list_template_versions(args[2])
+    elif command == "show" and len(args) == 3:
+        return 0 if show_file(args[1], args[2]) else 1
+    elif command == "diff" and len(args) == 3:
+        return 0 if diff_versions(args[1], args[2]) else 1
     else:
         print("Comando invalido")
+        print(main.__doc__)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,64 @@
+"""
+Checksums de contenido para los objetos generados
+Cada objeto lleva una anotacion con el hash de su contenido, asi el
+despliegue puede omitir los objetos que no cambiaron en el cluster
+"""
+import copy
+import hashlib
+import json
+
+try:
+    from . import yaml_io
+except ImportError:
+    import yaml_io
+
+ANOTACION_CHECKSUM = "manifest-generator/checksum"
+
+
+def calcular_checksum(objeto):
+    """
+    sha256 del objeto canonicalizado, sin contar la propia anotacion
+    """
+    anotaciones = (objeto.get("metadata") or {}).get("annotations") or {}
+    if ANOTACION_CHECKSUM in anotaciones:
+        objeto = copy.deepcopy(objeto)
+        del objeto["metadata"]["annotations"][ANOTACION_CHECKSUM]
+        if not objeto["metadata"]["annotations"]:
+            del objeto["metadata"]["annotations"]
+    contenido = json.dumps(objeto, sort_keys=True, separators=(",", ":"),
+                           default=str)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def checksum_objeto(objeto):
+    """
+    Devuelve la anotacion de checksum de un objeto, o None si no la tiene
+    """
+    metadata = objeto.get("metadata") or {}
+    return (metadata.get("annotations") or {}).get(ANOTACION_CHECKSUM)
+
+
+def anotar_objeto(objeto):
+    """
+    Agrega al objeto la anotacion con su checksum
+    """
+    suma = calcular_checksum(objeto)
+    metadata = objeto.setdefault("metadata", {})
+    if metadata.get("annotations") is None:
+        metadata["annotations"] = {}
+    metadata["annotations"][ANOTACION_CHECKSUM] = suma
+    return objeto
+
+
+def anotar_manifiesto(contenido_manifiesto):
+    """
+    Agrega la anotacion de checksum a cada objeto de un manifiesto
+    """
+    documentos = [documento
+                  for documento in yaml_io.cargar_todos(contenido_manifiesto)
+                  if documento is not None]
+    for documento in documentos:
+        if isinstance(documento, dict):
+            anotar_objeto(documento)
+    return yaml_io.volcar_todos(documentos, sort_keys=False,
+                                default_flow_style=False)
@@ -0,0 +1,64 @@
+"""
+Punto de entrada unico del proyecto:
+
+    python -m src render -t templates/*.template -v values.yaml -o output
+    python -m src version list
+    python -m src rollback --history web
+    python -m src canary --app web --status
+
+Cada subcomando importa su modulo recien al ejecutarse, asi --help y los
+subcomandos que no renderizan no cargan jinja2 ni jsonschema
+"""
+import importlib
+import sys
+
+PROG = "python -m src"
+# subcomando -> (modulo, descripcion)
+SUBCOMANDOS = {
+    "render": ("manifest_generator",
+               "Generar y desplegar manifiestos desde templates y values"),
+    "version": ("chart_version", "Guardar, listar y comparar versiones de "
+                                 "los templates"),
+    "rollback": ("rollback_manager", "Historial y rollback de deployments"),
+    "canary": ("canary_manager", "Despliegues canary y estado de la flota"),
+}
+
+
+def ayuda():
+    lineas = [f"uso: {PROG} <subcomando> [opciones]", "",
+              "Generador de manifiestos de kubernetes", "", "subcomandos:"]
+    ancho = max(len(nombre) for nombre in SUBCOMANDOS)
+    for nombre, (_, descripcion) in SUBCOMANDOS.items():
+        lineas.append(f"  {nombre.ljust(ancho)}   {descripcion}")
+    lineas += ["", f"{PROG} <subcomando> --help muestra sus opciones"]
+    return "\n".join(lineas)
+
+
+def importar(modulo):
+    """
+    Importa el modulo del subcomando como parte del paquete src o, si se
+    corre como script, desde el directorio src
+    """
+    if __package__:
+        return importlib.import_module(f"{__package__}.{modulo}")
+    return importlib.import_module(modulo)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ("-h", "--help"):
+        print(ayuda())
+        return 0 if argv else 2
+    comando, *resto = argv
+    if comando not in SUBCOMANDOS:
+        print(f"Error: subcomando desconocido {comando}\n", file=sys.stderr)
+        print(ayuda(), file=sys.stderr)
+        return 2
+    modulo = importar(SUBCOMANDOS[comando][0])
+    # argparse toma el nombre del programa de sys.argv[0]
+    programa = sys.argv[0]
+    sys.argv[0] = f"{PROG} {comando}"
+    try:
+        return modulo.main(resto)
+    finally:
+        sys.argv[0] = programa
@@ -0,0 +1,1249 @@
+"""
+Cliente del cluster compartido por el generador, el rollback y el canary
+El backend por defecto habla con la API de Kubernetes por HTTP con una
+sesion persistente (pool de conexiones keep-alive), kubectl queda como
+respaldo y un backend en memoria sirve como cluster falso
+"""
+import atexit
+import base64
+import calendar
+import contextlib
+import hashlib
+import json
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from urllib.parse import urlencode
+
+import yaml
+
+try:
+    from . import yaml_io
+except ImportError:
+    import yaml_io
+
+FIELD_MANAGER = "manifest-generator"
+ANOTACION_REVISION = "deployment.kubernetes.io/revision"
+ANOTACION_CAUSA = "kubernetes.io/change-cause"
+ETIQUETA_HASH_TEMPLATE = "pod-template-hash"
+VARIABLE_BACKEND = "MANIFEST_CLUSTER_BACKEND"
+SERVICEACCOUNT_DIR = "/var/run/secrets/kubernetes.io/serviceaccount"
+
+# tipo -> (apiVersion, recurso en la API, si vive en un namespace)
+# Los tipos que no estan aca se descubren consultando la API
+RECURSOS = {
+    "deployment": ("apps/v1", "deployments", True),
+    "replicaset": ("apps/v1", "replicasets", True),
+    "statefulset": ("apps/v1", "statefulsets", True),
+    "daemonset": ("apps/v1", "daemonsets", True),
+    "service": ("v1", "services", True),
+    "pod": ("v1", "pods", True),
+    "configmap": ("v1", "configmaps", True),
+    "secret": ("v1", "secrets", True),
+    "serviceaccount": ("v1", "serviceaccounts", True),
+    "persistentvolumeclaim": ("v1", "persistentvolumeclaims", True),
+    "namespace": ("v1", "namespaces", False),
+    "ingress": ("networking.k8s.io/v1", "ingresses", True),
+    "horizontalpodautoscaler": ("autoscaling/v2", "horizontalpodautoscalers",
+                                True),
+    "job": ("batch/v1", "jobs", True),
+    "cronjob": ("batch/v1", "cronjobs", True),
+}
+
+
+class ErrorCluster(Exception):
+    """
+    Error devuelto por el cluster, con el codigo HTTP si se conoce
+    """
+
+    def __init__(self, mensaje, codigo=None):
+        super().__init__(mensaje)
+        self.codigo = codigo
+
+
+def clave_objeto(objeto):
+    """
+    (namespace, tipo, nombre) de un objeto de Kubernetes
+    """
+    metadata = objeto.get("metadata") or {}
+    return (metadata.get("namespace"), str(objeto.get("kind", "")).lower(),
+            metadata.get("name"))
+
+
+def revision(objeto):
+    """
+    Revision de rollout de un deployment o replicaset, 0 si no tiene
+    """
+    anotaciones = (objeto.get("metadata") or {}).get("annotations") or {}
+    return int(anotaciones.get(ANOTACION_REVISION, 0))
+
+
+def coincide_selector(etiquetas, selector):
+    """
+    Evalua un selector de etiquetas simple: k=v, k!=v, k, !k, k in (a,b)
+    y k notin (a,b) separados por comas
+    """
+    etiquetas = etiquetas or {}
+    for requisito in re.findall(r"[^,(]+(?:\([^)]*\))?", selector or ""):
+        requisito = requisito.strip()
+        if not requisito:
+            continue
+        conjunto = re.fullmatch(r"(\S+)\s+(in|notin)\s*\((.*)\)", requisito)
+        if conjunto:
+            clave, operador, valores = conjunto.groups()
+            dentro = etiquetas.get(clave) in {
+                valor.strip() for valor in valores.split(",")
+            }
+            if dentro != (operador == "in"):
+                return False
+        elif "!=" in requisito:
+            clave, valor = requisito.split("!=", 1)
+            if etiquetas.get(clave.strip()) == valor.strip():
+                return False
+        elif "=" in requisito:
+            clave, valor = requisito.split("=", 1)
+            if etiquetas.get(clave.strip()) != valor.lstrip("=").strip():
+                return False
+        elif requisito.startswith("!"):
+            if requisito[1:].strip() in etiquetas:
+                return False
+        elif requisito not in etiquetas:
+            return False
+    return True
+
+
+def ruta_recurso(recurso, namespace=None, nombre=None):
+    """
+    Ruta de la API para un recurso (apiVersion, plural, con namespace);
+    sin namespace es la ruta de todo el cluster
+    """
+    api_version, plural, con_namespace = recurso
+    ruta = "/api/v1" if api_version == "v1" else f"/apis/{api_version}"
+    if con_namespace and namespace:
+        ruta += f"/namespaces/{namespace}"
+    ruta += f"/{plural}"
+    return f"{ruta}/{nombre}" if nombre else ruta
+
+
+def items_lista(lista):
+    """
+    Items de una lista de la API con su kind y apiVersion, que la API no
+    incluye en cada item
+    """
+    kind = lista.get("kind", "")[:-len("List")]
+    for item in lista.get("items", []):
+        item.setdefault("kind", kind)
+        item.setdefault("apiVersion", lista.get("apiVersion"))
+    return lista.get("items", [])
+
+
+def parametros_watch(version, selector=None, timeout=30):
+    parametros = {"watch": "1", "resourceVersion": version,
+                  "timeoutSeconds": str(max(1, int(timeout))),
+                  "allowWatchBookmarks": "true"}
+    if selector:
+        parametros["labelSelector"] = selector
+    return parametros
+
+
+def evento_watch(linea):
+    """
+    (tipo de evento, objeto) de una linea del stream de un watch
+    """
+    evento = json.loads(linea)
+    objeto = evento.get("object") or {}
+    if evento.get("type") == "ERROR":
+        raise ErrorCluster(objeto.get("message") or "error en el watch",
+                           objeto.get("code"))
+    return evento["type"], objeto
+
+
+def copia_profunda(valor):
+    """
+    Copia profunda de datos como los de un manifiesto (dicts, listas y
+    escalares), bastante mas rapida que copy.deepcopy
+    """
+    if isinstance(valor, dict):
+        return {clave: copia_profunda(v) for clave, v in valor.items()}
+    if isinstance(valor, list):
+        return [copia_profunda(v) for v in valor]
+    return valor
+
+
+def fusion_estrategica(base, parche):
+    """
+    Merge patch estrategico simplificado: los dicts se fusionan, None borra
+    la clave y las listas de dicts con "name" (containers, ports) se
+    fusionan por nombre
+    """
+    return _fusionar(copia_profunda(base), parche)
+
+
+def _fusionar(base, parche):
+    # base ya es una copia propia: se modifica en el lugar
+    if not isinstance(base, dict) or not isinstance(parche, dict):
+        return copia_profunda(parche)
+    for clave, valor in parche.items():
+        actual = base.get(clave)
+        if valor is None:
+            base.pop(clave, None)
+        elif (isinstance(valor, list) and isinstance(actual, list)
+              and all(isinstance(x, dict) and "name" in x
+                      for x in valor + actual)):
+            nuevos = {x["name"]: x for x in valor}
+            lista = [_fusionar(x, nuevos.pop(x["name"]))
+                     if x["name"] in nuevos else x for x in actual]
+            lista.extend(copia_profunda(list(nuevos.values())))
+            base[clave] = lista
+        else:
+            base[clave] = _fusionar(actual, valor)
+    return base
+
+
+def estado_deployment(deployment):
+    """
+    (listo, mensaje) del rollout de un deployment ya leido, con las mismas
+    condiciones que kubectl rollout status
+    """
+    nombre = deployment["metadata"]["name"]
+    generacion = deployment["metadata"].get("generation", 0)
+    estado = deployment.get("status") or {}
+    if estado.get("observedGeneration", 0) < generacion:
+        return False, "esperando que se observe la nueva especificacion"
+    replicas = (deployment.get("spec") or {}).get("replicas", 1)
+    actualizadas = estado.get("updatedReplicas", 0)
+    if actualizadas < replicas:
+        return False, f"{actualizadas} de {replicas} replicas actualizadas"
+    if estado.get("replicas", 0) > actualizadas:
+        pendientes = estado["replicas"] - actualizadas
+        return False, f"{pendientes} replicas antiguas por terminar"
+    disponibles = estado.get("availableReplicas", 0)
+    if disponibles < actualizadas:
+        return False, (f"{disponibles} de {actualizadas} replicas "
+                       f"actualizadas disponibles")
+    return True, f'deployment "{nombre}" desplegado correctamente'
+
+
+# Plazo (instante de time.monotonic) de las operaciones de cada hilo
+_plazos = threading.local()
+
+
+def segundos_restantes(por_defecto=None):
+    """
+    Segundos que le quedan al plazo del hilo actual (ver
+    BackendCluster.plazo), acotados por por_defecto. Lanza ErrorCluster
+    con codigo 504 si ya vencio
+    """
+    fin = getattr(_plazos, "fin", None)
+    if fin is None:
+        return por_defecto
+    restante = fin - time.monotonic()
+    if restante <= 0:
+        raise ErrorCluster("se vencio el plazo de la operacion", 504)
+    return restante if por_defecto is None else min(por_defecto, restante)
+
+
+class BackendCluster:
+    """
+    Operaciones sobre el cluster que usan las herramientas
+    Los backends implementan las operaciones basicas (obtener, listar,
+    aplicar, crear, reemplazar, parchear, eliminar); el rollout de
+    deployments se arma encima de ellas
+    """
+
+    @contextlib.contextmanager
+    def plazo(self, segundos):
+        """
+        Dentro del contexto, las peticiones y procesos que lanza este hilo
+        fallan con ErrorCluster 504 si no terminan en segundos
+        """
+        anterior = getattr(_plazos, "fin", None)
+        fin = time.monotonic() + segundos
+        _plazos.fin = fin if anterior is None else min(anterior, fin)
+        try:
+            yield
+        finally:
+            _plazos.fin = anterior
+
+    def obtener(self, tipo, nombre, namespace=None):
+        raise NotImplementedError
+
+    def listar(self, tipo, namespace=None, selector=None,
+               todos_namespaces=False):
+        raise NotImplementedError
+
+    def listar_version(self, tipo, namespace=None, selector=None,
+                       todos_namespaces=False):
+        """
+        Como listar, pero devuelve (objetos, resourceVersion de la lista)
+        para seguir los cambios desde ahi con observar()
+        """
+        raise NotImplementedError
+
+    def observar(self, tipo, version, namespace=None, selector=None,
+                 todos_namespaces=False, timeout=30):
+        """
+        Genera los eventos (ADDED, MODIFIED, DELETED o BOOKMARK, objeto)
+        posteriores a version durante a lo sumo timeout segundos. Lanza
+        ErrorCluster con codigo 410 si la version ya no esta disponible y
+        hay que volver a listar
+        """
+        raise NotImplementedError
+
+    def aplicar(self, objetos):
+        """
+        Aplica los objetos y devuelve una linea "tipo/nombre accion" por
+        cada uno
+        """
+        raise NotImplementedError
+
+    def crear(self, objeto):
+        raise NotImplementedError
+
+    def reemplazar(self, objeto):
+        raise NotImplementedError
+
+    def parchear(self, tipo, nombre, parche, namespace=None):
+        raise NotImplementedError
+
+    def eliminar(self, tipo, nombre, namespace=None):
+        """
+        Elimina un objeto, devuelve False si no existia
+        """
+        raise NotImplementedError
+
+    def eliminar_lote(self, tipo, nombres, namespace=None, selector=None):
+        """
+        Elimina varios objetos de un tipo y namespace, devuelve cuantos
+        existian. Si selector elige exactamente esos objetos, los backends
+        que pueden lo usan para eliminarlos con una sola peticion
+        """
+        return sum(1 for nombre in nombres
+                   if self.eliminar(tipo, nombre, namespace))
+
+    def obtener_lote(self, objetos):
+        """
+        Version viva de varios objetos: dict clave_objeto -> objeto, sin
+        los que no existen
+        """
+        vivos = {}
+        for objeto in objetos:
+            namespace, tipo, nombre = clave_objeto(objeto)
+            vivo = self.obtener(tipo, nombre, namespace)
+            if vivo is not None:
+                vivos[(namespace, tipo, nombre)] = vivo
+        return vivos
+
+    def _deployment(self, nombre, namespace=None):
+        deployment = self.obtener("deployment", nombre, namespace)
+        if deployment is None:
+            raise ErrorCluster(f'deployment "{nombre}" no encontrado', 404)
+        return deployment
+
+    def replicasets_deployment(self, deployment):
+        """
+        ReplicaSets de un deployment, de la revision mas nueva a la mas
+        vieja
+        """
+        metadata = deployment["metadata"]
+        etiquetas = ((deployment.get("spec") or {}).get("selector") or {}
+                     ).get("matchLabels") or {}
+        selector = ",".join(f"{k}={v}" for k, v in etiquetas.items())
+        propios = [
+            rs for rs in self.listar("replicaset", metadata.get("namespace"),
+                                     selector)
+            if any(ref.get("uid") == metadata.get("uid")
+                   for ref in rs["metadata"].get("ownerReferences") or [])
+        ]
+        return sorted(propios, key=revision, reverse=True)
+
+    def historial_rollout(self, nombre, namespace=None):
+        """
+        Lista de (revision, causa del cambio) de un deployment
+        """
+        deployment = self._deployment(nombre, namespace)
+        return sorted(
+            (revision(rs), (rs["metadata"].get("annotations") or {}
+                            ).get(ANOTACION_CAUSA))
+            for rs in self.replicasets_deployment(deployment)
+            if revision(rs)
+        )
+
+    def deshacer_rollout(self, nombre, namespace=None, revision_destino=None):
+        """
+        Vuelve el deployment al template de una revision anterior, como
+        kubectl rollout undo. Devuelve un mensaje con el resultado
+        """
+        deployment = self._deployment(nombre, namespace)
+        actual = revision(deployment)
+        replicasets = self.replicasets_deployment(deployment)
+        if revision_destino:
+            candidatos = [rs for rs in replicasets
+                          if revision(rs) == revision_destino]
+        else:
+            candidatos = [rs for rs in replicasets
+                          if revision(rs) and revision(rs) != actual]
+        if not candidatos:
+            if revision_destino:
+                raise ErrorCluster(
+                    f"no se encontro la revision {revision_destino}", 404
+                )
+            raise ErrorCluster("no hay una revision anterior", 404)
+        destino = candidatos[0]
+        template = copia_profunda(destino["spec"]["template"])
+        (template.get("metadata") or {}).get("labels", {}).pop(
+            ETIQUETA_HASH_TEMPLATE, None
+        )
+        deployment["spec"]["template"] = template
+        # Se manda el resourceVersion leido: si otro cambio el deployment
+        # en el medio, la API responde conflicto en vez de pisarlo
+        self.reemplazar(deployment)
+        return (f"deployment.apps/{nombre} revertido a la revision "
+                f"{revision(destino)}")
+
+    def estado_rollout(self, nombre, namespace=None):
+        """
+        (listo, mensaje) del rollout de un deployment
+        """
+        return estado_deployment(self._deployment(nombre, namespace))
+
+    def esperar_rollout(self, nombre, namespace=None, timeout=None,
+                        intervalo=1.0):
+        """
+        Consulta el rollout hasta que termina o vence el timeout (None
+        espera sin limite). Devuelve (listo, mensaje)
+        """
+        limite = None if timeout is None else time.monotonic() + timeout
+        while True:
+            listo, mensaje = self.estado_rollout(nombre, namespace)
+            if listo:
+                return True, mensaje
+            if limite is not None and time.monotonic() >= limite:
+                return False, f"timeout esperando el rollout: {mensaje}"
+            time.sleep(intervalo)
+
+
+class BackendHTTP(BackendCluster):
+    """
+    Habla con la API de Kubernetes con una sesion de requests: las
+    conexiones TLS se reutilizan entre operaciones en vez de lanzar un
+    proceso kubectl por cada una
+    """
+
+    def __init__(self, servidor, token=None, ca=None, certificado=None,
+                 verificar=True, namespace="default", conexiones=10,
+                 timeout=30):
+        # requests se importa aca para no cargarlo si se usa kubectl
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.servidor = servidor.rstrip("/")
+        self.namespace = namespace
+        self.timeout = timeout
+        self.sesion = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=conexiones,
+                                pool_maxsize=conexiones)
+        self.sesion.mount("https://", adaptador)
+        self.sesion.mount("http://", adaptador)
+        self.sesion.headers["User-Agent"] = FIELD_MANAGER
+        if token:
+            self.sesion.headers["Authorization"] = f"Bearer {token}"
+        self.sesion.verify = ca if ca else verificar
+        if certificado:
+            self.sesion.cert = certificado
+        self.descubiertos = {}
+
+    @classmethod
+    def desde_entorno(cls):
+        """
+        Configura el backend desde la service account del pod o desde el
+        kubeconfig
+        """
+        host = os.environ.get("KUBERNETES_SERVICE_HOST")
+        token = os.path.join(SERVICEACCOUNT_DIR, "token")
+        if host and os.path.exists(token):
+            puerto = os.environ.get("KUBERNETES_SERVICE_PORT", "443")
+            with open(token) as f, \
+                    open(os.path.join(SERVICEACCOUNT_DIR, "namespace")) as n:
+                return cls(f"https://{host}:{puerto}", token=f.read().strip(),
+                           ca=os.path.join(SERVICEACCOUNT_DIR, "ca.crt"),
+                           namespace=n.read().strip())
+        return cls.desde_kubeconfig()
+
+    @classmethod
+    def desde_kubeconfig(cls, ruta=None, contexto=None):
+        """
+        Configura el backend con el contexto actual del kubeconfig
+        Los usuarios con plugins de autenticacion (exec, auth-provider) no
+        se soportan: para ellos se usa kubectl
+        """
+        rutas = (ruta or os.environ.get("KUBECONFIG")
+                 or os.path.expanduser("~/.kube/config")).split(os.pathsep)
+        ruta = next((r for r in rutas if os.path.exists(r)), None)
+        if ruta is None:
+            raise ErrorCluster("no se encontro un kubeconfig")
+        with open(ruta, 'r') as f:
+            config = yaml_io.cargar(f) or {}
+        nombre_contexto = contexto or config.get("current-context")
+
+        def buscar(seccion, nombre):
+            for entrada in config.get(seccion) or []:
+                if entrada.get("name") == nombre:
+                    return entrada.get(seccion[:-1]) or {}
+            raise ErrorCluster(f"{seccion[:-1]} {nombre} no esta en {ruta}")
+
+        ctx = buscar("contexts", nombre_contexto)
+        cluster = buscar("clusters", ctx.get("cluster"))
+        usuario = buscar("users", ctx.get("user")) if ctx.get("user") else {}
+        if "exec" in usuario or "auth-provider" in usuario:
+            raise ErrorCluster("el kubeconfig usa un plugin de autenticacion")
+        base = os.path.dirname(os.path.abspath(ruta))
+        token = usuario.get("token")
+        if not token and usuario.get("tokenFile"):
+            with open(os.path.join(base, usuario["tokenFile"])) as f:
+                token = f.read().strip()
+        certificado = None
+        cert = _archivo_credencial(usuario, "client-certificate", base)
+        clave = _archivo_credencial(usuario, "client-key", base)
+        if cert and clave:
+            certificado = (cert, clave)
+        return cls(
+            cluster["server"], token=token,
+            ca=_archivo_credencial(cluster, "certificate-authority", base),
+            certificado=certificado,
+            verificar=not cluster.get("insecure-skip-tls-verify", False),
+            namespace=ctx.get("namespace") or "default"
+        )
+
+    def _peticion(self, metodo, ruta, **kwargs):
+        import requests
+
+        kwargs.setdefault("timeout", segundos_restantes(self.timeout))
+        try:
+            respuesta = self.sesion.request(metodo, self.servidor + ruta,
+                                            **kwargs)
+        except requests.Timeout as e:
+            raise ErrorCluster(f"{self.servidor} no respondio a tiempo: {e}",
+                               504)
+        except requests.RequestException as e:
+            # Los errores de conexion llegan a los llamadores como
+            # cualquier otro error del cluster
+            raise ErrorCluster(f"no se pudo conectar con {self.servidor}: "
+                               f"{e}")
+        if respuesta.status_code >= 400:
+            try:
+                mensaje = respuesta.json().get("message")
+            except ValueError:
+                mensaje = None
+            raise ErrorCluster(mensaje or respuesta.text.strip()
+                               or f"HTTP {respuesta.status_code}",
+                               respuesta.status_code)
+        return respuesta
+
+    def _recurso(self, tipo, api_version=None):
+        clave = tipo.lower()
+        conocido = RECURSOS.get(clave)
+        if conocido and api_version in (None, conocido[0]):
+            return conocido
+        if api_version is None:
+            raise ErrorCluster(f"tipo desconocido: {tipo}")
+        if (api_version, clave) not in self.descubiertos:
+            base = ("/api/v1" if api_version == "v1"
+                    else f"/apis/{api_version}")
+            for recurso in self._peticion("GET", base).json().get(
+                    "resources", []):
+                if "/" not in recurso["name"]:
+                    self.descubiertos[(api_version, recurso["kind"].lower())] \
+                        = (api_version, recurso["name"], recurso["namespaced"])
+        if (api_version, clave) not in self.descubiertos:
+            raise ErrorCluster(f"{api_version} no tiene el tipo {tipo}")
+        return self.descubiertos[(api_version, clave)]
+
+    def _ruta(self, tipo, namespace=None, nombre=None, api_version=None,
+              todos_namespaces=False):
+        return ruta_recurso(
+            self._recurso(tipo, api_version),
+            None if todos_namespaces else namespace or self.namespace, nombre
+        )
+
+    def _ruta_objeto(self, objeto, con_nombre=True):
+        namespace, tipo, nombre = clave_objeto(objeto)
+        return self._ruta(objeto.get("kind", ""), namespace,
+                          nombre if con_nombre else None,
+                          objeto.get("apiVersion"))
+
+    def obtener(self, tipo, nombre, namespace=None):
+        try:
+            return self._peticion(
+                "GET", self._ruta(tipo, namespace, nombre)
+            ).json()
+        except ErrorCluster as e:
+            if e.codigo == 404:
+                return None
+            raise
+
+    def obtener_lote(self, objetos):
+        # Un solo LIST por namespace y tipo, filtrado por nombre en memoria;
+        # los grupos de un objeto van con un GET, que trae menos datos
+        grupos = {}
+        for objeto in objetos:
+            clave = clave_objeto(objeto)
+            grupos.setdefault(self._ruta_objeto(objeto, False), {})[
+                clave[2]] = clave
+        vivos = {}
+        for ruta, claves in grupos.items():
+            if len(claves) == 1:
+                (nombre, clave), = claves.items()
+                try:
+                    items = [self._peticion("GET", f"{ruta}/{nombre}").json()]
+                except ErrorCluster as e:
+                    if e.codigo != 404:
+                        raise
+                    items = []
+            else:
+                items = items_lista(self._peticion("GET", ruta).json())
+            for item in items:
+                clave = claves.get(item["metadata"].get("name"))
+                if clave is not None:
+                    vivos[clave] = item
+        return vivos
+
+    def listar(self, tipo, namespace=None, selector=None,
+               todos_namespaces=False):
+        return self.listar_version(tipo, namespace, selector,
+                                   todos_namespaces)[0]
+
+    def listar_version(self, tipo, namespace=None, selector=None,
+                       todos_namespaces=False):
+        params = {"labelSelector": selector} if selector else None
+        lista = self._peticion(
+            "GET", self._ruta(tipo, namespace,
+                              todos_namespaces=todos_namespaces),
+            params=params
+        ).json()
+        return (items_lista(lista),
+                (lista.get("metadata") or {}).get("resourceVersion"))
+
+    def observar(self, tipo, version, namespace=None, selector=None,
+                 todos_namespaces=False, timeout=30):
+        respuesta = self._peticion(
+            "GET", self._ruta(tipo, namespace,
+                              todos_namespaces=todos_namespaces),
+            params=parametros_watch(version, selector, timeout),
+            stream=True, timeout=(self.timeout, timeout + self.timeout)
+        )
+        import requests
+
+        with respuesta:
+            try:
+                for linea in respuesta.iter_lines():
+                    if linea:
+                        yield evento_watch(linea)
+            except requests.RequestException as e:
+                raise ErrorCluster(f"se corto el watch: {e}")
+
+    def aplicar(self, objetos):
+        # Server-side apply: un PATCH por objeto sobre la misma conexion
+        lineas = []
+        for objeto in objetos:
+            respuesta = self._peticion(
+                "PATCH", self._ruta_objeto(objeto),
+                params={"fieldManager": FIELD_MANAGER, "force": "true"},
+                data=json.dumps(objeto),
+                headers={"Content-Type": "application/apply-patch+yaml"}
+            )
+            accion = "created" if respuesta.status_code == 201 else \
+                "configured"
+            _, tipo, nombre = clave_objeto(objeto)
+            lineas.append(f"{tipo}/{nombre} {accion}")
+        return lineas
+
+    def crear(self, objeto):
+        return self._peticion("POST", self._ruta_objeto(objeto, False),
+                              json=objeto).json()
+
+    def reemplazar(self, objeto):
+        return self._peticion("PUT", self._ruta_objeto(objeto),
+                              json=objeto).json()
+
+    def parchear(self, tipo, nombre, parche, namespace=None):
+        return self._peticion(
+            "PATCH", self._ruta(tipo, namespace, nombre),
+            data=json.dumps(parche),
+            headers={"Content-Type": "application/strategic-merge-patch+json"}
+        ).json()
+
+    def eliminar(self, tipo, nombre, namespace=None):
+        try:
+            self._peticion("DELETE", self._ruta(tipo, namespace, nombre),
+                           json={"propagationPolicy": "Background"})
+            return True
+        except ErrorCluster as e:
+            if e.codigo == 404:
+                return False
+            raise
+
+    def eliminar_lote(self, tipo, nombres, namespace=None, selector=None):
+        # Con selector, un solo DELETE sobre la coleccion, que devuelve la
+        # lista de objetos eliminados
+        if not selector:
+            return super().eliminar_lote(tipo, nombres, namespace)
+        lista = self._peticion(
+            "DELETE", self._ruta(tipo, namespace),
+            params={"labelSelector": selector},
+            json={"propagationPolicy": "Background"}
+        ).json()
+        return len(lista.get("items") or [])
+
+
+def _archivo_credencial(seccion, campo, base):
+    """
+    Ruta de un certificado del kubeconfig; los campos *-data se escriben
+    en un archivo temporal que se borra al salir
+    """
+    if seccion.get(f"{campo}-data"):
+        descriptor, ruta = tempfile.mkstemp(prefix="kubeconfig-")
+        with os.fdopen(descriptor, 'wb') as f:
+            f.write(base64.b64decode(seccion[f"{campo}-data"]))
+        atexit.register(os.unlink, ruta)
+        return ruta
+    if seccion.get(campo):
+        return os.path.join(base, seccion[campo])
+    return None
+
+
+class BackendKubectl(BackendCluster):
+    """
+    Respaldo que ejecuta kubectl para cada operacion
+    """
+
+    def _kubectl(self, *args, entrada=None, namespace=None):
+        cmd = ['kubectl', *args]
+        if namespace:
+            cmd += ['-n', namespace]
+        try:
+            resultado = subprocess.run(cmd, input=entrada,
+                                       capture_output=True, text=True,
+                                       timeout=segundos_restantes())
+        except subprocess.TimeoutExpired as e:
+            raise ErrorCluster(f"kubectl no respondio en {e.timeout:.0f}s",
+                               504)
+        except OSError as e:
+            raise ErrorCluster(f"no se pudo ejecutar kubectl: {e}")
+        if resultado.returncode != 0:
+            raise ErrorCluster(resultado.stderr.strip())
+        return resultado.stdout
+
+    def obtener(self, tipo, nombre, namespace=None):
+        salida = self._kubectl('get', f'{tipo.lower()}/{nombre}', '-o',
+                               'json', '--ignore-not-found',
+                               namespace=namespace)
+        return json.loads(salida) if salida.strip() else None
+
+    def obtener_lote(self, objetos):
+        # Un solo kubectl get por namespace
+        por_namespace = {}
+        for objeto in objetos:
+            namespace, tipo, nombre = clave_objeto(objeto)
+            por_namespace.setdefault(namespace, []).append(f"{tipo}/{nombre}")
+        vivos = {}
+        for namespace, recursos in por_namespace.items():
+            salida = self._kubectl('get', *recursos, '-o', 'json',
+                                   '--ignore-not-found', namespace=namespace)
+            if not salida.strip():
+                continue
+            respuesta = json.loads(salida)
+            items = (respuesta.get("items", [])
+                     if respuesta.get("kind") == "List" else [respuesta])
+            for item in items:
+                _, tipo, nombre = clave_objeto(item)
+                vivos[(namespace, tipo, nombre)] = item
+        return vivos
+
+    def listar(self, tipo, namespace=None, selector=None,
+               todos_namespaces=False):
+        args = ['get', tipo.lower(), '-o', 'json']
+        if selector:
+            args += ['-l', selector]
+        if todos_namespaces:
+            args.append('--all-namespaces')
+            namespace = None
+        salida = self._kubectl(*args, namespace=namespace)
+        return json.loads(salida).get("items", []) if salida.strip() else []
+
+    def _ruta_raw(self, tipo, namespace=None, todos_namespaces=False):
+        # Las listas con version y los watch usan kubectl get --raw, que
+        # no dice que namespace usar: se toma el del contexto actual
+        if tipo.lower() not in RECURSOS:
+            raise ErrorCluster(f"tipo desconocido: {tipo}")
+        if not todos_namespaces and not namespace:
+            namespace = self._kubectl(
+                'config', 'view', '--minify',
+                '-o', 'jsonpath={..namespace}'
+            ).strip() or "default"
+        return ruta_recurso(RECURSOS[tipo.lower()],
+                            None if todos_namespaces else namespace)
+
+    def listar_version(self, tipo, namespace=None, selector=None,
+                       todos_namespaces=False):
+        ruta = self._ruta_raw(tipo, namespace, todos_namespaces)
+        if selector:
+            ruta += "?" + urlencode({"labelSelector": selector})
+        lista = json.loads(self._kubectl('get', '--raw', ruta))
+        return (items_lista(lista),
+                (lista.get("metadata") or {}).get("resourceVersion"))
+
+    def observar(self, tipo, version, namespace=None, selector=None,
+                 todos_namespaces=False, timeout=30):
+        ruta = self._ruta_raw(tipo, namespace, todos_namespaces)
+        proceso = subprocess.Popen(
+            ['kubectl', 'get', '--raw', ruta + "?" + urlencode(
+                parametros_watch(version, selector, timeout)
+            )],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+        )
+        try:
+            for linea in proceso.stdout:
+                if linea.strip():
+                    yield evento_watch(linea)
+            if proceso.wait() != 0:
+                raise ErrorCluster(proceso.stderr.read().strip())
+        finally:
+            if proceso.poll() is None:
+                proceso.kill()
+                proceso.wait()
+            proceso.stdout.close()
+            proceso.stderr.close()
+
+    def aplicar(self, objetos):
+        salida = self._kubectl('apply', '-f', '-',
+                               entrada=yaml_io.volcar_todos(
+                                   objetos, sort_keys=False
+                               ))
+        return [linea for linea in salida.splitlines() if linea.strip()]
+
+    def crear(self, objeto):
+        return json.loads(self._kubectl('create', '-f', '-', '-o', 'json',
+                                        entrada=json.dumps(objeto)))
+
+    def reemplazar(self, objeto):
+        return json.loads(self._kubectl('replace', '-f', '-', '-o', 'json',
+                                        entrada=json.dumps(objeto)))
+
+    def parchear(self, tipo, nombre, parche, namespace=None):
+        return json.loads(self._kubectl(
+            'patch', f'{tipo.lower()}/{nombre}', '--type', 'strategic',
+            '-p', json.dumps(parche), '-o', 'json', namespace=namespace
+        ))
+
+    def eliminar(self, tipo, nombre, namespace=None):
+        salida = self._kubectl('delete', f'{tipo.lower()}/{nombre}',
+                               '--ignore-not-found', namespace=namespace)
+        return bool(salida.strip())
+
+    def eliminar_lote(self, tipo, nombres, namespace=None, selector=None):
+        # Un solo kubectl delete para todo el lote
+        salida = self._kubectl('delete', tipo.lower(), *nombres,
+                               '--ignore-not-found', namespace=namespace)
+        return sum(1 for linea in salida.splitlines() if "deleted" in linea)
+
+    def deshacer_rollout(self, nombre, namespace=None, revision_destino=None):
+        args = ['rollout', 'undo', f'deployment/{nombre}']
+        if revision_destino:
+            args.append(f'--to-revision={revision_destino}')
+        return self._kubectl(*args, namespace=namespace).strip()
+
+    def esperar_rollout(self, nombre, namespace=None, timeout=None,
+                        intervalo=1.0):
+        args = ['rollout', 'status', f'deployment/{nombre}']
+        if timeout is not None:
+            args.append(f'--timeout={int(timeout)}s')
+        try:
+            return True, self._kubectl(*args, namespace=namespace).strip()
+        except ErrorCluster as e:
+            return False, str(e)
+
+
+class BackendMemoria(BackendCluster):
+    """
+    Cluster falso en memoria para pruebas y simulaciones
+    Con reconciliar=True imita al controlador de deployments: crea un
+    ReplicaSet por template, lleva las revisiones y marca el rollout como
+    terminado
+    """
+
+    def __init__(self, reconciliar=True, namespace="default",
+                 eventos=1000):
+        self.objetos = {}
+        self.reconciliar = reconciliar
+        self.namespace = namespace
+        self.version = 0
+        self.lock = threading.RLock()
+        self.cambios = threading.Condition(self.lock)
+        # uid del dueño -> claves de sus objetos dependientes (ReplicaSets)
+        self.dependientes = {}
+        # Ultimos eventos para los watch: (version, clave, evento, objeto)
+        self.eventos = deque(maxlen=eventos)
+
+    def _registrar_evento(self, clave, evento, objeto):
+        self.eventos.append((self.version, clave, evento, objeto))
+        self.cambios.notify_all()
+
+    def _clave(self, tipo, nombre, namespace=None):
+        tipo = tipo.lower()
+        con_namespace = RECURSOS.get(tipo, (None, None, True))[2]
+        return ((namespace or self.namespace) if con_namespace else None,
+                tipo, nombre)
+
+    def _clave_de(self, objeto):
+        namespace, tipo, nombre = clave_objeto(objeto)
+        return self._clave(tipo, nombre, namespace)
+
+    def _guardar(self, objeto, anterior=None, copiar=True):
+        namespace, tipo, nombre = self._clave_de(objeto)
+        if copiar:
+            objeto = copia_profunda(objeto)
+        metadata = objeto.setdefault("metadata", {})
+        if namespace:
+            metadata["namespace"] = namespace
+        if tipo in RECURSOS:
+            objeto.setdefault("apiVersion", RECURSOS[tipo][0])
+        if anterior is None:
+            metadata["uid"] = str(uuid.uuid4())
+            metadata["creationTimestamp"] = time.strftime(
+                "%Y-%m-%dT%H:%M:%SZ", time.gmtime()
+            )
+            metadata["generation"] = 1
+        else:
+            viejo = anterior["metadata"]
+            for campo in ("uid", "creationTimestamp", "generation"):
+                metadata[campo] = viejo.get(campo)
+            if objeto.get("spec") != anterior.get("spec"):
+                metadata["generation"] = viejo.get("generation", 0) + 1
+            if "status" in anterior and "status" not in objeto:
+                objeto["status"] = anterior["status"]
+        self.version += 1
+        metadata["resourceVersion"] = str(self.version)
+        self.objetos[(namespace, tipo, nombre)] = objeto
+        for referencia in metadata.get("ownerReferences") or []:
+            self.dependientes.setdefault(referencia.get("uid"), set()).add(
+                (namespace, tipo, nombre)
+            )
+        if tipo == "deployment" and self.reconciliar:
+            self._reconciliar_deployment(objeto)
+        self._registrar_evento((namespace, tipo, nombre),
+                               "ADDED" if anterior is None else "MODIFIED",
+                               objeto)
+        return copia_profunda(self.objetos[(namespace, tipo, nombre)])
+
+    def _reconciliar_deployment(self, deployment):
+        metadata = deployment["metadata"]
+        template = deployment["spec"]["template"]
+        suma = hashlib.sha256(json.dumps(
+            template, sort_keys=True
+        ).encode('utf-8')).hexdigest()[:10]
+        propios = [self.objetos[clave] for clave in
+                   self.dependientes.get(metadata["uid"], ())
+                   if clave[1] == "replicaset"]
+        ultima = max((revision(rs) for rs in propios), default=0)
+        actual = next((rs for rs in propios
+                       if rs["metadata"]["labels"].get(ETIQUETA_HASH_TEMPLATE)
+                       == suma), None)
+        replicas = deployment["spec"].get("replicas", 1)
+        if actual is None:
+            etiquetas = dict((template.get("metadata") or {}).get(
+                "labels") or {}, **{ETIQUETA_HASH_TEMPLATE: suma})
+            plantilla = copia_profunda(template)
+            plantilla.setdefault("metadata", {})["labels"] = etiquetas
+            actual = {
+                "apiVersion": "apps/v1", "kind": "ReplicaSet",
+                "metadata": {
+                    "name": f"{metadata['name']}-{suma}",
+                    "namespace": metadata["namespace"],
+                    "labels": etiquetas,
+                    "annotations": {ANOTACION_REVISION: str(ultima + 1)},
+                    "ownerReferences": [{
+                        "apiVersion": "apps/v1", "kind": "Deployment",
+                        "name": metadata["name"], "uid": metadata["uid"],
+                        "controller": True
+                    }],
+                    "uid": str(uuid.uuid4()),
+                    "creationTimestamp": metadata["creationTimestamp"],
+                },
+                "spec": {"replicas": replicas,
+                         "selector": deployment["spec"].get("selector"),
+                         "template": plantilla},
+            }
+            causa = (metadata.get("annotations") or {}).get(ANOTACION_CAUSA)
+            if causa:
+                actual["metadata"]["annotations"][ANOTACION_CAUSA] = causa
+            self.objetos[self._clave_de(actual)] = actual
+            self.dependientes.setdefault(metadata["uid"], set()).add(
+                self._clave_de(actual)
+            )
+        elif revision(actual) != ultima:
+            actual["metadata"]["annotations"][ANOTACION_REVISION] = \
+                str(ultima + 1)
+        for rs in propios:
+            if rs is not actual:
+                rs["spec"]["replicas"] = 0
+        actual["spec"]["replicas"] = replicas
+        metadata.setdefault("annotations", {})[ANOTACION_REVISION] = \
+            actual["metadata"]["annotations"][ANOTACION_REVISION]
+        deployment["status"] = {
+            "observedGeneration": metadata["generation"],
+            "replicas": replicas, "updatedReplicas": replicas,
+            "readyReplicas": replicas, "availableReplicas": replicas,
+        }
+
+    def obtener(self, tipo, nombre, namespace=None):
+        with self.lock:
+            objeto = self.objetos.get(self._clave(tipo, nombre, namespace))
+            return copia_profunda(objeto)
+
+    def listar(self, tipo, namespace=None, selector=None,
+               todos_namespaces=False):
+        with self.lock:
+            buscado = self._clave(tipo, None, namespace)
+            return [
+                copia_profunda(objeto)
+                for (ns, t, _), objeto in sorted(self.objetos.items(),
+                                                 key=lambda x: x[0][2])
+                if t == buscado[1]
+                and (todos_namespaces or ns == buscado[0])
+                and coincide_selector(
+                    objeto["metadata"].get("labels"), selector
+                )
+            ]
+
+    def listar_version(self, tipo, namespace=None, selector=None,
+                       todos_namespaces=False):
+        with self.lock:
+            return (self.listar(tipo, namespace, selector, todos_namespaces),
+                    str(self.version))
+
+    def observar(self, tipo, version, namespace=None, selector=None,
+                 todos_namespaces=False, timeout=30):
+        buscado = self._clave(tipo, None, namespace)
+        version = int(version or 0)
+        limite = time.monotonic() + timeout
+        while True:
+            with self.cambios:
+                if self.eventos and self.eventos[0][0] > version + 1:
+                    raise ErrorCluster(f"la version {version} ya no esta "
+                                       f"disponible", 410)
+                nuevos = [evento for evento in self.eventos
+                          if evento[0] > version]
+                if not nuevos:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        return
+                    self.cambios.wait(restante)
+                    continue
+                version = nuevos[-1][0]
+                cantidad = len(nuevos)
+                nuevos = [
+                    (evento, copia_profunda(objeto))
+                    for _, (ns, t, _), evento, objeto in nuevos
+                    if t == buscado[1]
+                    and (todos_namespaces or ns == buscado[0])
+                    and coincide_selector(objeto["metadata"].get("labels"),
+                                          selector)
+                ]
+            yield from nuevos
+            if len(nuevos) < cantidad:
+                # Como allowWatchBookmarks: la version avanza aunque los
+                # ultimos cambios no fueran de objetos observados
+                yield "BOOKMARK", {"metadata": {
+                    "resourceVersion": str(version)
+                }}
+
+    def aplicar_objeto(self, objeto):
+        """
+        Aplica un objeto y devuelve (objeto guardado, si se creo)
+        """
+        with self.lock:
+            anterior = self.objetos.get(self._clave_de(objeto))
+            return self._guardar(objeto, anterior), anterior is None
+
+    def aplicar(self, objetos):
+        lineas = []
+        for objeto in objetos:
+            _, creado = self.aplicar_objeto(objeto)
+            _, tipo, nombre = clave_objeto(objeto)
+            lineas.append(f"{tipo}/{nombre} "
+                          f"{'created' if creado else 'configured'}")
+        return lineas
+
+    def crear(self, objeto):
+        with self.lock:
+            if self._clave_de(objeto) in self.objetos:
+                _, tipo, nombre = clave_objeto(objeto)
+                raise ErrorCluster(f'{tipo} "{nombre}" ya existe', 409)
+            return self._guardar(objeto)
+
+    def reemplazar(self, objeto):
+        with self.lock:
+            _, tipo, nombre = clave_objeto(objeto)
+            anterior = self.objetos.get(self._clave_de(objeto))
+            if anterior is None:
+                raise ErrorCluster(f'{tipo} "{nombre}" no encontrado', 404)
+            version = (objeto.get("metadata") or {}).get("resourceVersion")
+            if version and version != anterior["metadata"]["resourceVersion"]:
+                raise ErrorCluster(
+                    f'{tipo} "{nombre}" fue modificado, reintentar', 409
+                )
+            return self._guardar(objeto, anterior)
+
+    def parchear(self, tipo, nombre, parche, namespace=None):
+        with self.lock:
+            anterior = self.objetos.get(self._clave(tipo, nombre, namespace))
+            if anterior is None:
+                raise ErrorCluster(f'{tipo} "{nombre}" no encontrado', 404)
+            return self._guardar(fusion_estrategica(anterior, parche),
+                                 anterior, copiar=False)
+
+    def eliminar(self, tipo, nombre, namespace=None):
+        with self.lock:
+            objeto = self.objetos.pop(self._clave(tipo, nombre, namespace),
+                                      None)
+            if objeto is None:
+                return False
+            self.version += 1
+            self._registrar_evento(self._clave(tipo, nombre, namespace),
+                                   "DELETED", objeto)
+            # Recolector de basura: se borran los objetos que dependen de el
+            pendientes = [objeto["metadata"].get("uid")]
+            while pendientes:
+                for clave in self.dependientes.pop(pendientes.pop(), ()):
+                    dependiente = self.objetos.pop(clave, None)
+                    if dependiente is not None:
+                        pendientes.append(dependiente["metadata"]["uid"])
+            return True
+
+
+def edad(objeto, ahora=None):
+    """
+    Segundos desde el creationTimestamp del objeto, None si no lo tiene
+    """
+    creado = (objeto.get("metadata") or {}).get("creationTimestamp")
+    if not creado:
+        return None
+    creado = calendar.timegm(time.strptime(creado, "%Y-%m-%dT%H:%M:%SZ"))
+    return (time.time() if ahora is None else ahora) - creado
+
+
+def formatear_edad(segundos):
+    """
+    Edad corta como la columna AGE de kubectl: 45s, 12m, 5h, 3d
+    """
+    if segundos is None:
+        return "<unknown>"
+    for unidad, largo in (("d", 86400), ("h", 3600), ("m", 60)):
+        if segundos >= largo:
+            return f"{int(segundos // largo)}{unidad}"
+    return f"{int(max(segundos, 0))}s"
+
+
+def imprimir_tabla(encabezados, filas):
+    """
+    Imprime filas alineadas en columnas, como la salida de kubectl get
+    """
+    filas = [tuple(str(valor) for valor in fila) for fila in filas]
+    anchos = [max(len(str(valor)) for valor in columna)
+              for columna in zip(encabezados, *filas)]
+    for fila in [tuple(encabezados)] + filas:
+        print("   ".join(valor.ljust(ancho)
+                         for valor, ancho in zip(fila, anchos)).rstrip())
+
+
+def _fila_pod(pod):
+    estados = (pod.get("status") or {}).get("containerStatuses") or []
+    listos = sum(1 for estado in estados if estado.get("ready"))
+    contenedores = len((pod.get("spec") or {}).get("containers") or [])
+    return (pod["metadata"]["name"], f"{listos}/{contenedores}",
+            (pod.get("status") or {}).get("phase", "Unknown"),
+            sum(estado.get("restartCount", 0) for estado in estados))
+
+
+def _fila_deployment(deployment):
+    estado = deployment.get("status") or {}
+    replicas = (deployment.get("spec") or {}).get("replicas", 1)
+    return (deployment["metadata"]["name"],
+            f"{estado.get('readyReplicas', 0)}/{replicas}",
+            estado.get("updatedReplicas", 0),
+            estado.get("availableReplicas", 0))
+
+
+def _fila_service(service):
+    spec = service.get("spec") or {}
+    puertos = ",".join(f"{p.get('port')}/{p.get('protocol', 'TCP')}"
+                       for p in spec.get("ports") or [])
+    return (service["metadata"]["name"], spec.get("type", "ClusterIP"),
+            spec.get("clusterIP", "<none>"), puertos or "<none>")
+
+
+TABLAS = {
+    "pod": (("NAME", "READY", "STATUS", "RESTARTS"), _fila_pod),
+    "deployment": (("NAME", "READY", "UP-TO-DATE", "AVAILABLE"),
+                   _fila_deployment),
+    "service": (("NAME", "TYPE", "CLUSTER-IP", "PORT(S)"), _fila_service),
+}
+
+
+def imprimir_objetos(tipo, objetos):
+    """
+    Imprime una tabla de pods, deployments o services
+    """
+    if not objetos:
+        print(f"No se encontraron recursos de tipo {tipo}")
+        return
+    encabezados, fila = TABLAS[tipo]
+    imprimir_tabla(encabezados, [fila(objeto) for objeto in objetos])
+
+
+def crear_backend(nombre=None):
+    """
+    Crea el backend elegido en MANIFEST_CLUSTER_BACKEND: http, kubectl o
+    auto (por defecto), que usa HTTP si el kubeconfig lo permite y si no
+    vuelve a kubectl
+    """
+    nombre = nombre or os.environ.get(VARIABLE_BACKEND, "auto")
+    if nombre == "kubectl":
+        return BackendKubectl()
+    if nombre not in ("http", "auto"):
+        raise ErrorCluster(f"backend de cluster desconocido: {nombre}")
+    try:
+        return BackendHTTP.desde_entorno()
+    except (ErrorCluster, ImportError, OSError, KeyError,
+            yaml.YAMLError) as e:
+        if nombre == "http":
+            raise ErrorCluster(f"no se pudo configurar el backend HTTP: {e}")
+        return BackendKubectl()
+
+
+_cliente = None
+
+
+def obtener_cliente():
+    """
+    Backend compartido por todo el proceso, creado la primera vez que se
+    usa
+    """
+    global _cliente
+    if _cliente is None:
+        _cliente = crear_backend()
+    return _cliente
+
+
+def establecer_cliente(backend):
+    """
+    Reemplaza el backend compartido (None vuelve a elegirlo del entorno)
+    """
+    global _cliente
+    _cliente = backend
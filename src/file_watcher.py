@@ -0,0 +1,228 @@
+"""
+Vigilancia de templates y values para el modo --watch del generador
+En Linux usa inotify (por ctypes, sin dependencias) sobre los
+directorios de las rutas vigiladas; si no esta disponible compara mtime
+y tamaño de los archivos cada cierto intervalo. Las rafagas de cambios
+(un editor que guarda en varios pasos, un git checkout) se juntan en un
+solo ciclo
+"""
+import ctypes
+import ctypes.util
+import fnmatch
+import glob
+import os
+import select
+import struct
+import time
+
+VARIABLE_BACKEND = "MANIFEST_WATCH_BACKEND"
+INTERVALO_POLLING = 0.5
+
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+MASCARA = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+           | IN_CREATE | IN_DELETE)
+# wd, mask, cookie, len de struct inotify_event; le sigue el nombre
+EVENTO = struct.Struct("iIII")
+
+
+def patrones_vigilados(rutas):
+    """
+    Patrones de glob absolutos de las rutas: un archivo es su propia ruta,
+    un directorio sus archivos .yaml/.yml y un glob queda como esta
+    """
+    patrones = []
+    for ruta in rutas:
+        ruta = os.path.abspath(ruta)
+        if os.path.isdir(ruta):
+            patrones += [os.path.join(glob.escape(ruta), "*.yaml"),
+                         os.path.join(glob.escape(ruta), "*.yml")]
+        elif glob.has_magic(ruta):
+            patrones.append(ruta)
+        else:
+            patrones.append(glob.escape(ruta))
+    return patrones
+
+
+class Vigilante:
+    """
+    Base de los vigilantes: esperar() bloquea hasta ver cambios en
+    archivos que coinciden con los patrones o hasta el timeout
+    """
+
+    def __init__(self, rutas):
+        self.patrones = patrones_vigilados(rutas)
+
+    def relevante(self, ruta):
+        return any(fnmatch.fnmatchcase(ruta, patron)
+                   for patron in self.patrones)
+
+    def esperar(self, timeout=None):
+        raise NotImplementedError
+
+    def cambios(self, debounce=0.2, timeout=None):
+        """
+        Espera el primer cambio y sigue juntando cambios hasta que pasen
+        debounce segundos sin ninguno. Devuelve las rutas cambiadas, o un
+        set vacio si vence el timeout
+        """
+        cambiados = self.esperar(timeout)
+        while cambiados:
+            mas = self.esperar(debounce)
+            if not mas:
+                break
+            cambiados |= mas
+        return cambiados
+
+    def cerrar(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+class VigilantePolling(Vigilante):
+    """
+    Compara mtime y tamaño de los archivos de los patrones cada intervalo
+    """
+    nombre = "polling"
+
+    def __init__(self, rutas, intervalo=INTERVALO_POLLING):
+        super().__init__(rutas)
+        self.intervalo = intervalo
+        self.estado = self._foto()
+
+    def _foto(self):
+        foto = {}
+        for patron in self.patrones:
+            for ruta in glob.glob(patron):
+                try:
+                    estado = os.stat(ruta)
+                except OSError:
+                    continue
+                foto[ruta] = (estado.st_mtime_ns, estado.st_size)
+        return foto
+
+    def esperar(self, timeout=None):
+        limite = None if timeout is None else time.monotonic() + timeout
+        while True:
+            foto = self._foto()
+            cambiados = {ruta for ruta in foto.keys() | self.estado.keys()
+                         if foto.get(ruta) != self.estado.get(ruta)}
+            self.estado = foto
+            if cambiados:
+                return cambiados
+            if limite is not None and time.monotonic() >= limite:
+                return set()
+            espera = self.intervalo
+            if limite is not None:
+                espera = min(espera, max(0.0, limite - time.monotonic()))
+            time.sleep(espera)
+
+
+def _libc():
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                       ctypes.c_uint32]
+    return libc
+
+
+class VigilanteInotify(Vigilante):
+    """
+    Un watch de inotify por directorio: asi se ven tambien los archivos
+    que el editor reemplaza con un rename y los values nuevos de una flota
+    """
+    nombre = "inotify"
+
+    def __init__(self, rutas):
+        super().__init__(rutas)
+        libc = _libc()
+        self.descriptor = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.descriptor < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 fallo")
+        self.directorios = {}
+        for directorio in self._directorios():
+            wd = libc.inotify_add_watch(self.descriptor,
+                                        os.fsencode(directorio), MASCARA)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                self.cerrar()
+                raise OSError(errno, f"no se puede vigilar {directorio}")
+            self.directorios[wd] = directorio
+
+    def _directorios(self):
+        directorios = set()
+        for patron in self.patrones:
+            directorio = os.path.dirname(patron)
+            if glob.has_magic(directorio):
+                directorios.update(os.path.dirname(ruta)
+                                   for ruta in glob.glob(patron))
+            elif os.path.isdir(directorio):
+                directorios.add(directorio)
+        return sorted(directorios)
+
+    def _leer(self):
+        cambiados = set()
+        try:
+            datos = os.read(self.descriptor, 64 * 1024)
+        except BlockingIOError:
+            return cambiados
+        posicion = 0
+        while posicion + EVENTO.size <= len(datos):
+            wd, _, _, largo = EVENTO.unpack_from(datos, posicion)
+            posicion += EVENTO.size
+            nombre = datos[posicion:posicion + largo].rstrip(b"\0")
+            posicion += largo
+            directorio = self.directorios.get(wd)
+            if directorio is None or not nombre:
+                continue
+            ruta = os.path.join(directorio, os.fsdecode(nombre))
+            if self.relevante(ruta):
+                cambiados.add(ruta)
+        return cambiados
+
+    def esperar(self, timeout=None):
+        limite = None if timeout is None else time.monotonic() + timeout
+        while True:
+            restante = None
+            if limite is not None:
+                restante = max(0.0, limite - time.monotonic())
+            listos, _, _ = select.select([self.descriptor], [], [], restante)
+            if listos:
+                cambiados = self._leer()
+                if cambiados:
+                    return cambiados
+            if limite is not None and time.monotonic() >= limite:
+                return set()
+
+    def cerrar(self):
+        if self.descriptor >= 0:
+            os.close(self.descriptor)
+            self.descriptor = -1
+
+
+def crear_vigilante(rutas, nombre=None):
+    """
+    Crea el vigilante elegido en MANIFEST_WATCH_BACKEND: inotify, polling
+    o auto (por defecto), que usa inotify si el sistema lo tiene y si no
+    vuelve a polling
+    """
+    nombre = nombre or os.environ.get(VARIABLE_BACKEND, "auto")
+    if nombre == "polling":
+        return VigilantePolling(rutas)
+    if nombre not in ("inotify", "auto"):
+        raise ValueError(f"vigilante desconocido: {nombre}")
+    try:
+        return VigilanteInotify(rutas)
+    except (OSError, AttributeError, TypeError) as e:
+        if nombre == "inotify":
+            raise OSError(f"no se pudo usar inotify: {e}")
+        return VigilantePolling(rutas)
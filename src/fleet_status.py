@@ -0,0 +1,136 @@
+"""
+Estado de stable y canary de toda la flota: un solo listado de deployments
+por etiqueta, unidos por app en memoria, y un watch desde el
+resourceVersion de ese listado que actualiza solo lo que cambio
+"""
+import time
+
+try:
+    from . import cluster_client, progressive_canary
+except ImportError:
+    import cluster_client
+    import progressive_canary
+
+# Los deployments stable y canary llevan la etiqueta app
+SELECTOR = "app"
+ENCABEZADOS = ("APP", "NAMESPACE", "IMAGE", "READY", "CANARY",
+               "CANARY-READY", "AGE")
+
+
+def rol_deployment(deployment):
+    """
+    (app, "stable" o "canary") de un deployment, None si no es de una app
+    """
+    metadata = deployment["metadata"]
+    etiquetas = metadata.get("labels") or {}
+    if etiquetas.get(progressive_canary.ETIQUETA_CANARY) == "true":
+        return etiquetas.get(progressive_canary.ETIQUETA_APP), "canary"
+    app_name = etiquetas.get("app")
+    if metadata["name"] == f"{app_name}-deployment":
+        return app_name, "stable"
+    # Canaries creados antes de las etiquetas comunes
+    if app_name == metadata["name"] and app_name.endswith("-canary"):
+        return app_name[:-len("-canary")], "canary"
+    return None
+
+
+def imagen_principal(deployment, app_name):
+    contenedores = deployment["spec"]["template"]["spec"]["containers"]
+    contenedor = next((c for c in contenedores if c.get("name") == app_name),
+                      contenedores[0])
+    return contenedor.get("image", "")
+
+
+def listos(deployment):
+    estado = deployment.get("status") or {}
+    return (f"{estado.get('readyReplicas', 0)}/"
+            f"{deployment['spec'].get('replicas', 1)}")
+
+
+class EstadoFlota:
+    """
+    Deployments stable y canary de la flota indexados por (namespace,
+    nombre), mas el resourceVersion desde donde seguir los cambios
+    """
+
+    def __init__(self, apps=None):
+        self.apps = set(apps) if apps else None
+        self.deployments = {}
+        self.version = None
+
+    def _pertenece(self, deployment):
+        rol = rol_deployment(deployment)
+        return rol is not None and (self.apps is None or rol[0] in self.apps)
+
+    def cargar(self, cliente):
+        """
+        Un solo listado de todos los namespaces
+        """
+        deployments, self.version = cliente.listar_version(
+            "deployment", selector=SELECTOR, todos_namespaces=True
+        )
+        self.deployments = {
+            (d["metadata"].get("namespace"), d["metadata"]["name"]): d
+            for d in deployments if self._pertenece(d)
+        }
+
+    def aplicar(self, evento, objeto):
+        """
+        Aplica un evento del watch, devuelve si cambio alguna fila
+        """
+        version = (objeto.get("metadata") or {}).get("resourceVersion")
+        if version:
+            self.version = version
+        if evento == "BOOKMARK" or not self._pertenece(objeto):
+            return False
+        clave = (objeto["metadata"].get("namespace"),
+                 objeto["metadata"]["name"])
+        if evento == "DELETED":
+            return self.deployments.pop(clave, None) is not None
+        self.deployments[clave] = objeto
+        return True
+
+    def filas(self, ahora=None):
+        por_app = {}
+        for (namespace, _), deployment in self.deployments.items():
+            app_name, rol = rol_deployment(deployment)
+            por_app.setdefault((app_name, namespace or ""), {})[rol] = \
+                deployment
+        filas = []
+        for (app_name, namespace), roles in sorted(por_app.items()):
+            stable, canary = roles.get("stable"), roles.get("canary")
+            filas.append((
+                app_name, namespace,
+                imagen_principal(stable, app_name) if stable else "<none>",
+                listos(stable) if stable else "-",
+                imagen_principal(canary, app_name) if canary else "<none>",
+                listos(canary) if canary else "-",
+                cluster_client.formatear_edad(
+                    cluster_client.edad(canary or stable, ahora)
+                )
+            ))
+        return filas
+
+
+def vigilar(cliente, estado, al_cambiar, duracion=None, timeout=30,
+            reloj=time.monotonic):
+    """
+    Sigue los cambios de los deployments con watch desde la version del
+    ultimo listado y llama a al_cambiar(estado) cuando cambia alguna
+    fila. Si la version expira se vuelve a listar una vez
+    """
+    limite = None if duracion is None else reloj() + duracion
+    while limite is None or reloj() < limite:
+        espera = timeout if limite is None else min(timeout,
+                                                    limite - reloj())
+        try:
+            for evento, objeto in cliente.observar(
+                    "deployment", estado.version, selector=SELECTOR,
+                    todos_namespaces=True, timeout=espera):
+                if estado.aplicar(evento, objeto):
+                    al_cambiar(estado)
+        except cluster_client.ErrorCluster as e:
+            if e.codigo != 410:
+                raise
+            estado.cargar(cliente)
+            al_cambiar(estado)
@@ -4,11 +4,53 @@ Generador de manifiestos k8s a partir de templates y values
 """
 import yaml
 import argparse
+import contextlib
+import glob
+import io
+import json
 import os
-import jsonschema
+import re
 import subprocess
-import tempfile
-from jinja2 import Template
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+try:
+    from . import (build_cache, checksum, cluster_client, file_watcher,
+                   metrics, offline_validator, output_writer, revision_ledger,
+                   template_engine, values_layers, yaml_io)
+except ImportError:
+    import build_cache
+    import checksum
+    import cluster_client
+    import file_watcher
+    import metrics
+    import offline_validator
+    import output_writer
+    import revision_ledger
+    import template_engine
+    import values_layers
+    import yaml_io
+
+# Forma parte de la clave del cache de build: subirla invalida el cache
+VERSION_GENERADOR = "1.1.0"
+# --output - escribe los manifiestos en stdout como un solo stream YAML
+STREAM = "-"
+
+# Con --quiet solo se muestran los errores y los resumenes
+_silencioso = False
+# Con --watch el cache de build tambien vive en memoria entre ciclos
+_memoria_build = None
+
+
+def progreso(*args, **kwargs):
+    """
+    print de los mensajes de progreso y de los manifiestos, que --quiet
+    omite
+    """
+    if not _silencioso:
+        print(*args, **kwargs)
 
 
 esquema = {
@@ -28,16 +70,43 @@ esquema = {
 }
 
 
+@lru_cache(maxsize=None)
+def obtener_validador_values():
+    """
+    Compila una sola vez el validador del esquema de values
+    """
+    from jsonschema.validators import validator_for
+
+    clase = validator_for(esquema)
+    clase.check_schema(esquema)
+    return clase(esquema)
+
+
+def errores_values(values):
+    """
+    Devuelve todos los errores de los values con su ruta JSON
+    """
+    validador = obtener_validador_values()
+    errores = sorted(validador.iter_errors(values),
+                     key=lambda e: list(map(str, e.absolute_path)))
+    return [{"ruta": e.json_path, "mensaje": e.message} for e in errores]
+
+
 def validar_values(values):
     """
     Se valida que los values cumplan el esquema
     """
-    try:
-        jsonschema.validate(values, esquema)
-        return True
-    except jsonschema.ValidationError as e:
-        print(f"Error de validacion: {e.message}")
-        return False
+    errores = errores_values(values)
+    for error in errores:
+        print(f"Error de validacion en {error['ruta']}: {error['mensaje']}")
+    return not errores
+
+
+def leer_values(ruta_values):
+    """
+    Lee y parsea un archivo de values, lanzando las excepciones al caller
+    """
+    return yaml_io.leer_archivo(ruta_values)
 
 
 def cargar_values(ruta_values):
@@ -45,9 +114,7 @@ def cargar_values(ruta_values):
     Carga valores desde values.yaml
     """
     try:
-        with open(ruta_values, 'r', encoding='utf-8') as f:
-            values = yaml.safe_load(f)
-        return values
+        return leer_values(ruta_values)
     except FileNotFoundError:
         print(f"Error: No se encontro el archivo {ruta_values}")
         return None
@@ -56,6 +123,31 @@ def cargar_values(ruta_values):
         return None
 
 
+def cargar_capas_base(rutas_values):
+    """
+    Fusiona las capas base de values (todos los --values salvo el ultimo)
+    """
+    try:
+        return values_layers.fusionar_capas(rutas_values)
+    except FileNotFoundError as e:
+        print(f"Error: No se encontro el archivo {e.filename}")
+    except yaml.YAMLError as e:
+        print(f"Error al leer values.yaml: {e}")
+    except ValueError as e:
+        print(f"Error: {e}")
+    return None
+
+
+def aplicar_capas(base, values, asignaciones):
+    """
+    Values de una app sobre las capas base y con los --set al final
+    """
+    if not values or not (base or asignaciones):
+        return values
+    return values_layers.fusionar(values_layers.fusionar(base, values),
+                                  asignaciones)
+
+
 def cargar_template(ruta_template):
     """
     Carga el contenido de template
@@ -72,32 +164,109 @@ def cargar_template(ruta_template):
 def generar_manifiesto(contenido_template, values):
     """
     Genera manifiesto procesando template con values
+    El template puede ser su contenido o un template ya compilado
     """
     try:
-        # Se crea objeto template de jinja2
-        template = Template(contenido_template)
+        # Se obtiene el template compilado desde el cache del motor
+        if isinstance(contenido_template, str):
+            template = template_engine.obtener_template_desde_texto(
+                contenido_template
+            )
+        else:
+            template = contenido_template
         # Remplaza placeholders con values
         manifiesto = template.render(**values)
-        print("Manifiesto generado exitosamente")
+        progreso("Manifiesto generado exitosamente")
         return manifiesto
     except Exception as e:
         print(f"Error al generar manifiesto: {e}")
         return None
 
 
-def guardar_manifiesto(contenido_manifiesto, ruta_output):
+def values_usados(values, variables):
+    """
+    Parte de los values que lee un template. Es lo unico que entra en la
+    clave del cache de build: un cambio en otras claves no lo vuelve a
+    renderizar ni a validar
+    """
+    if variables is None:
+        return values
+    return {clave: values[clave] for clave in variables if clave in values}
+
+
+def avisar_faltantes(values, dependencias, origen):
+    """
+    Avisa antes de renderizar las variables que usan los templates y que
+    los values no definen (jinja2 las renderizaria como texto vacio)
+    Devuelve la cantidad de variables faltantes
+    """
+    faltantes = sorted(set(dependencias) - set(values))
+    for variable in faltantes:
+        templates = ", ".join(os.path.basename(ruta)
+                              for ruta in dependencias[variable])
+        print(f"Aviso: {origen} no define {variable}, usada en {templates}")
+    return len(faltantes)
+
+
+def guardar_manifiesto(contenido_manifiesto, ruta_output, escritor=None):
     """
-    Guarda el manifiesto en un archivo
+    Guarda el manifiesto en un archivo, solo si su contenido cambio
+    Devuelve el estado de la escritura o None si hubo un error
     """
     try:
-        directorio_output = os.path.dirname(ruta_output)
-        if directorio_output:
-            os.makedirs(directorio_output, exist_ok=True)
-        with open(ruta_output, 'w', encoding='utf-8') as f:
-            f.write(contenido_manifiesto)
-        print(f"Manifiesto guardado en: {ruta_output}")
+        if escritor is None:
+            escritor = output_writer.EscritorManifiestos()
+        estado = escritor.escribir(contenido_manifiesto, ruta_output)
+        if estado == output_writer.ESCRITO:
+            progreso(f"Manifiesto guardado en: {ruta_output}")
+        else:
+            progreso(f"Manifiesto sin cambios: {ruta_output}")
+        return estado
     except Exception as e:
         print(f"Error al guardar archivo: {e}")
+        return None
+
+
+def escribir_salida(manifiestos, directorio_output, podar=False,
+                    metricas=None):
+    """
+    Guarda los manifiestos (ruta_output, contenido) y, si se pide, elimina
+    del output los que no se produjeron. Devuelve False si algun archivo
+    no se pudo guardar
+    """
+    metricas = metricas or metrics.Metricas()
+    escritor = output_writer.EscritorManifiestos()
+    ok = True
+    for ruta_output, manifiesto in manifiestos:
+        with metricas.medir("escritura", os.path.basename(ruta_output)):
+            estado = guardar_manifiesto(manifiesto, ruta_output, escritor)
+        if estado is None:
+            ok = False
+    if ok and podar:
+        for ruta in escritor.podar(directorio_output):
+            progreso(f"Manifiesto eliminado: {ruta}")
+    progreso(escritor.resumen())
+    return ok
+
+
+# Linea de kubectl apply por objeto, p.ej. "deployment.apps/mi-app created"
+PATRON_OBJETO_KUBECTL = re.compile(
+    r"^(?P<tipo>[a-z0-9-]+)(?:\.[a-z0-9.-]+)?/(?P<nombre>\S+)\s"
+)
+
+
+def ejecutar_dry_run(contenido_manifiestos):
+    """
+    Ejecuta kubectl apply --dry-run pasando los manifiestos por stdin
+    """
+    return subprocess.run([
+        'kubectl',
+        'apply',
+        '--dry-run=client',
+        '--validate=true',
+        '-f',
+        '-'
+    ], input=contenido_manifiestos, capture_output=True, text=True)
 
 
 def validar_manifiesto_k8s(contenido_manifiesto, nombre_archivo=""):
@@ -105,25 +274,9 @@ def validar_manifiesto_k8s(contenido_manifiesto, nombre_archivo=""):
     Valida manifiesto usando kubectl dry-run
     """
     try:
-        # Crear archivo temporal con el manifiesto
-        with tempfile.NamedTemporaryFile(
-            mode='w', suffix='.yaml', delete=False
-        ) as f:
-            f.write(contenido_manifiesto)
-            temp_file = f.name
-        # Ejecutar kubectl dry-run --validate
-        resultado = subprocess.run([
-            'kubectl',
-            'apply',
-            '--dry-run=client',
-            '--validate=true',
-            '-f',
-            temp_file
-        ], capture_output=True, text=True)
-        # Limpiar archivo temporal
-        os.unlink(temp_file)
+        resultado = ejecutar_dry_run(contenido_manifiesto)
         if resultado.returncode == 0:
-            print(f"Manifiesto {nombre_archivo} válido")
+            progreso(f"Manifiesto {nombre_archivo} válido")
             return True
         else:
             print(f"Error en manifiesto {nombre_archivo}:")
@@ -137,103 +290,933 @@ def validar_manifiesto_k8s(contenido_manifiesto, nombre_archivo=""):
         return False
 
 
-def desplegar_manifiestos(directorio_output):
+def objetos_manifiesto(contenido_manifiesto):
     """
-    Despliega manifiestos generados usando kubectl apply
+    Devuelve (tipo, nombre) de cada objeto de un manifiesto
     """
     try:
-        print(f"\nDesplegando manifiestos desde: {directorio_output}")
-        # Ejecutar kubectl apply en el directorio
-        resultado = subprocess.run([
-            'kubectl', 'apply', '-f', directorio_output
-        ], capture_output=True, text=True)
+        documentos = list(yaml_io.cargar_todos(contenido_manifiesto))
+    except yaml.YAMLError:
+        return []
+    objetos = []
+    for documento in documentos:
+        if isinstance(documento, dict):
+            metadata = documento.get("metadata") or {}
+            objetos.append((str(documento.get("kind", "")).lower(),
+                            str(metadata.get("name", ""))))
+    return objetos
 
-        if resultado.returncode == 0:
-            print("Despliegue exitoso!")
-            print(resultado.stdout)
-            # Mostrar pods desplegados
-            print("\nRecursos desplegados:")
-            subprocess.run(['kubectl', 'get', 'pods,svc'],
-                           capture_output=False)
-            return True
+
+def validar_manifiestos_k8s_lote(manifiestos):
+    """
+    Valida varios manifiestos con una sola llamada a kubectl dry-run
+    Recibe una lista de (etiqueta, contenido) y devuelve un dict
+    etiqueta -> error, con None para los manifiestos validos
+    """
+    if not manifiestos:
+        return {}
+    stream = "\n---\n".join(contenido for _, contenido in manifiestos)
+    try:
+        resultado = ejecutar_dry_run(stream)
+    except FileNotFoundError:
+        error = "kubectl no encontrado. Instala kubectl para validación."
+        return {etiqueta: error for etiqueta, _ in manifiestos}
+    except Exception as e:
+        return {etiqueta: f"Error en validación: {e}"
+                for etiqueta, _ in manifiestos}
+    if resultado.returncode == 0:
+        return {etiqueta: None for etiqueta, _ in manifiestos}
+
+    # kubectl lista en stdout los objetos que pasaron la validacion
+    aceptados = set()
+    for linea in resultado.stdout.splitlines():
+        coincidencia = PATRON_OBJETO_KUBECTL.match(linea)
+        if coincidencia:
+            aceptados.add((coincidencia.group("tipo"),
+                           coincidencia.group("nombre")))
+    lineas_error = [linea for linea in resultado.stderr.splitlines()
+                    if linea.strip()]
+    errores = {}
+    sin_asignar = []
+    for etiqueta, contenido in manifiestos:
+        objetos = objetos_manifiesto(contenido)
+        if objetos and all(obj in aceptados for obj in objetos):
+            errores[etiqueta] = None
+            continue
+        nombres = [nombre for _, nombre in objetos if nombre]
+        propias = [linea for linea in lineas_error
+                   if any(nombre in linea for nombre in nombres)]
+        if propias:
+            errores[etiqueta] = "\n".join(propias)
         else:
-            print("Error en despliegue:")
-            print(resultado.stderr)
-            return False
+            sin_asignar.append((etiqueta, contenido))
+    if len(sin_asignar) == 1:
+        errores[sin_asignar[0][0]] = resultado.stderr.strip()
+    else:
+        # Errores sin nombre de objeto: se ubican validando solo esos
+        for etiqueta, contenido in sin_asignar:
+            individual = ejecutar_dry_run(contenido)
+            errores[etiqueta] = (None if individual.returncode == 0
+                                 else individual.stderr.strip())
+    return errores
 
+
+def validar_manifiestos_lote(manifiestos, validador="kubectl"):
+    """
+    Valida un lote de manifiestos (etiqueta, contenido) con el validador
+    elegido: kubectl dry-run o los esquemas offline
+    """
+    if validador == "offline":
+        return offline_validator.validar_manifiestos_offline_lote(manifiestos)
+    return validar_manifiestos_k8s_lote(manifiestos)
+
+
+def leer_objetos_output(directorio_output, recursivo=False):
+    """
+    Lee los objetos de los manifiestos guardados en el directorio de output
+    """
+    objetos = []
+    for actual, subdirectorios, archivos in os.walk(directorio_output):
+        if not recursivo:
+            subdirectorios.clear()
+        subdirectorios.sort()
+        for nombre in sorted(archivos):
+            if not nombre.endswith(output_writer.EXTENSIONES_MANIFIESTO):
+                continue
+            with open(os.path.join(actual, nombre), 'r',
+                      encoding='utf-8') as f:
+                objetos.extend(documento
+                               for documento in yaml_io.cargar_todos(f)
+                               if isinstance(documento, dict))
+    return objetos
+
+
+def obtener_checksums_vivos(objetos):
+    """
+    Consulta los checksums de los objetos en el cluster en un solo lote
+    Devuelve un dict clave_objeto -> checksum
+    """
+    vivos = cluster_client.obtener_cliente().obtener_lote(objetos)
+    return {clave: checksum.checksum_objeto(objeto)
+            for clave, objeto in vivos.items()}
+
+
+def desplegar_objetos(objetos):
+    """
+    Aplica solo los objetos cuyo checksum difiere del que tiene el
+    cluster. Devuelve (ok, aplicados, omitidos)
+    """
+    con_checksum = [objeto for objeto in objetos
+                    if checksum.checksum_objeto(objeto)]
+    vivos = obtener_checksums_vivos(con_checksum) if con_checksum else {}
+    cambiados = [
+        objeto for objeto in objetos
+        if checksum.checksum_objeto(objeto) is None
+        or vivos.get(cluster_client.clave_objeto(objeto))
+        != checksum.checksum_objeto(objeto)
+    ]
+    omitidos = len(objetos) - len(cambiados)
+    if not cambiados:
+        return True, 0, omitidos
+    try:
+        lineas = cluster_client.obtener_cliente().aplicar(cambiados)
+    except cluster_client.ErrorCluster as e:
+        print("Error en despliegue:")
+        print(e)
+        return False, 0, omitidos
+    progreso("\n".join(lineas))
+    return True, len(cambiados), omitidos
+
+
+def desplegar_manifiestos(directorio_output, recursivo=False):
+    """
+    Despliega los manifiestos generados en el cluster, omitiendo los
+    objetos cuyo checksum ya esta en el cluster
+    """
+    try:
+        progreso(f"\nDesplegando manifiestos desde: {directorio_output}")
+        return desplegar_generados(leer_objetos_output(directorio_output,
+                                                       recursivo))
+    except Exception as e:
+        print(f"Error: {e}")
+        return False
+
+
+def objetos_generados(manifiestos):
+    """
+    Objetos de Kubernetes de los manifiestos renderizados en memoria
+    """
+    return [documento
+            for manifiesto in manifiestos
+            for documento in yaml_io.cargar_todos(manifiesto)
+            if isinstance(documento, dict)]
+
+
+def desplegar_generados(objetos):
+    """
+    Despliega objetos ya leidos o recien renderizados, sin volver a
+    leerlos del output
+    """
+    try:
+        ok, aplicados, omitidos = desplegar_objetos(objetos)
+        if not ok:
+            return False
+        print(f"Despliegue exitoso! {aplicados} objetos aplicados, "
+              f"{omitidos} sin cambios omitidos")
+        if not _silencioso:
+            # Mostrar pods desplegados
+            print("\nRecursos desplegados:")
+            cliente = cluster_client.obtener_cliente()
+            for tipo in ("pod", "service"):
+                cluster_client.imprimir_objetos(tipo, cliente.listar(tipo))
+        return True
     except Exception as e:
         print(f"Error: {e}")
         return False
 
 
-def main():
+def escribir_stream(manifiestos, stream, metricas=None):
+    """
+    Escribe los manifiestos como un solo stream YAML multi-documento,
+    listo para kubectl apply -f -
+    Devuelve False si el lector cerro el pipe antes de terminar (p.ej.
+    con | head)
+    """
+    metricas = metricas or metrics.Metricas()
+    try:
+        with metricas.medir("escritura", "stream"):
+            for manifiesto in manifiestos:
+                stream.write("---\n" + manifiesto.strip() + "\n")
+            stream.flush()
+    except BrokenPipeError:
+        # Lo que quedo en el buffer se descarta en /dev/null, si no el
+        # flush al salir del interprete vuelve a fallar con un traceback
+        try:
+            descriptor = stream.fileno()
+        except (AttributeError, OSError, ValueError):
+            return False
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, descriptor)
+        os.close(devnull)
+        return False
+    return True
+
+
+def registrar_despliegue(apps):
+    """
+    Registra en el ledger local la revision desplegada de cada app
+    Recibe un dict app -> (values, [(nombre, manifiesto)])
+    """
+    ledger = revision_ledger.Ledger()
+    for app, (values, manifiestos) in sorted(apps.items()):
+        try:
+            entrada = ledger.registrar(app, manifiestos,
+                                       revision_ledger.huella_values(values))
+        except (OSError, ValueError) as e:
+            print(f"Aviso: no se pudo registrar {app} en el ledger: {e}")
+            continue
+        if entrada:
+            progreso(f"Ledger: {app} revision {entrada['revision']}")
+
+
+def nombre_manifiesto(ruta_template):
+    """
+    Nombre del manifiesto generado por un template, p.ej. deployment.yaml
+    """
+    return os.path.splitext(os.path.basename(ruta_template))[0]
+
+
+def resolver_values(ruta_values):
+    """
+    Devuelve los archivos de values de un archivo, directorio o glob
+    """
+    if os.path.isdir(ruta_values):
+        archivos = [
+            os.path.join(ruta_values, nombre)
+            for nombre in os.listdir(ruta_values)
+            if nombre.endswith(('.yaml', '.yml'))
+        ]
+    elif glob.has_magic(ruta_values):
+        archivos = glob.glob(ruta_values)
+    else:
+        return [ruta_values]
+    return sorted(f for f in archivos if os.path.isfile(f))
+
+
+def es_flota(ruta_values):
+    """
+    Indica si --values apunta a un directorio o glob de values
+    """
+    return os.path.isdir(ruta_values) or glob.has_magic(ruta_values)
+
+
+def ruta_salida(directorio_output, ruta_template):
+    """
+    Ruta del manifiesto generado a partir del nombre del template
+    """
+    return os.path.join(directorio_output, nombre_manifiesto(ruta_template))
+
+
+def renderizar_par(values, ruta_template, anotar=False):
+    """
+    Renderiza un par (values, template) de la flota, con la anotacion de
+    checksum si se pide
+    Se ejecuta en un proceso del pool, los mensajes se devuelven como error
+    """
+    inicio = time.perf_counter()
+    salida = io.StringIO()
+    manifiesto = None
+    with contextlib.redirect_stdout(salida):
+        template = template_engine.obtener_template(ruta_template)
+        if template is not None:
+            manifiesto = generar_manifiesto(template, values)
+        if manifiesto and anotar:
+            manifiesto = anotar_checksums(manifiesto)
+    return {
+        "manifiesto": manifiesto,
+        "error": None if manifiesto else salida.getvalue().strip(),
+        "segundos": time.perf_counter() - inicio
+    }
+
+
+def anotar_checksums(manifiesto):
+    """
+    Agrega la anotacion de checksum a los objetos del manifiesto
+    """
+    try:
+        return checksum.anotar_manifiesto(manifiesto)
+    except yaml.YAMLError as e:
+        print(f"Error al anotar checksum, el manifiesto no es YAML: {e}")
+        return None
+
+
+def crear_cache(args):
+    return build_cache.CacheBuild(habilitado=not args.no_cache,
+                                  memoria=_memoria_build)
+
+
+def extras_build(validador, anotar=False):
+    """
+    Entradas que, ademas del template y los values, definen un build
+    """
+    extras = [VERSION_GENERADOR, validador, anotar]
+    if validador == "offline":
+        extras.append(offline_validator.huella_esquemas())
+    return extras
+
+
+def objetivo_etiqueta(etiqueta):
+    """
+    Manifiesto de una etiqueta de render: la ruta del template o
+    (values, nombre del template) en modo flota
+    """
+    if isinstance(etiqueta, tuple):
+        etiqueta = etiqueta[1]
+    return nombre_manifiesto(etiqueta)
+
+
+def validar_y_cachear(renderizados, validador, cache, metricas=None):
+    """
+    Valida en un lote los manifiestos recien renderizados, lista de
+    (etiqueta, clave, manifiesto, segundos), y guarda en cache los validos
+    Devuelve un dict etiqueta -> error
+    """
+    metricas = metricas or metrics.Metricas()
+    inicio = time.perf_counter()
+    errores = validar_manifiestos_lote(
+        [(etiqueta, manifiesto)
+         for etiqueta, _, manifiesto, _ in renderizados],
+        validador
+    )
+    # El costo de la validacion por lote se reparte entre sus manifiestos
+    segundos_validacion = ((time.perf_counter() - inicio)
+                           / max(len(renderizados), 1))
+    for etiqueta, clave, manifiesto, segundos in renderizados:
+        metricas.registrar("validacion", objetivo_etiqueta(etiqueta),
+                           segundos_validacion)
+        if errores[etiqueta]:
+            metricas.incrementar("validaciones_fallidas")
+        else:
+            cache.guardar(clave, manifiesto, segundos + segundos_validacion)
+    return errores
+
+
+def contar_cache(metricas, cache):
+    metricas.incrementar("cache_hits", cache.hits)
+    metricas.incrementar("cache_misses", cache.misses)
+
+
+def generar_flota(args, metricas=None, stream=None):
+    """
+    Renderiza todos los values de un directorio o glob contra los templates
+    en un pool de procesos, con un subdirectorio de output por app
+    """
+    metricas = metricas or metrics.Metricas()
+    a_disco = args.output and args.output != STREAM
+    inicio = time.perf_counter()
+    archivos_values = resolver_values(args.values[-1])
+    if not archivos_values:
+        print(f"Error: No se encontraron archivos de values en "
+              f"{args.values[-1]}")
+        return 1
+    base = cargar_capas_base(args.values[:-1])
+    if base is None:
+        return 1
+    asignaciones = values_layers.capa_asignaciones(args.set)
+    textos = {}
+    for ruta_template in args.templates:
+        with metricas.medir("carga", nombre_manifiesto(ruta_template)):
+            textos[ruta_template] = cargar_template(ruta_template)
+        if textos[ruta_template] is None:
+            return 1
+    variables = {ruta: template_engine.variables_template(texto)
+                 for ruta, texto in textos.items()}
+    dependencias = template_engine.mapa_dependencias(variables)
+    cache = crear_cache(args)
+    anotar = args.checksums or args.deploy
+    extras = extras_build(args.validator, anotar)
+    fallos = []
+    trabajos = []
+    validos = []
+    apps = {}
+    values_apps = {}
+    for ruta_values in archivos_values:
+        with metricas.medir("carga", "values"):
+            values = aplicar_capas(base, cargar_values(ruta_values),
+                                   asignaciones)
+        with metricas.medir("esquema", "values"):
+            valido = bool(values) and validar_values(values)
+        if not valido:
+            metricas.incrementar("values_invalidos")
+            fallos.append((ruta_values, "-", "values invalidos"))
+            continue
+        app_name = values["app_name"]
+        # app_name es el subdirectorio del output: con / o .. escribiria
+        # (y --prune borraria) fuera del arbol de output
+        if not revision_ledger.PATRON_APP.match(app_name):
+            fallos.append((ruta_values, "-", f"app_name invalido: "
+                           f"{app_name!r}"))
+            continue
+        if app_name in apps:
+            fallos.append((ruta_values, "-", f"app_name {app_name} "
+                           f"repetido en {apps[app_name]}"))
+            continue
+        apps[app_name] = ruta_values
+        values_apps[app_name] = values
+        metricas.incrementar("variables_faltantes", avisar_faltantes(
+            values, dependencias, ruta_values
+        ))
+        for ruta_template in args.templates:
+            etiqueta = (ruta_values, os.path.basename(ruta_template))
+            ruta_output = None
+            if a_disco:
+                ruta_output = ruta_salida(
+                    os.path.join(args.output, app_name), ruta_template
+                )
+            usados = values_usados(values, variables[ruta_template])
+            clave = build_cache.calcular_clave(textos[ruta_template], usados,
+                                               *extras)
+            manifiesto = cache.obtener(clave)
+            if manifiesto is not None:
+                validos.append((etiqueta, manifiesto, ruta_output))
+            else:
+                # Al pool solo viajan los values que el template lee
+                trabajos.append((etiqueta, clave, usados, ruta_template,
+                                 ruta_output))
+
+    progreso(f"Renderizando {len(trabajos)} manifiestos de {len(apps)} "
+             f"apps con {args.jobs or os.cpu_count()} procesos "
+             f"({len(validos)} desde cache)")
+    renderizados = []
+    salidas = {}
+    if trabajos:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            futuros = {
+                pool.submit(renderizar_par, values, ruta_template, anotar):
+                (etiqueta, clave, ruta_output)
+                for etiqueta, clave, values, ruta_template, ruta_output
+                in trabajos
+            }
+            for futuro in as_completed(futuros):
+                etiqueta, clave, ruta_output = futuros[futuro]
+                try:
+                    resultado = futuro.result()
+                except Exception as e:
+                    resultado = {"manifiesto": None, "error": str(e)}
+                if resultado["manifiesto"]:
+                    metricas.registrar("render", objetivo_etiqueta(etiqueta),
+                                       resultado["segundos"])
+                    metricas.incrementar("manifiestos_renderizados")
+                    renderizados.append((etiqueta, clave,
+                                         resultado["manifiesto"],
+                                         resultado["segundos"]))
+                    salidas[etiqueta] = ruta_output
+                else:
+                    fallos.append(etiqueta + (resultado["error"],))
+
+    # Una sola validacion para todos los manifiestos renderizados
+    errores = validar_y_cachear(renderizados, args.validator, cache,
+                                metricas)
+    contar_cache(metricas, cache)
+    for etiqueta, _, manifiesto, _ in renderizados:
+        if errores[etiqueta]:
+            fallos.append(etiqueta + (errores[etiqueta],))
+        else:
+            validos.append((etiqueta, manifiesto, salidas[etiqueta]))
+    if args.output == STREAM:
+        if not escribir_stream([manifiesto
+                                for _, manifiesto, _ in sorted(validos)],
+                               stream or sys.stdout, metricas):
+            fallos.append((STREAM, "-", "stdout cerrado por el lector"))
+    elif args.output:
+        # Sin --prune si hubo fallos: se borrarian sus manifiestos anteriores
+        if fallos and args.prune:
+            print("Hubo fallos, no se eliminan manifiestos antiguos")
+        if not escribir_salida([(ruta_output, manifiesto)
+                                for _, manifiesto, ruta_output in validos],
+                               args.output, args.prune and not fallos,
+                               metricas):
+            fallos.append((args.output, "-", "error al guardar archivos"))
+
+    progreso(f"\n{'='*50}")
+    print(f"Resumen flota: {len(archivos_values)} values, "
+          f"{len(validos)} manifiestos exitosos, {len(fallos)} fallidos")
+    print(f"Tiempo total: {time.perf_counter() - inicio:.2f}s")
+    progreso(cache.resumen())
+    for ruta_values, nombre_template, error in sorted(fallos):
+        print(f"  - {ruta_values} [{nombre_template}]: {error}")
+    progreso(f"{'='*50}")
+    if fallos:
+        return 1
+    if args.deploy:
+        # Se despliega lo renderizado en memoria, sin releer el output
+        if not desplegar_generados(objetos_generados(
+                manifiesto for _, manifiesto, _ in validos)):
+            print("Fallo el despliegue")
+            return 1
+        app_de = {ruta: app for app, ruta in apps.items()}
+        desplegados = {}
+        for (ruta_values, nombre_template), manifiesto, _ in validos:
+            app = app_de[ruta_values]
+            desplegados.setdefault(app, (values_apps[app], []))[1].append(
+                (nombre_manifiesto(nombre_template), manifiesto)
+            )
+        registrar_despliegue(desplegados)
+        print("Generacion y despliegue completados")
+    return 0
+
+
+def generar_individual(args, metricas=None, stream=None):
+    """
+    Renderiza un archivo de values contra los templates
+    """
+    metricas = metricas or metrics.Metricas()
+    with metricas.medir("carga", "values"):
+        base = cargar_capas_base(args.values[:-1])
+        if base is None:
+            return 1
+        values = aplicar_capas(base, cargar_values(args.values[-1]),
+                               values_layers.capa_asignaciones(args.set))
+    if not values:
+        return 1
+    with metricas.medir("esquema", "values"):
+        valido = validar_values(values)
+    if not valido:
+        metricas.incrementar("values_invalidos")
+        return 1
+    cache = crear_cache(args)
+    anotar = args.checksums or args.deploy
+    extras = extras_build(args.validator, anotar)
+    manifiestos = []
+    renderizados = []
+    textos = {}
+    for template_path in args.templates:
+        with metricas.medir("carga", nombre_manifiesto(template_path)):
+            textos[template_path] = cargar_template(template_path)
+        if textos[template_path] is None:
+            return 1
+    variables = {ruta: template_engine.variables_template(texto)
+                 for ruta, texto in textos.items()}
+    metricas.incrementar("variables_faltantes", avisar_faltantes(
+        values, template_engine.mapa_dependencias(variables),
+        args.values[-1]
+    ))
+    for template_path in args.templates:
+        clave = build_cache.calcular_clave(
+            textos[template_path],
+            values_usados(values, variables[template_path]), *extras
+        )
+        progreso(f"{'='*50}")
+        manifiesto = cache.obtener(clave)
+        if manifiesto is None:
+            inicio = time.perf_counter()
+            template = template_engine.obtener_template(template_path)
+            if template is None:
+                return 1
+            manifiesto = generar_manifiesto(template, values)
+            if manifiesto and anotar:
+                manifiesto = anotar_checksums(manifiesto)
+            if not manifiesto:
+                return 1
+            segundos = time.perf_counter() - inicio
+            metricas.registrar("render", nombre_manifiesto(template_path),
+                               segundos)
+            metricas.incrementar("manifiestos_renderizados")
+            renderizados.append((template_path, clave, manifiesto,
+                                 segundos))
+        else:
+            progreso("Manifiesto obtenido desde cache de build")
+        if args.output != STREAM:
+            progreso(f"\n{'*'*6} Manifiesto generado:")
+            progreso(f"{os.path.basename(template_path)} {'*'*6}")
+            progreso(manifiesto)
+            progreso(f"{'='*50}")
+        manifiestos.append((template_path, manifiesto))
+
+    # Validar en un solo lote los manifiestos que no estaban en cache
+    errores = validar_y_cachear(renderizados, args.validator, cache,
+                                metricas)
+    contar_cache(metricas, cache)
+    for template_path, _ in manifiestos:
+        nombre_template = os.path.basename(template_path)
+        if errores.get(template_path):
+            print(f"Error en manifiesto {nombre_template}:")
+            print(errores[template_path])
+        else:
+            progreso(f"Manifiesto {nombre_template} válido")
+    progreso(cache.resumen())
+    if any(errores.values()):
+        print(
+            "\nEl manifiesto generado NO es válido para Kubernetes. "
+            "No se guardarán los archivos."
+        )
+        return 1
+    # Guardar en archivo solo si se especifica el output
+    if args.output == STREAM:
+        if not escribir_stream([manifiesto for _, manifiesto in manifiestos],
+                               stream or sys.stdout, metricas):
+            return 1
+    elif args.output:
+        if not escribir_salida([(ruta_salida(args.output, template_path),
+                                 manifiesto)
+                                for template_path, manifiesto in manifiestos],
+                               args.output, args.prune, metricas):
+            return 1
+    if args.deploy:
+        progreso(f"\n{'='*50}")
+        if desplegar_generados(objetos_generados(
+                manifiesto for _, manifiesto in manifiestos)):
+            registrar_despliegue({values["app_name"]: (values, [
+                (nombre_manifiesto(template_path), manifiesto)
+                for template_path, manifiesto in manifiestos
+            ])})
+            print("Generacion y despliegue completados")
+        else:
+            print("Fallo el despliegue")
+            return 1
+    return 0
+
+
+def validar_archivos_values(rutas_values, reporte, base=None,
+                            asignaciones=None):
+    """
+    Valida cada archivo de values, fusionado sobre las capas base y los
+    --set, y escribe una linea JSON por archivo
+    Devuelve la cantidad de archivos invalidos
+    """
+    invalidos = 0
+    for ruta_values in rutas_values:
+        try:
+            errores = errores_values(aplicar_capas(
+                base, leer_values(ruta_values), asignaciones
+            ))
+        except FileNotFoundError:
+            errores = [{"ruta": "$", "mensaje": "archivo no encontrado"}]
+        except yaml.YAMLError as e:
+            errores = [{"ruta": "$", "mensaje": f"YAML invalido: {e}"}]
+        if errores:
+            invalidos += 1
+        reporte.write(json.dumps({
+            "archivo": ruta_values,
+            "valido": not errores,
+            "errores": errores
+        }, ensure_ascii=False) + "\n")
+    return invalidos
+
+
+def solo_validar(args):
+    """
+    Modo --validate-only: valida los values sin renderizar templates
+    """
+    rutas_values = resolver_values(args.values[-1])
+    base = cargar_capas_base(args.values[:-1])
+    if base is None:
+        return 1
+    asignaciones = values_layers.capa_asignaciones(args.set)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as reporte:
+            invalidos = validar_archivos_values(rutas_values, reporte, base,
+                                                asignaciones)
+    else:
+        invalidos = validar_archivos_values(rutas_values, sys.stdout, base,
+                                            asignaciones)
+    print(f"Values validados: {len(rutas_values)}, invalidos: {invalidos}",
+          file=sys.stderr)
+    return 1 if invalidos or not rutas_values else 0
+
+
+def crear_parser():
     parser = argparse.ArgumentParser(
         description="Generador de manifiestos de kubernetes"
     )
     parser.add_argument(
         '--templates', '-t',
         nargs='+',
-        required=True,
         help='Ruta al archivo de template (.template)'
     )
     parser.add_argument(
         '--values', '-v',
         required=True,
-        help='Ruta al archivo de values (.yaml)'
+        action='append',
+        help='Ruta al archivo de values (.yaml), o un directorio o glob '
+             'de values para generar una flota de apps. Se puede repetir: '
+             'los anteriores son capas base que el ultimo pisa'
+    )
+    parser.add_argument(
+        '--set',
+        action='append',
+        metavar='CLAVE=VALOR',
+        help='Pisa un valor sobre todas las capas, p.ej. '
+             'resources.limits.cpu=500m (se puede repetir)'
     )
     parser.add_argument(
         '--output', '-o',
-        help='Ruta del archivo de output (opcional)'
+        help='Ruta del archivo de output (opcional); con - los manifiestos '
+             'van a stdout como un solo stream YAML y los mensajes a stderr'
+    )
+    parser.add_argument(
+        '--quiet', '-q',
+        action='store_true',
+        help='No mostrar los manifiestos ni los mensajes de progreso, solo '
+             'errores y resumenes'
     )
     parser.add_argument(
         '--deploy', '-d',
         action='store_true',
         help='Desplegar manifiestos despues de generarlos'
     )
-    args = parser.parse_args()
-    values = cargar_values(args.values)
-    if not values:
-        return 1
-    if not validar_values(values):
-        return 1
-    for template_path in args.templates:
-        contenido_template = cargar_template(template_path)
-        if not contenido_template:
-            return 1
-        print(f"{'='*50}")
-        manifiesto = generar_manifiesto(contenido_template, values)
-        if not manifiesto:
-            return 1
-        print(f"\n{'*'*6} Manifiesto generado:")
-        print(f"{os.path.basename(template_path)} {'*'*6}")
-        print(manifiesto)
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        help='Procesos en paralelo para el modo flota (por defecto CPUs)'
+    )
+    parser.add_argument(
+        '--validator',
+        choices=['kubectl', 'offline'],
+        default='kubectl',
+        help='Validar con kubectl dry-run o con los esquemas de schemas/ '
+             '(offline, sin cluster)'
+    )
+    parser.add_argument(
+        '--validate-only',
+        action='store_true',
+        help='Solo validar los values contra el esquema, reportando todos '
+             'los errores de cada archivo en formato JSON lines'
+    )
+    parser.add_argument(
+        '--report',
+        metavar='ARCHIVO',
+        help='Archivo para el reporte JSON lines de --validate-only '
+             '(por defecto stdout)'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='No usar el cache de build de .manifest-cache/'
+    )
+    parser.add_argument(
+        '--prune',
+        action='store_true',
+        help='Eliminar de --output los manifiestos que ningun template '
+             'produjo en esta ejecucion'
+    )
+    parser.add_argument(
+        '--checksums',
+        action='store_true',
+        help='Anotar cada objeto con el checksum de su contenido '
+             '(siempre activo con --deploy)'
+    )
+    parser.add_argument(
+        '--timings',
+        action='store_true',
+        help='Mostrar al final los milisegundos de cada fase (carga, '
+             'esquema, render, validacion, escritura) por template'
+    )
+    parser.add_argument(
+        '--metrics',
+        metavar='ARCHIVO',
+        help='Exportar contadores, histogramas y tiempos a un archivo JSON '
+             'o de Prometheus (textfile collector)'
+    )
+    parser.add_argument(
+        '--metrics-format',
+        choices=['json', 'prometheus'],
+        help='Formato de --metrics (por defecto prometheus si el archivo '
+             'termina en .prom, si no json)'
+    )
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='Quedarse vigilando los templates y los values y volver a '
+             'generar con cada cambio'
+    )
+    parser.add_argument(
+        '--debounce',
+        type=float,
+        default=0.2,
+        help='Segundos sin cambios antes de volver a generar con --watch '
+             '(default: 0.2)'
+    )
+    parser.add_argument(
+        '--profile',
+        nargs='?',
+        const='',
+        metavar='ARCHIVO',
+        help='Perfilar la ejecucion con cProfile y mostrar las funciones '
+             'mas costosas; con ARCHIVO guarda tambien las estadisticas '
+             '(en modo flota solo se perfila el proceso principal)'
+    )
+    parser.add_argument(
+        '--profile-top',
+        type=int,
+        default=20,
+        help='Funciones a mostrar con --profile (default: 20)'
+    )
+    return parser
 
-        # Validar manifiesto antes de mostrar o guardar
-        nombre_template = os.path.basename(template_path)
-        if not validar_manifiesto_k8s(manifiesto, nombre_template):
-            print(
-                "\nEl manifiesto generado NO es válido para Kubernetes. "
-                "No se guardará el archivo."
-            )
-            return 1
-        # Guardar en archivo solo si se especifica el output
-        if args.output:
-            nombre_base = os.path.basename(template_path)
-            nombre_archivo = os.path.splitext(nombre_base)[0]
-            ruta_output = os.path.join(args.output, nombre_archivo)
-            guardar_manifiesto(manifiesto, ruta_output)
-        print(f"{'='*50}")
-    if args.deploy and args.output:
-        print(f"\n{'='*50}")
-        if desplegar_manifiestos(args.output):
-            print("Generacion y despliegue completados")
-        else:
-            print("Fallo el despliegue")
+
+def perfilar(funcion, *args, ruta=None, cantidad=20):
+    """
+    Ejecuta la funcion con cProfile y muestra en stderr las funciones con
+    mas tiempo acumulado
+    """
+    # Solo se importan cuando se pide el perfil
+    import cProfile
+    import pstats
+
+    perfil = cProfile.Profile()
+    try:
+        return perfil.runcall(funcion, *args)
+    finally:
+        if ruta:
+            perfil.dump_stats(ruta)
+            print(f"Perfil guardado en {ruta}", file=sys.stderr)
+        estadisticas = pstats.Stats(perfil, stream=sys.stderr)
+        estadisticas.sort_stats("cumulative").print_stats(cantidad)
+
+
+def generar(args):
+    """
+    Genera una app o una flota y reporta las metricas pedidas
+    Con --output - stdout queda solo para el stream YAML: todos los
+    mensajes se redirigen a stderr
+    """
+    global _silencioso
+    metricas = metrics.Metricas()
+    stream = sys.stdout
+    _silencioso = args.quiet
+    try:
+        with contextlib.ExitStack() as pila:
+            if args.output == STREAM:
+                pila.enter_context(contextlib.redirect_stdout(sys.stderr))
+            if es_flota(args.values[-1]):
+                codigo = generar_flota(args, metricas, stream)
+            else:
+                codigo = generar_individual(args, metricas, stream)
+            return reportar_metricas(args, metricas, codigo)
+    finally:
+        _silencioso = False
+
+
+def describir_cambios(rutas):
+    nombres = sorted(os.path.basename(ruta) for ruta in rutas)
+    if len(nombres) > 3:
+        return f"{len(nombres)} archivos"
+    return ", ".join(nombres)
+
+
+def vigilar_cambios(args):
+    """
+    Modo --watch: genera una vez y vuelve a generar con cada cambio en los
+    templates o los values. Los templates compilados, los values
+    parseados y el cache de build quedan en memoria entre ciclos, asi
+    cada ciclo solo renderiza y valida lo que cambio
+    """
+    global _memoria_build
+    _memoria_build = {}
+    aviso = sys.stderr if args.output == STREAM else sys.stdout
+    codigo = 1
+    try:
+        with file_watcher.crear_vigilante(
+            list(args.templates) + list(args.values)
+        ) as vigilante:
+            codigo = generar(args)
+            print(f"Vigilando templates y values con {vigilante.nombre} "
+                  f"(Ctrl+C para salir)", file=aviso)
+            ciclo = 0
+            while True:
+                cambiados = vigilante.cambios(args.debounce)
+                if not cambiados:
+                    continue
+                ciclo += 1
+                inicio = time.perf_counter()
+                codigo = generar(args)
+                print(f"Ciclo {ciclo} ({describir_cambios(cambiados)}): "
+                      f"{(time.perf_counter() - inicio) * 1000:.0f} ms, "
+                      f"{'ok' if codigo == 0 else 'con errores'}",
+                      file=aviso)
+    except KeyboardInterrupt:
+        return codigo
+    finally:
+        _memoria_build = None
+
+
+def reportar_metricas(args, metricas, codigo):
+    if args.timings:
+        metricas.imprimir_tiempos()
+    if args.metrics:
+        try:
+            metricas.exportar(args.metrics, args.metrics_format)
+        except OSError as e:
+            print(f"Error al exportar metricas: {e}")
             return 1
-    elif args.deploy and not args.output:
-        print("Error: Para desplegar necesitas especificar --output")
+    return codigo
+
+
+def main(argv=None):
+    parser = crear_parser()
+    args = parser.parse_args(argv)
+    try:
+        values_layers.capa_asignaciones(args.set)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.validate_only:
+        return solo_validar(args)
+    if not args.templates:
+        parser.error("se requiere --templates salvo con --validate-only")
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs debe ser mayor o igual a 1")
+    if args.prune and args.output in (None, STREAM):
+        print("Error: --prune necesita --output con un directorio")
         return 1
-    return 0
+    if args.watch:
+        if args.profile is not None:
+            parser.error("--watch no se puede combinar con --profile")
+        return vigilar_cambios(args)
+    if args.profile is not None:
+        return perfilar(generar, args, ruta=args.profile,
+                        cantidad=args.profile_top)
+    return generar(args)
 
 
 if __name__ == "__main__":
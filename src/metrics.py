@@ -0,0 +1,146 @@
+"""
+Metricas de una ejecucion del generador: tiempos por fase y por
+template, contadores e histogramas, exportables como JSON o como archivo
+de texto de Prometheus (node_exporter textfile collector)
+"""
+import contextlib
+import json
+import os
+import tempfile
+import time
+
+FASES = ("carga", "esquema", "render", "validacion", "escritura")
+# Limites superiores en segundos de los buckets de los histogramas
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+PREFIJO = "manifest_generator"
+
+
+class Histograma:
+    """
+    Histograma acumulativo como los de Prometheus
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.cuentas = [0] * len(buckets)
+        self.suma = 0.0
+        self.cantidad = 0
+
+    def observar(self, valor):
+        self.suma += valor
+        self.cantidad += 1
+        for indice, limite in enumerate(self.buckets):
+            if valor <= limite:
+                self.cuentas[indice] += 1
+
+    def como_dict(self):
+        return {"buckets": dict(zip(map(str, self.buckets), self.cuentas)),
+                "suma": round(self.suma, 6), "cantidad": self.cantidad}
+
+
+class Metricas:
+    """
+    Tiempos por (objetivo, fase), donde objetivo es el manifiesto que
+    produce un template o "values", mas contadores e histogramas por fase
+    """
+
+    def __init__(self):
+        self.tiempos = {}
+        self.contadores = {}
+        self.histogramas = {}
+        self.inicio = time.perf_counter()
+
+    def registrar(self, fase, objetivo, segundos):
+        """
+        Registra una duracion medida afuera, p.ej. en un proceso del pool
+        """
+        por_fase = self.tiempos.setdefault(objetivo, {})
+        por_fase[fase] = por_fase.get(fase, 0.0) + segundos
+        self.histogramas.setdefault(fase, Histograma()).observar(segundos)
+
+    @contextlib.contextmanager
+    def medir(self, fase, objetivo):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(fase, objetivo, time.perf_counter() - inicio)
+
+    def incrementar(self, contador, cantidad=1):
+        self.contadores[contador] = self.contadores.get(contador, 0) + \
+            cantidad
+
+    def imprimir_tiempos(self, archivo=None):
+        """
+        Tabla de milisegundos por objetivo y fase
+        """
+        filas = [
+            (objetivo, *(f"{fases[fase] * 1000:.1f}" if fase in fases
+                         else "-" for fase in FASES),
+             f"{sum(fases.values()) * 1000:.1f}")
+            for objetivo, fases in sorted(self.tiempos.items())
+        ]
+        encabezados = ("OBJETIVO", *(f"{fase.upper()}-MS" for fase in FASES),
+                       "TOTAL-MS")
+        anchos = [max(len(valor) for valor in columna)
+                  for columna in zip(encabezados, *filas)]
+        print(f"\nTiempos por fase (total "
+              f"{time.perf_counter() - self.inicio:.2f}s):", file=archivo)
+        for fila in [encabezados] + filas:
+            print("   ".join(valor.ljust(ancho)
+                             for valor, ancho in zip(fila, anchos)).rstrip(),
+                  file=archivo)
+
+    def como_dict(self):
+        return {
+            "segundos_totales": round(time.perf_counter() - self.inicio, 6),
+            "tiempos": {objetivo: {fase: round(segundos, 6)
+                                   for fase, segundos in fases.items()}
+                        for objetivo, fases in sorted(self.tiempos.items())},
+            "contadores": dict(sorted(self.contadores.items())),
+            "histogramas": {fase: histograma.como_dict()
+                            for fase, histograma in
+                            sorted(self.histogramas.items())},
+        }
+
+    def como_prometheus(self):
+        lineas = []
+        for contador, valor in sorted(self.contadores.items()):
+            nombre = f"{PREFIJO}_{contador}_total"
+            lineas += [f"# TYPE {nombre} counter", f"{nombre} {valor}"]
+        nombre = f"{PREFIJO}_fase_segundos"
+        if self.histogramas:
+            lineas.append(f"# TYPE {nombre} histogram")
+        for fase, histograma in sorted(self.histogramas.items()):
+            for limite, cuenta in zip(histograma.buckets,
+                                      histograma.cuentas):
+                lineas.append(f'{nombre}_bucket{{fase="{fase}",'
+                              f'le="{limite}"}} {cuenta}')
+            lineas += [
+                f'{nombre}_bucket{{fase="{fase}",le="+Inf"}} '
+                f'{histograma.cantidad}',
+                f'{nombre}_sum{{fase="{fase}"}} {histograma.suma:.6f}',
+                f'{nombre}_count{{fase="{fase}"}} {histograma.cantidad}',
+            ]
+        nombre = f"{PREFIJO}_ejecucion_segundos"
+        lineas += [f"# TYPE {nombre} gauge",
+                   f"{nombre} {time.perf_counter() - self.inicio:.6f}"]
+        return "\n".join(lineas) + "\n"
+
+    def exportar(self, ruta, formato=None):
+        """
+        Escribe las metricas en JSON o en formato Prometheus (por defecto
+        segun la extension: .prom es Prometheus). La escritura es atomica
+        para que el colector nunca lea un archivo a medias
+        """
+        if formato is None:
+            formato = "prometheus" if ruta.endswith(".prom") else "json"
+        contenido = (self.como_prometheus() if formato == "prometheus"
+                     else json.dumps(self.como_dict(), indent=2) + "\n")
+        directorio = os.path.dirname(os.path.abspath(ruta))
+        descriptor, temporal = tempfile.mkstemp(dir=directorio,
+                                                suffix=".tmp")
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as f:
+            f.write(contenido)
+        os.chmod(temporal, 0o644)
+        os.replace(temporal, ruta)
@@ -0,0 +1,278 @@
+"""
+Validador offline de manifiestos de Kubernetes
+Valida los objetos renderizados contra esquemas JSON incluidos en schemas/
+sin depender de kubectl ni de un cluster
+"""
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+
+import yaml
+
+try:
+    from . import yaml_io
+except ImportError:
+    import yaml_io
+
+ESQUEMAS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "schemas"
+)
+
+# Esquemas agregados en tiempo de ejecucion por (apiVersion, kind)
+_esquemas_registrados = {}
+
+
+def nombre_esquema(api_version, kind):
+    """
+    Nombre del archivo de esquema, p.ej. apps/v1 Deployment ->
+    apps-v1-deployment.json
+    """
+    return f"{api_version.replace('/', '-')}-{kind}".lower() + ".json"
+
+
+def registrar_esquema(api_version, kind, esquema):
+    """
+    Agrega o reemplaza el esquema de un tipo de objeto
+    """
+    _esquemas_registrados[(api_version, kind)] = esquema
+    obtener_validador.cache_clear()
+
+
+# Tipos de JSON Schema; bool no cuenta como numero
+TIPOS = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: (isinstance(v, (int, float))
+                         and not isinstance(v, bool)),
+}
+
+PALABRAS_SOPORTADAS = {
+    "$schema", "title", "description", "definitions", "$ref", "type",
+    "required", "properties", "additionalProperties", "items", "enum",
+    "const", "pattern", "minimum", "maximum", "minLength", "maxLength",
+    "minItems",
+}
+
+
+class EsquemaNoCompilable(Exception):
+    pass
+
+
+def compilar_esquema(esquema):
+    """
+    Compila el subconjunto de JSON Schema usado en schemas/ a funciones de
+    Python que solo responden si el objeto es valido o no
+    Lanza EsquemaNoCompilable si el esquema usa otras palabras clave
+    """
+    definiciones = esquema.get("definitions", {})
+    compiladas = {}
+
+    def referencia(ref):
+        if not ref.startswith("#/definitions/"):
+            raise EsquemaNoCompilable(ref)
+        nombre = ref[len("#/definitions/"):]
+        if nombre not in definiciones:
+            raise EsquemaNoCompilable(ref)
+        if nombre not in compiladas:
+            # Se reserva antes de compilar para soportar referencias ciclicas
+            compiladas[nombre] = None
+            compiladas[nombre] = compilar(definiciones[nombre])
+        if compiladas[nombre] is None:
+            return lambda v: compiladas[nombre](v)
+        return compiladas[nombre]
+
+    def compilar(nodo):
+        if not isinstance(nodo, dict):
+            raise EsquemaNoCompilable(nodo)
+        desconocidas = set(nodo) - PALABRAS_SOPORTADAS
+        if desconocidas:
+            raise EsquemaNoCompilable(desconocidas)
+        if "$ref" in nodo:
+            return referencia(nodo["$ref"])
+        checks = []
+        if "type" in nodo:
+            tipos = nodo["type"]
+            if isinstance(tipos, str):
+                tipos = [tipos]
+            funciones = [TIPOS[t] for t in tipos]
+            if len(funciones) == 1:
+                checks.append(funciones[0])
+            else:
+                checks.append(lambda v: any(f(v) for f in funciones))
+        if "const" in nodo:
+            constante = nodo["const"]
+            checks.append(lambda v: v == constante)
+        if "enum" in nodo:
+            opciones = nodo["enum"]
+            checks.append(lambda v: v in opciones)
+        if "pattern" in nodo:
+            patron = re.compile(nodo["pattern"])
+            checks.append(lambda v: not isinstance(v, str)
+                          or patron.search(v) is not None)
+        if "minLength" in nodo or "maxLength" in nodo:
+            minimo = nodo.get("minLength", 0)
+            maximo = nodo.get("maxLength", float("inf"))
+            checks.append(lambda v: not isinstance(v, str)
+                          or minimo <= len(v) <= maximo)
+        if "minimum" in nodo or "maximum" in nodo:
+            minimo = nodo.get("minimum", float("-inf"))
+            maximo = nodo.get("maximum", float("inf"))
+            checks.append(lambda v: not TIPOS["number"](v)
+                          or minimo <= v <= maximo)
+        if "minItems" in nodo:
+            minimo = nodo["minItems"]
+            checks.append(lambda v: not isinstance(v, list)
+                          or len(v) >= minimo)
+        if "items" in nodo:
+            item = compilar(nodo["items"])
+            checks.append(lambda v: not isinstance(v, list)
+                          or all(item(x) for x in v))
+        if "required" in nodo:
+            requeridas = list(nodo["required"])
+            checks.append(lambda v: not isinstance(v, dict)
+                          or all(k in v for k in requeridas))
+        if "properties" in nodo or "additionalProperties" in nodo:
+            propiedades = {k: compilar(sub)
+                           for k, sub in nodo.get("properties", {}).items()}
+            adicional = nodo.get("additionalProperties", True)
+            if isinstance(adicional, dict):
+                adicional = compilar(adicional)
+
+            def check_objeto(v):
+                if not isinstance(v, dict):
+                    return True
+                for clave, valor in v.items():
+                    sub = propiedades.get(clave)
+                    if sub is not None:
+                        if not sub(valor):
+                            return False
+                    elif adicional is False:
+                        return False
+                    elif adicional is not True and not adicional(valor):
+                        return False
+                return True
+            checks.append(check_objeto)
+        if not checks:
+            return lambda v: True
+        if len(checks) == 1:
+            return checks[0]
+
+        def check_todos(v):
+            for check in checks:
+                if not check(v):
+                    return False
+            return True
+        return check_todos
+
+    return compilar(esquema)
+
+
+def huella_esquemas():
+    """
+    Hash de los esquemas disponibles, cambia si se edita o agrega uno
+    """
+    h = hashlib.sha256()
+    if os.path.isdir(ESQUEMAS_DIR):
+        for nombre in sorted(os.listdir(ESQUEMAS_DIR)):
+            stat = os.stat(os.path.join(ESQUEMAS_DIR, nombre))
+            h.update(f"{nombre}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    for clave in sorted(_esquemas_registrados):
+        h.update(json.dumps([clave, _esquemas_registrados[clave]],
+                            sort_keys=True).encode())
+    return h.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def obtener_validador(api_version, kind):
+    """
+    Devuelve (es_valido, validador) para (apiVersion, kind), o None si no
+    hay esquema para ese tipo. es_valido es la version compilada y rapida,
+    validador (jsonschema) solo se usa para detallar los errores
+    """
+    esquema = _esquemas_registrados.get((api_version, kind))
+    if esquema is None:
+        ruta = os.path.join(ESQUEMAS_DIR, nombre_esquema(api_version, kind))
+        if not os.path.isfile(ruta):
+            return None
+        with open(ruta, 'r', encoding='utf-8') as f:
+            esquema = json.load(f)
+    from jsonschema.validators import validator_for
+
+    clase = validator_for(esquema)
+    # El esquema se revisa una sola vez, no en cada validacion
+    clase.check_schema(esquema)
+    validador = clase(esquema)
+    try:
+        es_valido = compilar_esquema(esquema)
+    except EsquemaNoCompilable:
+        es_valido = validador.is_valid
+    return es_valido, validador
+
+
+def errores_objeto(objeto):
+    """
+    Devuelve la lista de errores de un objeto de Kubernetes
+    """
+    if not isinstance(objeto, dict):
+        return ["el documento no es un objeto de Kubernetes"]
+    api_version = objeto.get("apiVersion")
+    kind = objeto.get("kind")
+    if not isinstance(api_version, str) or not isinstance(kind, str):
+        return ["faltan apiVersion o kind"]
+    nombre = (objeto.get("metadata") or {}).get("name", "")
+    compilado = obtener_validador(api_version, kind)
+    if compilado is None:
+        return [f"{kind}/{nombre}: no hay esquema para {api_version} {kind} "
+                f"en {ESQUEMAS_DIR}"]
+    es_valido, validador = compilado
+    # Camino rapido: la mayoria de objetos son validos
+    if es_valido(objeto):
+        return []
+    return [f"{kind}/{nombre}: {error.json_path}: {error.message}"
+            for error in validador.iter_errors(objeto)]
+
+
+def errores_manifiesto(contenido_manifiesto):
+    """
+    Devuelve los errores de todos los objetos de un manifiesto
+    """
+    try:
+        documentos = list(yaml_io.cargar_todos(contenido_manifiesto))
+    except yaml.YAMLError as e:
+        return [f"YAML invalido: {e}"]
+    errores = []
+    for documento in documentos:
+        if documento is not None:
+            errores.extend(errores_objeto(documento))
+    return errores
+
+
+def validar_manifiesto_offline(contenido_manifiesto, nombre_archivo=""):
+    """
+    Valida manifiesto contra los esquemas incluidos, sin kubectl
+    """
+    errores = errores_manifiesto(contenido_manifiesto)
+    if errores:
+        print(f"Error en manifiesto {nombre_archivo}:")
+        print("\n".join(errores))
+        return False
+    print(f"Manifiesto {nombre_archivo} válido")
+    return True
+
+
+def validar_manifiestos_offline_lote(manifiestos):
+    """
+    Valida varios manifiestos (etiqueta, contenido) y devuelve un dict
+    etiqueta -> error, con None para los manifiestos validos
+    """
+    resultado = {}
+    for etiqueta, contenido in manifiestos:
+        errores = errores_manifiesto(contenido)
+        resultado[etiqueta] = "\n".join(errores) if errores else None
+    return resultado
@@ -0,0 +1,106 @@
+"""
+Escritura de manifiestos generados en el directorio de output
+Solo reescribe los archivos que cambiaron, lo hace de forma atomica y
+puede eliminar los manifiestos que ya no produce ningun template
+"""
+import hashlib
+import os
+import tempfile
+
+ESCRITO = "escrito"
+SIN_CAMBIOS = "sin_cambios"
+EXTENSIONES_MANIFIESTO = (".yaml", ".yml")
+
+
+def hash_archivo(ruta):
+    """
+    sha256 del contenido de un archivo
+    """
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(65536), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+class EscritorManifiestos:
+    """
+    Escribe los manifiestos de una ejecucion y lleva la cuenta de
+    archivos escritos, sin cambios y eliminados
+    """
+
+    def __init__(self):
+        self.directorios = set()
+        self.producidos = set()
+        self.escritos = 0
+        self.sin_cambios = 0
+        self.eliminados = 0
+        # mkstemp crea los archivos con 0600, se respeta el umask del usuario
+        umask = os.umask(0)
+        os.umask(umask)
+        self.modo = 0o666 & ~umask
+
+    def _crear_directorio(self, directorio):
+        # Cada directorio se crea una sola vez por ejecucion
+        if directorio and directorio not in self.directorios:
+            os.makedirs(directorio, exist_ok=True)
+            self.directorios.add(directorio)
+
+    def escribir(self, contenido, ruta):
+        """
+        Escribe el contenido solo si difiere del archivo existente
+        Devuelve ESCRITO o SIN_CAMBIOS
+        """
+        ruta = os.path.abspath(ruta)
+        self.producidos.add(ruta)
+        datos = contenido.encode('utf-8')
+        try:
+            if (os.path.getsize(ruta) == len(datos) and hash_archivo(ruta)
+                    == hashlib.sha256(datos).hexdigest()):
+                self.sin_cambios += 1
+                return SIN_CAMBIOS
+        except FileNotFoundError:
+            pass
+        directorio = os.path.dirname(ruta)
+        self._crear_directorio(directorio)
+        # Archivo temporal + rename: nunca queda un manifiesto a medias
+        descriptor, temporal = tempfile.mkstemp(
+            dir=directorio, prefix=f".{os.path.basename(ruta)}.",
+            suffix=".tmp"
+        )
+        try:
+            with os.fdopen(descriptor, 'wb') as f:
+                f.write(datos)
+            os.chmod(temporal, self.modo)
+            os.replace(temporal, ruta)
+        except BaseException:
+            os.unlink(temporal)
+            raise
+        self.escritos += 1
+        return ESCRITO
+
+    def podar(self, directorio_output):
+        """
+        Elimina los manifiestos de directorio_output que no se produjeron
+        en esta ejecucion y los directorios que quedan vacios
+        """
+        eliminados = []
+        raiz = os.path.abspath(directorio_output)
+        for actual, _, archivos in os.walk(raiz, topdown=False):
+            for nombre in archivos:
+                ruta = os.path.join(actual, nombre)
+                if (nombre.endswith(EXTENSIONES_MANIFIESTO)
+                        and ruta not in self.producidos):
+                    os.unlink(ruta)
+                    eliminados.append(ruta)
+            if actual != raiz and not os.listdir(actual):
+                os.rmdir(actual)
+        self.eliminados += len(eliminados)
+        return eliminados
+
+    def resumen(self):
+        """
+        Linea con la cantidad de archivos escritos, sin cambios y eliminados
+        """
+        return (f"Archivos: {self.escritos} escritos, {self.sin_cambios} "
+                f"sin cambios, {self.eliminados} eliminados")
@@ -0,0 +1,344 @@
+"""
+Canary progresivo: el canary recibe trafico por pasos de peso (p.ej.
+10/25/50/100) escalando sus replicas contra las del stable, con un tiempo
+de espera y un control de salud entre pasos
+Un planificador de eventos avanza los canaries de muchas apps en un solo
+proceso, sin bloquear en ninguna
+"""
+import heapq
+import importlib
+import itertools
+import math
+import os
+import re
+import time
+
+try:
+    from . import cluster_client
+except ImportError:
+    import cluster_client
+
+PASOS = (10, 25, 50, 100)
+ETIQUETA_TRACK = "track"
+ETIQUETA_CANARY = "manifest-generator/canary"
+ETIQUETA_APP = "manifest-generator/app"
+ETIQUETA_DUENO = "manifest-generator/owner"
+
+
+def dueno_actual(dueno=None):
+    """
+    Dueño de los canaries como valor de etiqueta valido: el indicado o el
+    usuario del sistema
+    """
+    dueno = dueno or os.environ.get("USER") or "desconocido"
+    dueno = re.sub(r"[^A-Za-z0-9_.-]", "-", dueno)[:63].strip("-_.")
+    return dueno or "desconocido"
+
+
+def etiquetas_canary(app_name, dueno=None):
+    """
+    Etiquetas comunes de todos los objetos canary, para encontrarlos con
+    un solo listado por selector
+    """
+    return {ETIQUETA_CANARY: "true", ETIQUETA_APP: app_name,
+            ETIQUETA_DUENO: dueno_actual(dueno)}
+
+
+class Planificador:
+    """
+    Bucle de eventos con una cola de prioridad por momento de ejecucion
+    Cada tarea devuelve en cuantos segundos quiere volver a ejecutarse, o
+    None cuando termino. El reloj y la espera se pueden reemplazar para
+    simular el tiempo
+    """
+
+    def __init__(self, reloj=time.monotonic, dormir=time.sleep):
+        self.reloj = reloj
+        self.dormir = dormir
+        self.cola = []
+        self.contador = itertools.count()
+        self.ejecuciones = 0
+
+    def programar(self, demora, tarea):
+        heapq.heappush(self.cola, (self.reloj() + demora,
+                                   next(self.contador), tarea))
+
+    def ejecutar(self):
+        while self.cola:
+            momento, _, tarea = heapq.heappop(self.cola)
+            espera = momento - self.reloj()
+            if espera > 0:
+                self.dormir(espera)
+            self.ejecuciones += 1
+            demora = tarea()
+            if demora is not None:
+                self.programar(demora, tarea)
+
+
+class RelojSimulado:
+    """
+    Reloj virtual: dormir avanza el tiempo sin esperar
+    """
+
+    def __init__(self):
+        self.ahora = 0.0
+
+    def __call__(self):
+        return self.ahora
+
+    def dormir(self, segundos):
+        self.ahora += segundos
+
+
+def gate_listo(cliente, app, canary):
+    """
+    Control de salud por defecto: el rollout del canary termino y todas
+    sus replicas estan disponibles. None si todavia no se sabe
+    """
+    deployment = cliente.obtener("deployment", canary)
+    if deployment is None:
+        return False, "el deployment canary ya no existe"
+    listo, mensaje = cluster_client.estado_deployment(deployment)
+    return (True, mensaje) if listo else (None, mensaje)
+
+
+def gate_siempre(cliente, app, canary):
+    return True, "sin control de salud"
+
+
+GATES = {"listo": gate_listo, "ninguno": gate_siempre}
+
+
+def cargar_gate(nombre):
+    """
+    Control de salud por nombre ("listo", "ninguno") o como
+    modulo:funcion con la firma gate(cliente, app, canary) -> (ok, motivo)
+    donde ok es True, False o None (todavia no se sabe)
+    """
+    if nombre in GATES:
+        return GATES[nombre]
+    if ":" not in nombre:
+        raise ValueError(f"control de salud desconocido: {nombre}")
+    modulo, funcion = nombre.split(":", 1)
+    return getattr(importlib.import_module(modulo), funcion)
+
+
+def objeto_canary(stable, imagen, app_name, dueno=None):
+    """
+    Deployment canary de una app con 0 replicas: sus pods tienen la
+    etiqueta app del stable, asi el service del stable reparte el trafico
+    segun la cantidad de replicas de cada uno
+    """
+    nombre = f"{app_name}-canary"
+    etiquetas = dict(stable["spec"]["selector"]["matchLabels"],
+                     **{ETIQUETA_TRACK: "canary"})
+    template = stable["spec"]["template"]
+    contenedores = [dict(contenedor, image=imagen)
+                    if contenedor.get("name") == app_name else contenedor
+                    for contenedor in template["spec"]["containers"]]
+    return {
+        "apiVersion": "apps/v1",
+        "kind": "Deployment",
+        "metadata": {"name": nombre, "labels": dict(
+            etiquetas, **etiquetas_canary(app_name, dueno)
+        )},
+        "spec": {
+            "replicas": 0,
+            "selector": {"matchLabels": etiquetas},
+            "template": {
+                "metadata": {"labels": dict(
+                    (template.get("metadata") or {}).get("labels") or {},
+                    **etiquetas
+                )},
+                "spec": dict(template["spec"], containers=contenedores)
+            }
+        }
+    }
+
+
+def replicas_canary(total, peso):
+    """
+    Replicas del canary para un peso en %, al menos una si el peso es
+    mayor a 0
+    """
+    return min(total, max(1 if peso > 0 else 0,
+                          math.ceil(total * peso / 100)))
+
+
+class CanaryProgresivo:
+    """
+    Avance del canary de una app, como tarea del Planificador
+    Estados: iniciar -> esperar (tiempo del paso) -> verificar (control de
+    salud) -> siguiente paso ... -> promover -> completado o abortado
+    """
+
+    def __init__(self, cliente, app_name, imagen, pasos=PASOS, espera=60,
+                 gate=gate_listo, intervalo=5, timeout_paso=300,
+                 reloj=time.monotonic, dueno=None):
+        self.cliente = cliente
+        self.app = app_name
+        self.stable = f"{app_name}-deployment"
+        self.canary = f"{app_name}-canary"
+        self.imagen = imagen
+        self.pasos = list(pasos)
+        self.espera = espera
+        self.gate = gate
+        self.intervalo = intervalo
+        self.timeout_paso = timeout_paso
+        self.reloj = reloj
+        self.dueno = dueno
+        self.estado = "iniciar"
+        self.paso = 0
+        self.total = None
+        # Lo que esta corrida cambio en el cluster: al abortar solo se
+        # revierte eso, nunca un canary de otro pipeline
+        self.canary_creado = False
+        self.stable_escalado = False
+        self.inicio = reloj()
+        self.inicio_paso = None
+        self.resultado = None
+        self.detalle = ""
+        self.segundos = 0.0
+
+    def __call__(self):
+        try:
+            return getattr(self, f"_{self.estado}")()
+        except cluster_client.ErrorCluster as e:
+            return self._abortar(str(e))
+
+    def _terminar(self, resultado, detalle):
+        self.estado = resultado
+        self.resultado = resultado
+        self.detalle = detalle
+        self.segundos = self.reloj() - self.inicio
+        return None
+
+    def _escalar(self, peso):
+        canary = replicas_canary(self.total, peso)
+        self.cliente.parchear("deployment", self.canary,
+                              {"spec": {"replicas": canary}})
+        self.stable_escalado = True
+        self.cliente.parchear("deployment", self.stable,
+                              {"spec": {"replicas": self.total - canary}})
+        self.inicio_paso = self.reloj()
+
+    def _iniciar(self):
+        stable = self.cliente.obtener("deployment", self.stable)
+        if stable is None:
+            return self._terminar("abortado", f'deployment "{self.stable}" '
+                                              f'no encontrado')
+        # objeto_canary y la promocion cambian la imagen del contenedor
+        # con el nombre de la app: sin el, el canary correria la imagen
+        # vieja
+        contenedores = stable["spec"]["template"]["spec"]["containers"]
+        if not any(c.get("name") == self.app for c in contenedores):
+            return self._terminar("abortado", f"el deployment no tiene un "
+                                              f"contenedor {self.app}")
+        self.total = stable["spec"].get("replicas", 1)
+        self.cliente.crear(objeto_canary(stable, self.imagen, self.app,
+                                         self.dueno))
+        self.canary_creado = True
+        self._escalar(self.pasos[0])
+        self.estado = "verificar"
+        return self.espera
+
+    def _verificar(self):
+        ok, motivo = self.gate(self.cliente, self.app, self.canary)
+        if ok is None:
+            if self.reloj() - self.inicio_paso >= self.timeout_paso:
+                return self._abortar(f"timeout en el paso "
+                                     f"{self.pasos[self.paso]}%: {motivo}")
+            return self.intervalo
+        if not ok:
+            return self._abortar(f"control de salud fallido en el paso "
+                                 f"{self.pasos[self.paso]}%: {motivo}")
+        if self.paso + 1 < len(self.pasos):
+            self.paso += 1
+            self._escalar(self.pasos[self.paso])
+            return self.espera
+        return self._promover()
+
+    def _promover(self):
+        # El stable pasa a la nueva imagen con todas sus replicas y recien
+        # cuando esta listo se elimina el canary
+        self.cliente.parchear("deployment", self.stable, {"spec": {
+            "replicas": self.total,
+            "template": {"spec": {"containers": [
+                {"name": self.app, "image": self.imagen}
+            ]}}
+        }})
+        self.inicio_paso = self.reloj()
+        self.estado = "esperar_stable"
+        return self._esperar_stable()
+
+    def _esperar_stable(self):
+        listo, mensaje = self.cliente.estado_rollout(self.stable)
+        if not listo:
+            if self.reloj() - self.inicio_paso >= self.timeout_paso:
+                return self._terminar("fallido", f"timeout promoviendo: "
+                                                 f"{mensaje}")
+            return self.intervalo
+        self.cliente.eliminar("deployment", self.canary)
+        return self._terminar("completado", f"promovido a {self.imagen}")
+
+    def _abortar(self, motivo):
+        # Se devuelve todo el trafico al stable y se elimina el canary
+        try:
+            if self.stable_escalado:
+                self.cliente.parchear("deployment", self.stable,
+                                      {"spec": {"replicas": self.total}})
+            if self.canary_creado:
+                self.cliente.eliminar("deployment", self.canary)
+        except cluster_client.ErrorCluster as e:
+            motivo += f" (error al revertir: {e})"
+        return self._terminar("abortado", motivo)
+
+
+def ejecutar_canaries(cliente, apps, imagen, pasos=PASOS, espera=60,
+                      gate=gate_listo, intervalo=5, timeout_paso=300,
+                      planificador=None, dueno=None):
+    """
+    Avanza el canary progresivo de todas las apps en un solo bucle de
+    eventos. Devuelve la lista de CanaryProgresivo con sus resultados
+    """
+    planificador = planificador or Planificador()
+    canaries = [CanaryProgresivo(cliente, app, imagen, pasos, espera, gate,
+                                 intervalo, timeout_paso,
+                                 reloj=planificador.reloj, dueno=dueno)
+                for app in apps]
+    for canary in canaries:
+        planificador.programar(0, canary)
+    planificador.ejecutar()
+    return canaries
+
+
+def simular(cantidad_apps, pasos=PASOS, espera=60, replicas=4):
+    """
+    Corre el canary progresivo de muchas apps contra un cluster en memoria
+    con reloj simulado. Devuelve (canaries, planificador, segundos reales)
+    """
+    cliente = cluster_client.BackendMemoria()
+    for numero in range(cantidad_apps):
+        app = f"app-{numero}"
+        etiquetas = {"app": app}
+        cliente.crear({
+            "apiVersion": "apps/v1", "kind": "Deployment",
+            "metadata": {"name": f"{app}-deployment", "labels": etiquetas},
+            "spec": {
+                "replicas": replicas,
+                "selector": {"matchLabels": etiquetas},
+                "template": {
+                    "metadata": {"labels": etiquetas},
+                    "spec": {"containers": [{"name": app,
+                                             "image": "app:1"}]}
+                }
+            }
+        })
+    reloj = RelojSimulado()
+    planificador = Planificador(reloj=reloj, dormir=reloj.dormir)
+    inicio = time.perf_counter()
+    canaries = ejecutar_canaries(
+        cliente, [f"app-{numero}" for numero in range(cantidad_apps)],
+        "app:2", pasos, espera, planificador=planificador
+    )
+    return canaries, planificador, time.perf_counter() - inicio
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Cliente liviano del servidor de render: no importa jinja2, jsonschema ni
+yaml, solo manda la peticion por el socket y escribe lo que recibe
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+
+# output_writer solo usa la biblioteca estandar
+try:
+    from . import output_writer
+except ImportError:
+    import output_writer
+
+VARIABLE_SOCKET = "MANIFEST_RENDER_SOCKET"
+SOCKET_POR_DEFECTO = os.path.join(".manifest-cache", "render.sock")
+
+
+def pedir(peticion, ruta=None, timeout=60):
+    """
+    Manda una peticion al servidor y devuelve su respuesta
+    Lanza OSError si no hay servidor escuchando
+    """
+    ruta = ruta or os.environ.get(VARIABLE_SOCKET) or SOCKET_POR_DEFECTO
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conexion:
+        conexion.settimeout(timeout)
+        conexion.connect(ruta)
+        conexion.sendall(json.dumps(peticion).encode('utf-8') + b"\n")
+        with conexion.makefile('rb') as respuesta:
+            linea = respuesta.readline()
+    if not linea:
+        raise OSError(f"el servidor de render en {ruta} cerro la conexion")
+    return json.loads(linea)
+
+
+def nombre_template(ruta):
+    """
+    Los templates que existen desde el directorio actual se mandan con
+    ruta absoluta, el resto se buscan en templates/ del servidor
+    """
+    return os.path.abspath(ruta) if os.path.isfile(ruta) else ruta
+
+
+def escribir(documentos, output):
+    """
+    Escribe los documentos en el directorio de output (de forma atomica y
+    solo los que cambiaron) o en stdout. Devuelve False si algun archivo
+    no se pudo guardar
+    """
+    if not output or output == "-":
+        for documento in documentos:
+            sys.stdout.write("---\n" + documento["contenido"].strip() + "\n")
+        return True
+    escritor = output_writer.EscritorManifiestos()
+    ok = True
+    for documento in documentos:
+        ruta = os.path.join(output, documento["manifiesto"])
+        try:
+            estado = escritor.escribir(documento["contenido"], ruta)
+        except OSError as e:
+            print(f"Error al guardar archivo: {e}", file=sys.stderr)
+            ok = False
+            continue
+        if estado == output_writer.ESCRITO:
+            print(f"Manifiesto guardado en: {ruta}", file=sys.stderr)
+        else:
+            print(f"Manifiesto sin cambios: {ruta}", file=sys.stderr)
+    print(escritor.resumen(), file=sys.stderr)
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Renderiza con el servidor de render residente"
+    )
+    parser.add_argument('--templates', '-t', nargs='+', required=True,
+                        help='Templates (rutas o nombres en templates/)')
+    parser.add_argument('--values', '-v', required=True,
+                        help='Archivo de values (.yaml)')
+    parser.add_argument('--set', action='append', metavar='CLAVE=VALOR',
+                        help='Pisa un valor de los values')
+    parser.add_argument('--output', '-o',
+                        help='Directorio de output; sin el o con - los '
+                             'manifiestos van a stdout')
+    parser.add_argument('--no-validate', action='store_true',
+                        help='No validar los manifiestos')
+    parser.add_argument('--checksums', action='store_true',
+                        help='Anotar el checksum de cada objeto')
+    parser.add_argument('--socket', '-s',
+                        help=f'Socket del servidor (default: '
+                             f'${VARIABLE_SOCKET} o {SOCKET_POR_DEFECTO})')
+    args = parser.parse_args(argv)
+    peticion = {
+        "templates": [nombre_template(ruta) for ruta in args.templates],
+        "values_file": os.path.abspath(args.values),
+        "set": args.set or [],
+        "validate": not args.no_validate,
+        "checksums": args.checksums,
+    }
+    try:
+        respuesta = pedir(peticion, args.socket)
+    except (OSError, ValueError) as e:
+        print(f"Error: no se pudo usar el servidor de render ({e}); "
+              f"iniciarlo con python src/render_server.py", file=sys.stderr)
+        return 1
+    for error in respuesta["errores"]:
+        print(f"Error: {error}", file=sys.stderr)
+    escrito = False
+    if respuesta["errores"]:
+        print("Los manifiestos NO son validos, no se guardan",
+              file=sys.stderr)
+    else:
+        escrito = escribir(respuesta["documentos"], args.output)
+    print(f"Render: {len(respuesta['documentos'])} manifiestos, "
+          f"{len(respuesta['errores'])} errores en {respuesta['ms']:.1f} ms",
+          file=sys.stderr)
+    return 0 if escrito else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Servidor de render residente para CI
+Atiende peticiones de render y validacion por un socket Unix local, con
+los templates compilados, los values parseados y los validadores de
+esquemas ya cargados, asi cada paso de CI no paga el arranque del
+generador. El protocolo es una linea JSON por peticion y por respuesta:
+
+    {"templates": ["deployment.yaml.template"], "values": {...}}
+    {"documentos": [{"template": ..., "manifiesto": ..., "contenido": ...}],
+     "errores": [...], "ms": 1.2}
+
+En vez de "values" se puede mandar "values_file" (una ruta que el
+servidor lee y guarda en memoria mientras no cambie) y "set" con
+asignaciones clave.ruta=valor. "validate" (true por defecto) valida los
+manifiestos contra los esquemas offline y "checksums" los anota. Como el
+generador, si hay algun error no se devuelve ningun documento
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import time
+
+import yaml
+
+try:
+    from . import (checksum, manifest_generator, offline_validator,
+                   template_engine, values_layers, yaml_io)
+except ImportError:
+    import checksum
+    import manifest_generator
+    import offline_validator
+    import template_engine
+    import values_layers
+    import yaml_io
+
+VARIABLE_SOCKET = "MANIFEST_RENDER_SOCKET"
+SOCKET_POR_DEFECTO = os.path.join(".manifest-cache", "render.sock")
+
+
+def ruta_socket(ruta=None):
+    """
+    Socket elegido: el argumento, MANIFEST_RENDER_SOCKET o el de
+    .manifest-cache
+    """
+    return ruta or os.environ.get(VARIABLE_SOCKET) or SOCKET_POR_DEFECTO
+
+
+def ruta_template(nombre):
+    """
+    Las rutas relativas se buscan en templates/
+    """
+    if os.path.isabs(nombre):
+        return nombre
+    return os.path.join(template_engine.TEMPLATES_DIR, nombre)
+
+
+def values_peticion(peticion):
+    """
+    Values de la peticion con los --set aplicados
+    Lanza ValueError si faltan o no se pueden leer
+    """
+    values = peticion.get("values")
+    if values is None and peticion.get("values_file"):
+        try:
+            values = yaml_io.leer_archivo(peticion["values_file"])
+        except OSError as e:
+            raise ValueError(f"no se pudo leer {peticion['values_file']}: "
+                             f"{e.strerror}")
+        except yaml.YAMLError as e:
+            raise ValueError(f"YAML invalido en {peticion['values_file']}: "
+                             f"{e}")
+    if not isinstance(values, dict):
+        raise ValueError("la peticion necesita values o values_file con un "
+                         "mapa de values")
+    return values_layers.fusionar(
+        values, values_layers.capa_asignaciones(peticion.get("set"))
+    )
+
+
+def renderizar(nombre, values, validar=True, anotar=False):
+    """
+    Renderiza un template y devuelve (documento, errores)
+    """
+    template = template_engine.obtener_template(ruta_template(nombre))
+    if template is None:
+        return None, [f"{nombre}: no se pudo cargar el template"]
+    try:
+        contenido = template.render(**values)
+        if anotar:
+            contenido = checksum.anotar_manifiesto(contenido)
+    except Exception as e:
+        return None, [f"{nombre}: error al generar manifiesto: {e}"]
+    manifiesto = manifest_generator.nombre_manifiesto(nombre)
+    errores = []
+    if validar:
+        errores = [f"{manifiesto}: {error}" for error in
+                   offline_validator.errores_manifiesto(contenido)]
+    return {"template": nombre, "manifiesto": manifiesto,
+            "contenido": contenido}, errores
+
+
+def procesar(peticion):
+    """
+    Atiende una peticion y devuelve la respuesta
+    """
+    inicio = time.perf_counter()
+    documentos = []
+    errores = []
+    try:
+        if not isinstance(peticion, dict):
+            raise ValueError("la peticion debe ser un objeto JSON")
+        values = values_peticion(peticion)
+        errores = [f"values {error['ruta']}: {error['mensaje']}"
+                   for error in manifest_generator.errores_values(values)]
+        if not errores:
+            for nombre in peticion.get("templates") or []:
+                documento, errores_template = renderizar(
+                    nombre, values, peticion.get("validate", True),
+                    peticion.get("checksums", False)
+                )
+                if documento is not None:
+                    documentos.append(documento)
+                errores.extend(errores_template)
+    except ValueError as e:
+        errores.append(str(e))
+    except Exception as e:
+        # Una peticion mal formada (p.ej. "set": [1]) no debe cortar la
+        # conexion: el cliente recibe el error en la respuesta
+        errores.append(f"peticion invalida: {type(e).__name__}: {e}")
+    if errores:
+        # Un render con errores no produce manifiestos a medias
+        documentos = []
+    return {"documentos": documentos, "errores": errores,
+            "ms": round((time.perf_counter() - inicio) * 1000, 3)}
+
+
+class ManejadorRender(socketserver.StreamRequestHandler):
+    """
+    Una conexion puede mandar varias peticiones, una por linea
+    """
+
+    def handle(self):
+        for linea in self.rfile:
+            if not linea.strip():
+                continue
+            try:
+                respuesta = procesar(json.loads(linea))
+            except ValueError as e:
+                respuesta = {"documentos": [],
+                             "errores": [f"peticion invalida: {e}"]}
+            self.wfile.write(json.dumps(respuesta).encode('utf-8') + b"\n")
+            self.wfile.flush()
+
+
+class ServidorRender(socketserver.ThreadingMixIn,
+                     socketserver.UnixStreamServer):
+    """
+    Un hilo por cliente: los templates compilados y los validadores son
+    compartidos y de solo lectura
+    """
+    daemon_threads = True
+    # Con la cola por defecto (5) los clientes concurrentes de un CI
+    # reciben EAGAIN al conectarse
+    request_queue_size = 128
+
+
+def socket_activo(ruta):
+    prueba = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        prueba.connect(ruta)
+        return True
+    except OSError:
+        return False
+    finally:
+        prueba.close()
+
+
+def crear_servidor(ruta=None):
+    """
+    Crea el servidor en el socket, reemplazando un socket abandonado
+    Lanza OSError si ya hay un servidor escuchando
+    """
+    ruta = ruta_socket(ruta)
+    if os.path.exists(ruta):
+        if socket_activo(ruta):
+            raise OSError(f"ya hay un servidor de render en {ruta}")
+        os.unlink(ruta)
+    directorio = os.path.dirname(ruta)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    servidor = ServidorRender(ruta, ManejadorRender)
+    os.chmod(ruta, 0o600)
+    return servidor
+
+
+def precalentar():
+    """
+    Compila los templates de templates/ y carga los validadores
+    renderizando una vez el values.yaml de ejemplo
+    """
+    nombres = sorted(nombre for nombre in os.listdir(
+        template_engine.TEMPLATES_DIR) if nombre.endswith(".template"))
+    ejemplo = os.path.join(template_engine.TEMPLATES_DIR, "values.yaml")
+    manifest_generator.obtener_validador_values()
+    if os.path.isfile(ejemplo):
+        procesar({"templates": nombres, "values_file": ejemplo})
+    return len(nombres)
+
+
+def servir(ruta=None):
+    ruta = ruta_socket(ruta)
+    try:
+        servidor = crear_servidor(ruta)
+    except OSError as e:
+        print(f"Error: {e}")
+        return 1
+    # SIGTERM (docker stop, fin del job de CI) cierra igual que Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        inicio = time.perf_counter()
+        cantidad = precalentar()
+        print(f"Servidor de render en {ruta} ({cantidad} templates "
+              f"precalentados en {(time.perf_counter() - inicio) * 1000:.0f}"
+              f" ms)", flush=True)
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        if os.path.exists(ruta):
+            os.unlink(ruta)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Servidor de render residente por socket Unix"
+    )
+    parser.add_argument(
+        '--socket', '-s',
+        help=f'Ruta del socket (default: ${VARIABLE_SOCKET} o '
+             f'{SOCKET_POR_DEFECTO})'
+    )
+    args = parser.parse_args(argv)
+    return servir(args.socket)
+
+
+if __name__ == "__main__":
+    exit(main())
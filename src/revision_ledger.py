@@ -0,0 +1,128 @@
+"""
+Registro local de revisiones desplegadas por app
+Cada despliegue agrega una linea al historial de la app con los hashes de
+sus manifiestos renderizados; los manifiestos se guardan una sola vez en
+un almacen de blobs comprimido
+"""
+import fcntl
+import hashlib
+import json
+import os
+import re
+import time
+
+try:
+    from . import yaml_io
+    from .blob_store import AlmacenBlobs
+except ImportError:
+    import yaml_io
+    from blob_store import AlmacenBlobs
+
+LEDGER_DIR = ".manifest-ledger"
+PATRON_APP = re.compile(r"^[a-z0-9]([-a-z0-9.]*[a-z0-9])?$")
+
+
+def huella_values(values):
+    """
+    sha256 de los values canonicalizados
+    """
+    contenido = json.dumps(values, sort_keys=True, separators=(",", ":"),
+                           default=str)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+class Ledger:
+    """
+    Historial append-only en <directorio>/apps/<app>.jsonl, indexado por
+    app: listar las revisiones de una app solo lee su archivo
+    """
+
+    def __init__(self, directorio=None):
+        self.directorio = directorio or LEDGER_DIR
+        self.blobs = AlmacenBlobs(os.path.join(self.directorio, "blobs"),
+                                  comprimir=True)
+
+    def _ruta_app(self, app):
+        if not PATRON_APP.match(app):
+            raise ValueError(f"nombre de app invalido: {app}")
+        return os.path.join(self.directorio, "apps", f"{app}.jsonl")
+
+    def apps(self):
+        directorio = os.path.join(self.directorio, "apps")
+        if not os.path.isdir(directorio):
+            return []
+        return sorted(nombre[:-len(".jsonl")]
+                      for nombre in os.listdir(directorio)
+                      if nombre.endswith(".jsonl"))
+
+    def historial(self, app):
+        """
+        Revisiones registradas de una app, de la mas vieja a la mas nueva
+        """
+        try:
+            with open(self._ruta_app(app), 'r') as f:
+                return [json.loads(linea) for linea in f if linea.strip()]
+        except FileNotFoundError:
+            return []
+
+    def registrar(self, app, manifiestos, huella=None, origen="deploy"):
+        """
+        Agrega una revision con los manifiestos (nombre, contenido) de la
+        app y la huella de sus values (huella_values). Si los manifiestos
+        son iguales a los de la ultima revision no se agrega nada y se
+        devuelve None
+        """
+        hashes = {nombre: self.blobs.guardar_bytes(contenido.encode('utf-8'))
+                  for nombre, contenido in manifiestos}
+        ruta = self._ruta_app(app)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, 'a+') as f:
+            # El lock serializa a dos despliegues de la misma app
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            lineas = [linea for linea in f if linea.strip()]
+            ultima = json.loads(lineas[-1]) if lineas else None
+            if ultima and ultima["manifiestos"] == hashes:
+                return None
+            entrada = {
+                "revision": ultima["revision"] + 1 if ultima else 1,
+                "timestamp": time.time(),
+                "origen": origen,
+                "values": huella,
+                "manifiestos": hashes,
+            }
+            f.write(json.dumps(entrada, sort_keys=True) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        return entrada
+
+    def buscar(self, app, revision=None):
+        """
+        Revision pedida de una app, o la ultima con manifiestos distintos
+        a los actuales si no se indica. None si no existe
+        """
+        historial = self.historial(app)
+        if not historial:
+            return None
+        if revision is not None:
+            return next((entrada for entrada in historial
+                         if entrada["revision"] == revision), None)
+        actual = historial[-1]["manifiestos"]
+        return next((entrada for entrada in reversed(historial)
+                     if entrada["manifiestos"] != actual), None)
+
+    def manifiestos(self, entrada):
+        """
+        Lista de (nombre, contenido) de una revision
+        """
+        return [(nombre, self.blobs.leer(suma).decode('utf-8'))
+                for nombre, suma in sorted(entrada["manifiestos"].items())]
+
+    def objetos(self, entrada):
+        """
+        Objetos de Kubernetes de una revision
+        """
+        return [documento
+                for _, contenido in self.manifiestos(entrada)
+                for documento in yaml_io.cargar_todos(contenido)
+                if isinstance(documento, dict)]
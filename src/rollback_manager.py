@@ -1,6 +1,13 @@
 #!/usr/bin/env python3
 import argparse
-import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+try:
+    from . import cluster_client, revision_ledger
+except ImportError:
+    import cluster_client
+    import revision_ledger
 
 
 def mostrar_historial_deployment(app_name):
@@ -10,23 +17,24 @@ def mostrar_historial_deployment(app_name):
     try:
         deployment_name = f"{app_name}-deployment"
         print(f"\nHistorial de {deployment_name}:")
-        resultado = subprocess.run([
-            'kubectl', 'rollout', 'history',
-            f'deployment/{deployment_name}'
-        ], capture_output=True, text=True)
-        if resultado.returncode == 0:
-            print(resultado.stdout)
-            return True
-        else:
-            print("Error al intentar obtener historial:")
-            print(resultado.stderr)
-            return False
+        historial = cluster_client.obtener_cliente().historial_rollout(
+            deployment_name
+        )
+        cluster_client.imprimir_tabla(
+            ("REVISION", "CHANGE-CAUSE"),
+            [(numero, causa or "<none>") for numero, causa in historial]
+        )
+        return True
+    except cluster_client.ErrorCluster as e:
+        print("Error al intentar obtener historial:")
+        print(e)
+        return False
     except Exception as e:
         print(f"Error: {e}")
         return False
 
 
-def rollback_deployment(app_name, revision=None):
+def rollback_deployment(app_name, revision=None, timeout=None):
     """
     Realiza rollback de un deployment a la version anterior o especifica
     """
@@ -35,43 +43,242 @@ def rollback_deployment(app_name, revision=None):
         if revision:
             print(f""" Haciendo rollback de {deployment_name}
             a revision {revision} """)
-            cmd = ['kubectl', 'rollout', 'undo',
-                   f'deployment/{deployment_name}',
-                   f'--to-revision={revision}']
         else:
             print(f""" \nHaciendo rollback de {deployment_name}
                   a version anterior""")
-            cmd = ['kubectl', 'rollout', 'undo',
-                   f'deployment/{deployment_name}']
-        resultado = subprocess.run(cmd, capture_output=True, text=True)
-        if resultado.returncode == 0:
-            print("Rollback iniciado correctamente")
-            print(resultado.stdout)
-            print("\nVerificando estado del rollback")
-            status_result = subprocess.run([
-                'kubectl', 'rollout', 'status',
-                f'deployment/{deployment_name}'
-            ], capture_output=True, text=True)
-            if status_result.returncode == 0:
-                print("Rollback completado exitosamente")
-                subprocess.run([
-                    'kubectl', 'get', 'pods', '-l',
-                    f'app={app_name}'
-                ])
-                return True
-            else:
-                print("Rollback completado pero con advertencias")
-                return False
-        else:
+        cliente = cluster_client.obtener_cliente()
+        try:
+            mensaje = cliente.deshacer_rollout(deployment_name,
+                                               revision_destino=revision)
+        except cluster_client.ErrorCluster as e:
             print("Error en rollback:")
-            print(resultado.stderr)
+            print(e)
+            return False
+        print("Rollback iniciado correctamente")
+        print(mensaje)
+        print("\nVerificando estado del rollback")
+        listo, mensaje = cliente.esperar_rollout(deployment_name,
+                                                 timeout=timeout)
+        if listo:
+            print("Rollback completado exitosamente")
+            cluster_client.imprimir_objetos(
+                "pod", cliente.listar("pod", selector=f"app={app_name}")
+            )
+            return True
+        else:
+            print("Rollback completado pero con advertencias")
+            print(mensaje)
             return False
     except Exception as e:
         print(f"Error: {e}")
         return False
 
 
-def main():
+def mostrar_historial_ledger(app_name):
+    """
+    Muestra las revisiones de una app registradas en el ledger local, sin
+    consultar el cluster
+    """
+    try:
+        historial = revision_ledger.Ledger().historial(app_name)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return False
+    if not historial:
+        print(f"No hay revisiones de {app_name} en el ledger")
+        return False
+    print(f"\nHistorial de {app_name} (ledger local):")
+    cluster_client.imprimir_tabla(
+        ("REVISION", "FECHA", "ORIGEN", "VALUES", "MANIFIESTOS"),
+        [(entrada["revision"],
+          time.strftime("%Y-%m-%d %H:%M:%S",
+                        time.localtime(entrada["timestamp"])),
+          entrada["origen"], (entrada["values"] or "-")[:12],
+          ",".join(sorted(entrada["manifiestos"])))
+         for entrada in historial]
+    )
+    return True
+
+
+def restaurar_revision_ledger(app_name, revision=None):
+    """
+    Vuelve a aplicar todos los objetos (deployment, service, ...) de una
+    revision del ledger y la registra como nueva revision
+    Devuelve la entrada restaurada, lanza ErrorCluster si no existe
+    """
+    ledger = revision_ledger.Ledger()
+    entrada = ledger.buscar(app_name, revision)
+    if entrada is None:
+        if revision:
+            raise cluster_client.ErrorCluster(
+                f"no se encontro la revision {revision} de {app_name} en el "
+                f"ledger"
+            )
+        raise cluster_client.ErrorCluster(
+            f"no hay una revision anterior de {app_name} en el ledger"
+        )
+    cluster_client.obtener_cliente().aplicar(ledger.objetos(entrada))
+    ledger.registrar(app_name, ledger.manifiestos(entrada), entrada["values"],
+                     origen=f"rollback a revision {entrada['revision']}")
+    return entrada
+
+
+def rollback_ledger(app_name, revision=None, timeout=None):
+    """
+    Rollback de una app desde el ledger local
+    """
+    print(f"\nHaciendo rollback de {app_name} desde el ledger local")
+    try:
+        entrada = restaurar_revision_ledger(app_name, revision)
+        print(f"Revision {entrada['revision']} aplicada "
+              f"({', '.join(sorted(entrada['manifiestos']))})")
+        cliente = cluster_client.obtener_cliente()
+        for objeto in revision_ledger.Ledger().objetos(entrada):
+            if objeto.get("kind") != "Deployment":
+                continue
+            namespace, _, nombre = cluster_client.clave_objeto(objeto)
+            listo, mensaje = cliente.esperar_rollout(nombre, namespace,
+                                                     timeout=timeout)
+            if not listo:
+                print("Rollback completado pero con advertencias")
+                print(mensaje)
+                return False
+        print("Rollback completado exitosamente")
+        return True
+    except (cluster_client.ErrorCluster, OSError, ValueError) as e:
+        print("Error en rollback:")
+        print(e)
+        return False
+
+
+def deshacer_con_ledger(apps, revision=None):
+    """
+    Undo para rollback_masivo que restaura cada app desde el ledger
+    """
+    app_de = {f"{app}-deployment": app for app in apps}
+
+    def deshacer_uno(nombre):
+        restaurar_revision_ledger(app_de[nombre], revision)
+    return deshacer_uno
+
+
+def deployments_por_selector(selector):
+    """
+    Nombres de los deployments que coinciden con un selector de etiquetas
+    """
+    return [deployment["metadata"]["name"] for deployment in
+            cluster_client.obtener_cliente().listar("deployment",
+                                                    selector=selector)]
+
+
+def rollback_masivo(deployments, revision=None, jobs=8, timeout=300,
+                    timeout_global=900, intervalo=2.0, deshacer_uno=None):
+    """
+    Hace rollback de varios deployments: los undo se lanzan en paralelo
+    (hasta jobs a la vez) y el progreso de todos se sigue con un solo
+    listado de deployments por vuelta
+    Cada deployment tiene timeout segundos desde su undo y el conjunto
+    timeout_global segundos. deshacer_uno(deployment) reemplaza al undo
+    del cluster. Devuelve un dict deployment -> resultado
+    """
+    cliente = cluster_client.obtener_cliente()
+    if deshacer_uno is None:
+        def deshacer_uno(nombre):
+            cliente.deshacer_rollout(nombre, revision_destino=revision)
+    inicio_global = time.monotonic()
+    resultados = {nombre: {"resultado": None, "detalle": "",
+                           "inicio": inicio_global, "segundos": 0.0}
+                  for nombre in deployments}
+
+    def restante_global():
+        return inicio_global + timeout_global - time.monotonic()
+
+    def deshacer(nombre):
+        resultados[nombre]["inicio"] = time.monotonic()
+        try:
+            # Cada llamada al cluster del undo respeta el timeout de la
+            # app y el global
+            with cliente.plazo(min(timeout, restante_global())):
+                deshacer_uno(nombre)
+        except (cluster_client.ErrorCluster, OSError, ValueError) as e:
+            vencido = getattr(e, "codigo", None) == 504
+            terminar(nombre, "timeout" if vencido else "error", str(e))
+
+    def terminar(nombre, resultado, detalle):
+        actual = resultados[nombre]
+        if actual["resultado"] is not None:
+            return
+        actual.update(resultado=resultado, detalle=detalle,
+                      segundos=time.monotonic() - actual["inicio"])
+
+    pool = ThreadPoolExecutor(max_workers=jobs)
+    futuros = {pool.submit(deshacer, nombre): nombre
+               for nombre in deployments}
+    _, sin_terminar = wait(futuros, timeout=max(0, restante_global()))
+    # Un undo colgado no frena el rollback: los que no terminaron o no
+    # llegaron a empezar vencen con el limite global
+    pool.shutdown(wait=False, cancel_futures=True)
+    for futuro in sin_terminar:
+        terminar(futuros[futuro], "timeout global",
+                 "el undo no termino antes del limite global")
+
+    pendientes = [nombre for nombre in deployments
+                  if resultados[nombre]["resultado"] is None]
+    while pendientes:
+        try:
+            vivos = {deployment["metadata"]["name"]: deployment
+                     for deployment in cliente.listar("deployment")}
+            error = None
+        except cluster_client.ErrorCluster as e:
+            # Un fallo del listado se reintenta en la proxima vuelta
+            # mientras no venzan los timeouts
+            vivos, error = None, f"error consultando el cluster: {e}"
+        ahora = time.monotonic()
+        for nombre in pendientes:
+            if vivos is None:
+                listo, mensaje = False, error
+            elif nombre not in vivos:
+                terminar(nombre, "error", "el deployment ya no existe")
+                continue
+            else:
+                listo, mensaje = cluster_client.estado_deployment(
+                    vivos[nombre]
+                )
+            if listo:
+                terminar(nombre, "ok", mensaje)
+            elif ahora - resultados[nombre]["inicio"] >= timeout:
+                terminar(nombre, "timeout", mensaje)
+            elif ahora - inicio_global >= timeout_global:
+                terminar(nombre, "timeout global", mensaje)
+        pendientes = [nombre for nombre in pendientes
+                      if resultados[nombre]["resultado"] is None]
+        if pendientes:
+            # No se duerme mas alla del proximo vencimiento
+            vencimientos = [inicio_global + timeout_global] + [
+                resultados[nombre]["inicio"] + timeout
+                for nombre in pendientes
+            ]
+            time.sleep(max(0, min(intervalo,
+                                  min(vencimientos) - time.monotonic())))
+    return resultados
+
+
+def mostrar_resultados_rollback(resultados):
+    """
+    Tabla final con el resultado y la duracion del rollback de cada
+    deployment
+    """
+    cluster_client.imprimir_tabla(
+        ("DEPLOYMENT", "RESULTADO", "DURACION", "DETALLE"),
+        [(nombre, datos["resultado"], f"{datos['segundos']:.1f}s",
+          datos["detalle"]) for nombre, datos in resultados.items()]
+    )
+    correctos = sum(1 for datos in resultados.values()
+                    if datos["resultado"] == "ok")
+    print(f"\n{correctos} de {len(resultados)} rollbacks completados")
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(
         description="Historial de revisiones y rollback"
     )
@@ -83,7 +290,15 @@ def main():
     parser.add_argument(
         '--rollback',
         metavar='APP_NAME',
-        help='Hacer rollback del deployment especificado'
+        nargs='+',
+        help='Hacer rollback de los deployments de una o varias apps'
+    )
+    parser.add_argument(
+        '--selector',
+        '-l',
+        metavar='SELECTOR',
+        help='Hacer rollback de los deployments que coinciden con el '
+             'selector de etiquetas (p.ej. tier=backend)'
     )
     parser.add_argument(
         '--rollback-revision',
@@ -91,11 +306,74 @@ def main():
         type=int,
         help='Revision especifica para rollback'
     )
-    args = parser.parse_args()
-    if args.rollback:
-        if not rollback_deployment(args.rollback, args.rollback_revision):
+    parser.add_argument(
+        '--ledger',
+        action='store_true',
+        help='Usar el ledger local de despliegues del generador para el '
+             'historial y el rollback (reaplica todos los objetos de la '
+             'revision)'
+    )
+    parser.add_argument(
+        '--jobs',
+        '-j',
+        type=int,
+        default=8,
+        help='Cantidad de rollbacks lanzados en paralelo (default: 8)'
+    )
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=300,
+        help='Segundos de espera por el rollout de cada deployment '
+             '(default: 300)'
+    )
+    parser.add_argument(
+        '--global-timeout',
+        type=float,
+        default=900,
+        help='Segundos maximos para todo el rollback masivo (default: 900)'
+    )
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        print("Error: --jobs debe ser al menos 1")
+        return 1
+    if args.ledger and args.selector:
+        print("Error: --selector no se puede usar con --ledger")
+        return 1
+    if args.selector or (args.rollback and len(args.rollback) > 1):
+        deshacer_uno = (deshacer_con_ledger(args.rollback,
+                                            args.rollback_revision)
+                        if args.ledger else None)
+        try:
+            deployments = [f"{app}-deployment" for app in args.rollback or []]
+            if args.selector:
+                deployments += deployments_por_selector(args.selector)
+        except cluster_client.ErrorCluster as e:
+            print(f"Error: {e}")
+            return 1
+        if not deployments:
+            print("No hay deployments para hacer rollback")
+            return 1
+        resultados = rollback_masivo(
+            list(dict.fromkeys(deployments)), args.rollback_revision,
+            args.jobs, args.timeout, args.global_timeout,
+            deshacer_uno=deshacer_uno
+        )
+        mostrar_resultados_rollback(resultados)
+        if any(datos["resultado"] != "ok" for datos in resultados.values()):
+            return 1
+    elif args.rollback and args.ledger:
+        if not rollback_ledger(args.rollback[0], args.rollback_revision,
+                               args.timeout):
+            return 1
+    elif args.rollback:
+        if not rollback_deployment(args.rollback[0], args.rollback_revision,
+                                   args.timeout):
+            return 1
+    if args.history and args.ledger:
+        if not mostrar_historial_ledger(args.history):
             return 1
-    if args.history:
+    elif args.history:
         if not mostrar_historial_deployment(args.history):
             return 1
     return 0
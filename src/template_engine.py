@@ -0,0 +1,175 @@
+"""
+Motor de templates compartido para el generador de manifiestos
+Mantiene un unico Environment de jinja2, un LRU de templates compilados
+y un cache de bytecode en disco reutilizable entre ejecuciones, y sabe
+que variables de los values usa cada template
+jinja2 se importa recien al crear el Environment: importar este modulo no
+lo carga, asi los comandos que no renderizan arrancan rapido
+"""
+import hashlib
+import os
+from functools import lru_cache
+
+TEMPLATES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates"
+)
+BYTECODE_DIR = os.path.join(".manifest-cache", "bytecode")
+TAMANO_LRU = 256
+
+_entorno = None
+
+
+def cargar_ruta_absoluta(template):
+    """
+    Carga templates por ruta absoluta, para los que estan fuera de templates/
+    (funcion de un FunctionLoader: None si no es un template de este tipo)
+    """
+    if not os.path.isabs(template) or not os.path.isfile(template):
+        return None
+    mtime = os.path.getmtime(template)
+    with open(template, 'r', encoding='utf-8') as f:
+        contenido = f.read()
+    return contenido, template, lambda: os.path.getmtime(template) == mtime
+
+
+def _crear_bytecode_cache():
+    """
+    Crea el cache de bytecode en disco, si no se puede se trabaja sin el
+    """
+    from jinja2 import FileSystemBytecodeCache
+
+    try:
+        os.makedirs(BYTECODE_DIR, exist_ok=True)
+        return FileSystemBytecodeCache(BYTECODE_DIR)
+    except OSError as e:
+        print(f"Aviso: cache de bytecode deshabilitado ({e})")
+        return None
+
+
+def obtener_entorno():
+    """
+    Devuelve el Environment compartido, creandolo la primera vez
+    """
+    global _entorno
+    if _entorno is None:
+        from jinja2 import (ChoiceLoader, Environment, FileSystemLoader,
+                            FunctionLoader)
+
+        # cache_size=0: el LRU de este modulo es el unico cache en memoria
+        _entorno = Environment(
+            loader=ChoiceLoader([
+                FileSystemLoader(TEMPLATES_DIR),
+                FunctionLoader(cargar_ruta_absoluta)
+            ]),
+            bytecode_cache=_crear_bytecode_cache(),
+            cache_size=0,
+            auto_reload=False
+        )
+    return _entorno
+
+
+def reiniciar_entorno():
+    """
+    Descarta el Environment y los templates compilados en memoria
+    """
+    global _entorno
+    _entorno = None
+    _compilar_ruta.cache_clear()
+    _compilar_texto.cache_clear()
+    variables_template.cache_clear()
+
+
+def _nombre_template(ruta_abs):
+    """
+    Nombre con el que se pide el template al loader
+    """
+    relativa = os.path.relpath(ruta_abs, TEMPLATES_DIR)
+    if relativa.startswith(os.pardir):
+        return ruta_abs
+    return relativa.replace(os.sep, "/")
+
+
+@lru_cache(maxsize=TAMANO_LRU)
+def _compilar_ruta(ruta_abs, mtime_ns):
+    # mtime_ns forma parte de la clave para invalidar al editar el archivo
+    return obtener_entorno().get_template(_nombre_template(ruta_abs))
+
+
+@lru_cache(maxsize=TAMANO_LRU)
+def _compilar_texto(contenido_template):
+    entorno = obtener_entorno()
+    bytecode_cache = entorno.bytecode_cache
+    if bytecode_cache is None:
+        return entorno.from_string(contenido_template)
+    # El contenido es la clave del bucket, asi no hay colisiones entre textos
+    nombre = hashlib.sha256(contenido_template.encode('utf-8')).hexdigest()
+    bucket = bytecode_cache.get_bucket(
+        entorno, nombre, None, contenido_template
+    )
+    if bucket.code is None:
+        bucket.code = entorno.compile(contenido_template, nombre)
+        bytecode_cache.set_bucket(bucket)
+    return entorno.template_class.from_code(
+        entorno, bucket.code, entorno.make_globals(None)
+    )
+
+
+def obtener_template(ruta_template):
+    """
+    Devuelve el template compilado de un archivo, usando el LRU por ruta+mtime
+    """
+    from jinja2 import TemplateNotFound
+
+    ruta_abs = os.path.abspath(ruta_template)
+    try:
+        mtime_ns = os.stat(ruta_abs).st_mtime_ns
+    except FileNotFoundError:
+        print(f"Error: No se encontro el archivo {ruta_template}")
+        return None
+    try:
+        return _compilar_ruta(ruta_abs, mtime_ns)
+    except TemplateNotFound:
+        print(f"Error: No se encontro el archivo {ruta_template}")
+        return None
+    except Exception as e:
+        print(f"Error al compilar template {ruta_template}: {e}")
+        return None
+
+
+def obtener_template_desde_texto(contenido_template):
+    """
+    Devuelve el template compilado a partir de su contenido
+    """
+    return _compilar_texto(contenido_template)
+
+
+@lru_cache(maxsize=TAMANO_LRU)
+def variables_template(contenido_template):
+    """
+    Variables que el template lee de los values: las no declaradas en el
+    propio template segun el AST (jinja2.meta), sin los globals de jinja2
+    Devuelve None si no se pueden saber: el template no compila o incluye,
+    extiende o importa otros templates
+    """
+    from jinja2 import TemplateSyntaxError, meta
+
+    entorno = obtener_entorno()
+    try:
+        ast = entorno.parse(contenido_template)
+    except TemplateSyntaxError:
+        return None
+    if any(True for _ in meta.find_referenced_templates(ast)):
+        return None
+    return frozenset(meta.find_undeclared_variables(ast)
+                     - set(entorno.globals))
+
+
+def mapa_dependencias(variables_por_template):
+    """
+    Invierte {template: variables} en {variable: [templates]}
+    """
+    mapa = {}
+    for template, variables in variables_por_template.items():
+        for variable in variables or ():
+            mapa.setdefault(variable, []).append(template)
+    return mapa
@@ -0,0 +1,100 @@
+"""
+Capas de values: varios archivos --values fusionados en orden (cada capa
+pisa a las anteriores) y asignaciones --set clave.ruta=valor al final
+La fusion comparte con la base los subarboles que una capa no toca, asi
+una flota de muchas apps no copia la base una vez por app: los values
+fusionados son de solo lectura
+"""
+from functools import lru_cache
+
+import yaml
+
+try:
+    from . import yaml_io
+except ImportError:
+    import yaml_io
+
+
+def fusionar(base, capa, borrar_nulos=True):
+    """
+    Fusion profunda de capa sobre base sin modificar ninguna de las dos
+    Los dicts se fusionan por clave, el resto de los valores (listas,
+    escalares) se reemplaza y un valor null elimina la clave, como en Helm
+    Con borrar_nulos=False los null se conservan, para juntar capas que
+    todavia no se aplicaron sobre la base
+    """
+    if not isinstance(base, dict) or not isinstance(capa, dict):
+        return capa
+    resultado = dict(base)
+    for clave, valor in capa.items():
+        if valor is None and borrar_nulos:
+            resultado.pop(clave, None)
+        elif isinstance(valor, dict) and isinstance(base.get(clave), dict):
+            resultado[clave] = fusionar(base[clave], valor, borrar_nulos)
+        else:
+            resultado[clave] = valor
+    return resultado
+
+
+def leer_asignacion(asignacion):
+    """
+    Capa de un --set clave.ruta=valor; el valor se interpreta como YAML,
+    asi replicas=3 es un entero y debug=true un booleano
+    """
+    if "=" not in asignacion:
+        raise ValueError(f"--set invalido, se espera clave=valor: "
+                         f"{asignacion}")
+    ruta, texto = asignacion.split("=", 1)
+    claves = ruta.strip().split(".")
+    if not all(claves):
+        raise ValueError(f"--set con una clave vacia: {asignacion}")
+    try:
+        valor = yaml_io.cargar(texto) if texto else ""
+    except yaml.YAMLError:
+        valor = texto
+    capa = valor
+    for clave in reversed(claves):
+        capa = {clave: capa}
+    return capa
+
+
+def capa_asignaciones(asignaciones):
+    """
+    Una sola capa con todos los --set, en orden. Los null quedan en la
+    capa y eliminan la clave recien al aplicarla sobre los values
+    """
+    capa = {}
+    for asignacion in asignaciones or []:
+        capa = fusionar(capa, leer_asignacion(asignacion),
+                        borrar_nulos=False)
+    return capa
+
+
+def leer_capa(ruta):
+    """
+    Lee una capa de values; un archivo vacio es una capa vacia
+    """
+    capa = yaml_io.leer_archivo(ruta)
+    if capa is None:
+        return {}
+    if not isinstance(capa, dict):
+        raise ValueError(f"{ruta} no es un mapa de values")
+    return capa
+
+
+@lru_cache(maxsize=32)
+def _fusionar_firmas(firmas):
+    values = {}
+    for ruta, _, _ in firmas:
+        values = fusionar(values, leer_capa(ruta))
+    return values
+
+
+def fusionar_capas(rutas):
+    """
+    Fusiona los archivos de values en orden. El resultado se memoriza por
+    ruta, mtime y tamaño: las capas base de una flota se leen y fusionan
+    una sola vez por proceso
+    """
+    return _fusionar_firmas(tuple(yaml_io.firma_archivo(ruta)
+                                  for ruta in rutas))
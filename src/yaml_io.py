@@ -0,0 +1,70 @@
+"""
+Lectura y escritura de YAML de todo el proyecto
+Usa el parser y el emisor en C de libyaml (CSafeLoader, CSafeDumper)
+cuando PyYAML se compilo con libyaml, y los de Python puro si no: la
+salida es la misma, solo cambia la velocidad. Los archivos de values se
+parsean una sola vez por proceso mientras no cambien
+"""
+import os
+
+import yaml
+
+CON_LIBYAML = hasattr(yaml, "CSafeLoader")
+Cargador = yaml.CSafeLoader if CON_LIBYAML else yaml.SafeLoader
+Volcador = yaml.CSafeDumper if CON_LIBYAML else yaml.SafeDumper
+
+# ruta -> (firma, datos parseados)
+_archivos = {}
+
+
+def cargar(stream):
+    """
+    Como yaml.safe_load
+    """
+    return yaml.load(stream, Loader=Cargador)
+
+
+def cargar_todos(stream):
+    """
+    Como yaml.safe_load_all: un generador de documentos
+    """
+    return yaml.load_all(stream, Loader=Cargador)
+
+
+def volcar(datos, stream=None, **opciones):
+    """
+    Como yaml.safe_dump
+    """
+    return yaml.dump(datos, stream, Dumper=Volcador, **opciones)
+
+
+def volcar_todos(documentos, stream=None, **opciones):
+    """
+    Como yaml.safe_dump_all
+    """
+    return yaml.dump_all(documentos, stream, Dumper=Volcador, **opciones)
+
+
+def firma_archivo(ruta):
+    estado = os.stat(ruta)
+    return ruta, estado.st_mtime_ns, estado.st_size
+
+
+def leer_archivo(ruta):
+    """
+    Parsea un archivo YAML, reusando el resultado anterior si la ruta no
+    cambio de mtime ni de tamaño. El resultado es compartido entre los
+    callers: es de solo lectura
+    """
+    firma = firma_archivo(ruta)
+    guardado = _archivos.get(ruta)
+    if guardado is not None and guardado[0] == firma:
+        return guardado[1]
+    with open(ruta, 'r', encoding='utf-8') as f:
+        datos = cargar(f)
+    _archivos[ruta] = (firma, datos)
+    return datos
+
+
+def limpiar_cache():
+    _archivos.clear()
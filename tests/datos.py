@@ -0,0 +1,51 @@
+"""
+Datos de prueba compartidos por varios modulos de tests: values de una
+app, templates del repo, flotas de values y deployments
+"""
+import os
+
+import yaml
+
+import src.cluster_client as cluster_client
+
+values = {
+    "app_name": "test-app",
+    "protocol": "TCP",
+    "image": "nginx:latest",
+    "replicas": 2,
+    "container_port": 80,
+    "service_port": 8080
+}
+
+TEMPLATES = [
+    os.path.join("templates", "deployment.yaml.template"),
+    os.path.join("templates", "service.yaml.template"),
+]
+
+
+def escribir_flota(directorio, apps):
+    for app in apps:
+        datos = dict(values, app_name=app)
+        with open(directorio / f"{app}.yaml", "w") as f:
+            yaml.safe_dump(datos, f)
+
+
+def deployment(app, imagen, causa=None):
+    objeto = {
+        "apiVersion": "apps/v1",
+        "kind": "Deployment",
+        "metadata": {"name": f"{app}-deployment", "labels": {"app": app}},
+        "spec": {
+            "replicas": 2,
+            "selector": {"matchLabels": {"app": app}},
+            "template": {
+                "metadata": {"labels": {"app": app}},
+                "spec": {"containers": [{"name": app, "image": imagen}]}
+            }
+        }
+    }
+    if causa:
+        objeto["metadata"]["annotations"] = {
+            cluster_client.ANOTACION_CAUSA: causa
+        }
+    return objeto
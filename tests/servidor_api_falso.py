@@ -0,0 +1,186 @@
+"""
+Servidor HTTP que imita la API de Kubernetes sobre un BackendMemoria,
+para probar el backend HTTP de punta a punta
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from src.cluster_client import RECURSOS, BackendMemoria, ErrorCluster
+
+TIPOS_POR_RECURSO = {recurso: tipo
+                     for tipo, (_, recurso, _) in RECURSOS.items()}
+
+
+class ManejadorAPI(BaseHTTPRequestHandler):
+    # HTTP/1.1 para que el cliente pueda reutilizar la conexion
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.conexiones += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, codigo, cuerpo):
+        datos = json.dumps(cuerpo).encode('utf-8')
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _cuerpo(self):
+        largo = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(largo)) if largo else None
+
+    def _ruta(self):
+        """
+        (tipo, namespace, nombre, parametros) de la URL pedida
+        """
+        url = urlparse(self.path)
+        partes = url.path.strip("/").split("/")
+        partes = partes[2:] if partes[0] == "api" else partes[3:]
+        namespace = None
+        if partes[0] == "namespaces" and len(partes) > 2:
+            namespace, partes = partes[1], partes[2:]
+        tipo = TIPOS_POR_RECURSO[partes[0]]
+        nombre = partes[1] if len(partes) > 1 else None
+        return tipo, namespace, nombre, parse_qs(url.query)
+
+    def _atender(self, metodo):
+        backend = self.server.backend
+        self.server.peticiones.append((metodo, self.path))
+        try:
+            tipo, namespace, nombre, params = self._ruta()
+            cuerpo = self._cuerpo()
+            if metodo == "GET" and nombre:
+                objeto = backend.obtener(tipo, nombre, namespace)
+                if objeto is None:
+                    raise ErrorCluster(f'{tipo} "{nombre}" no encontrado',
+                                       404)
+                return self._responder(200, objeto)
+            if metodo == "GET" and "watch" in params:
+                return self._observar(backend, tipo, namespace, params)
+            if metodo == "GET":
+                selector = params.get("labelSelector", [None])[0]
+                items, version = backend.listar_version(
+                    tipo, namespace, selector,
+                    todos_namespaces=namespace is None
+                )
+                kind = items[0]["kind"] if items else ""
+                # Como la API real, los items van sin kind ni apiVersion
+                for item in items:
+                    del item["kind"], item["apiVersion"]
+                return self._responder(200, {
+                    "kind": f"{kind}List", "apiVersion": RECURSOS[tipo][0],
+                    "metadata": {"resourceVersion": version},
+                    "items": items
+                })
+            if metodo == "POST":
+                return self._responder(201, backend.crear(cuerpo))
+            if metodo == "PUT":
+                return self._responder(200, backend.reemplazar(cuerpo))
+            if metodo == "PATCH" and "apply-patch" in self.headers.get(
+                    "Content-Type", ""):
+                objeto, creado = backend.aplicar_objeto(cuerpo)
+                return self._responder(201 if creado else 200, objeto)
+            if metodo == "PATCH":
+                return self._responder(200, backend.parchear(
+                    tipo, nombre, cuerpo, namespace
+                ))
+            if metodo == "DELETE" and not nombre:
+                # deletecollection: devuelve los objetos eliminados
+                items = backend.listar(
+                    tipo, namespace, params.get("labelSelector", [None])[0]
+                )
+                for item in items:
+                    backend.eliminar(tipo, item["metadata"]["name"],
+                                     namespace)
+                return self._responder(200, {
+                    "kind": f"{items[0]['kind'] if items else ''}List",
+                    "apiVersion": RECURSOS[tipo][0], "items": items
+                })
+            if metodo == "DELETE":
+                if not backend.eliminar(tipo, nombre, namespace):
+                    raise ErrorCluster(f'{tipo} "{nombre}" no encontrado',
+                                       404)
+                return self._responder(200, {"kind": "Status",
+                                             "status": "Success"})
+        except ErrorCluster as e:
+            return self._responder(e.codigo or 500, {
+                "kind": "Status", "message": str(e), "code": e.codigo
+            })
+
+    def _observar(self, backend, tipo, namespace, params):
+        """
+        Watch: un evento JSON por linea hasta timeoutSeconds, sin largo
+        conocido, asi que la conexion se cierra al terminar
+        """
+        eventos = backend.observar(
+            tipo, params["resourceVersion"][0], namespace,
+            params.get("labelSelector", [None])[0],
+            todos_namespaces=namespace is None,
+            timeout=float(params.get("timeoutSeconds", ["30"])[0])
+        )
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for evento, objeto in eventos:
+                self.wfile.write(json.dumps({"type": evento,
+                                             "object": objeto}).encode()
+                                 + b"\n")
+                self.wfile.flush()
+        except ErrorCluster as e:
+            self.wfile.write(json.dumps({"type": "ERROR", "object": {
+                "kind": "Status", "message": str(e), "code": e.codigo
+            }}).encode() + b"\n")
+
+    def do_GET(self):
+        self._atender("GET")
+
+    def do_POST(self):
+        self._atender("POST")
+
+    def do_PUT(self):
+        self._atender("PUT")
+
+    def do_PATCH(self):
+        self._atender("PATCH")
+
+    def do_DELETE(self):
+        self._atender("DELETE")
+
+
+class ServidorAPIFalso(ThreadingHTTPServer):
+    """
+    API falsa en 127.0.0.1 con un puerto libre; cuenta las conexiones
+    abiertas y guarda las peticiones recibidas
+    """
+    daemon_threads = True
+
+    def __init__(self, backend=None):
+        super().__init__(("127.0.0.1", 0), ManejadorAPI)
+        self.backend = backend or BackendMemoria()
+        self.lock = threading.Lock()
+        self.conexiones = 0
+        self.peticiones = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, args=(0.05,),
+                         daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,95 @@
+import json
+import os
+
+from benchmarks import pipeline
+from src import manifest_generator, yaml_io
+
+
+def test_suite_mide_todas_las_etapas(capsys):
+    resultado = pipeline.ejecutar_suite([2], ["pequeno", "grande"],
+                                        muestra_kubectl=1, repeticiones=1)
+    assert set(resultado["resultados"]) == {"2-pequeno", "2-grande"}
+    etapas = resultado["resultados"]["2-pequeno"]["etapas"]
+    assert set(etapas) == set(pipeline.ETAPAS)
+    assert etapas["generar_manifiesto"]["llamadas"] == 4
+    assert etapas["validar_manifiesto_k8s"]["llamadas"] == 1
+    for etapa in etapas.values():
+        assert etapa["segundos"] >= 0 and etapa["pico_kb"] > 0
+    # Los prints de las etapas no salen por la terminal
+    assert capsys.readouterr().out == ""
+
+
+def test_kubectl_falso_valida_sin_cluster():
+    with pipeline.kubectl_falso():
+        assert manifest_generator.validar_manifiesto_k8s("kind: Pod\n")
+
+
+def resultado(**ms_por_etapa):
+    return {"resultados": {"100-pequeno": {"etapas": {
+        etapa: {"por_llamada_ms": ms} for etapa, ms in ms_por_etapa.items()
+    }}}}
+
+
+def test_compare_falla_con_regresiones(tmp_path, capsys):
+    base = tmp_path / "base.json"
+    actual = tmp_path / "actual.json"
+    base.write_text(json.dumps(resultado(cargar_values=1.0,
+                                         generar_manifiesto=0.5,
+                                         guardar_manifiesto=0.001)))
+    actual.write_text(json.dumps(resultado(cargar_values=1.1,
+                                           generar_manifiesto=0.8,
+                                           guardar_manifiesto=0.005)))
+    assert pipeline.main(["compare", str(base), str(actual)]) == 1
+    salida = capsys.readouterr().out
+    assert "generar_manifiesto   0.500     0.800       +60.0%   REGRESION" \
+        in salida
+    # Debajo de --min-ms no se compara
+    assert "guardar_manifiesto" not in salida
+    assert pipeline.main(["compare", str(base), str(actual),
+                          "--threshold", "70"]) == 0
+    assert "Sin regresiones" in capsys.readouterr().out
+
+
+def test_cargar_values_parsea_en_cada_pasada(monkeypatch):
+    parseos = []
+    cargar = yaml_io.cargar
+
+    def contar(stream):
+        parseos.append(stream)
+        return cargar(stream)
+
+    monkeypatch.setattr(yaml_io, "cargar", contar)
+    pipeline.ejecutar_escenario(2, "pequeno", muestra_kubectl=0,
+                                memoria=False, repeticiones=3)
+    assert len(parseos) == 6
+
+
+def test_compare_escala_la_base_con_la_calibracion(tmp_path, capsys):
+    base = tmp_path / "base.json"
+    actual = tmp_path / "actual.json"
+    base.write_text(json.dumps(dict(resultado(cargar_values=1.0,
+                                              guardar_manifiesto=1.0),
+                                    calibracion_ms=50)))
+    # Una maquina el doble de lenta no es una regresion
+    actual.write_text(json.dumps(dict(resultado(cargar_values=2.1,
+                                                guardar_manifiesto=3.0),
+                                      calibracion_ms=100)))
+    assert pipeline.main(["compare", str(base), str(actual),
+                          "--etapas", "cargar_values"]) == 0
+    salida = capsys.readouterr().out
+    assert "Base escalada x2.00" in salida
+    assert "cargar_values   2.000     2.100       +5.0%" in salida
+    assert "guardar_manifiesto" not in salida
+    assert pipeline.main(["compare", str(base), str(actual)]) == 1
+
+
+def test_base_del_ci_cubre_las_etapas():
+    ruta = os.path.join(pipeline.RAIZ, "benchmarks", "baseline.json")
+    with open(ruta) as f:
+        base = json.load(f)
+    assert base["formato"] == pipeline.VERSION_FORMATO
+    assert base["calibracion_ms"] > 0
+    assert set(base["resultados"]) == {"100-pequeno", "100-grande"}
+    for escenario in base["resultados"].values():
+        assert set(escenario["etapas"]) == set(pipeline.ETAPAS)
+    assert len(pipeline.comparar(base, base)) > 0
@@ -0,0 +1,42 @@
+from src.build_cache import CacheBuild, calcular_clave
+
+
+template = "name: {{ app_name }}"
+
+
+def test_clave_no_depende_del_orden_de_values():
+    clave_a = calcular_clave(template, {"a": 1, "b": {"c": 2, "d": 3}})
+    clave_b = calcular_clave(template, {"b": {"d": 3, "c": 2}, "a": 1})
+    assert clave_a == clave_b
+
+
+def test_clave_cambia_con_template_values_y_extras():
+    base = calcular_clave(template, {"app_name": "a"}, "1.0", "kubectl")
+    assert base != calcular_clave(template + "\n", {"app_name": "a"},
+                                  "1.0", "kubectl")
+    assert base != calcular_clave(template, {"app_name": "b"},
+                                  "1.0", "kubectl")
+    assert base != calcular_clave(template, {"app_name": "a"},
+                                  "1.1", "kubectl")
+    assert base != calcular_clave(template, {"app_name": "a"},
+                                  "1.0", "offline")
+
+
+def test_cache_hit_y_miss(tmp_path):
+    cache = CacheBuild(directorio=str(tmp_path))
+    clave = calcular_clave(template, {"app_name": "a"})
+    assert cache.obtener(clave) is None
+    cache.guardar(clave, "name: a", 0.5)
+    assert cache.obtener(clave) == "name: a"
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.segundos_ahorrados == 0.5
+    assert cache.resumen() == ("Cache de build: 1 hits, 1 misses, "
+                               "~0.50s ahorrados")
+
+
+def test_cache_deshabilitado(tmp_path):
+    cache = CacheBuild(directorio=str(tmp_path), habilitado=False)
+    cache.guardar("abc", "name: a", 0.5)
+    assert cache.obtener("abc") is None
+    assert list(tmp_path.iterdir()) == []
+    assert cache.resumen() == "Cache de build: deshabilitado"
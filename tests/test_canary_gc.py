@@ -0,0 +1,160 @@
+import time
+
+import pytest
+import src.canary_manager as canary_manager
+import src.cluster_client as cluster_client
+from src.cluster_client import BackendHTTP, BackendKubectl, BackendMemoria
+from src.progressive_canary import ETIQUETA_APP, ETIQUETA_DUENO
+from tests.servidor_api_falso import ServidorAPIFalso
+
+HORA = 3600
+
+
+@pytest.fixture
+def cliente():
+    cliente = BackendMemoria()
+    cluster_client.establecer_cliente(cliente)
+    yield cliente
+    cluster_client.establecer_cliente(None)
+
+
+def envejecer(cliente, horas):
+    creado = time.strftime("%Y-%m-%dT%H:%M:%SZ",
+                           time.gmtime(time.time() - horas * HORA))
+    for objeto in cliente.objetos.values():
+        objeto["metadata"]["creationTimestamp"] = creado
+
+
+def test_canary_lleva_etiquetas_comunes(cliente):
+    assert canary_manager.desplegar_canary("web", "nginx:2", "ana")
+    for tipo, nombre in (("deployment", "web-canary"),
+                         ("service", "web-canary-service")):
+        etiquetas = cliente.obtener(tipo, nombre)["metadata"]["labels"]
+        assert etiquetas[ETIQUETA_APP] == "web"
+        assert etiquetas[ETIQUETA_DUENO] == "ana"
+    deployment = cliente.obtener("deployment", "web-canary")
+    assert deployment["spec"]["selector"]["matchLabels"] == {
+        "app": "web-canary"
+    }
+
+
+def test_gc_filtra_por_edad_y_dueno(cliente):
+    for app in ("a", "b", "c"):
+        canary_manager.desplegar_canary(app, "nginx:2", "ana")
+    cliente.namespace = "otro"
+    canary_manager.desplegar_canary("d", "nginx:2", "luis")
+    envejecer(cliente, 30)
+    cliente.namespace = "default"
+    canary_manager.desplegar_canary("nuevo", "nginx:2", "ana")
+
+    viejos, eliminados, errores = canary_manager.recolectar_canaries(
+        cliente, 24 * HORA, dueno="ana", tamano_lote=2
+    )
+    assert sorted(objeto["metadata"]["name"] for _, objeto, _ in viejos) \
+        == ["a-canary", "a-canary-service", "b-canary", "b-canary-service",
+            "c-canary", "c-canary-service"]
+    assert (eliminados, errores) == (6, [])
+    assert cliente.obtener("deployment", "nuevo-canary") is not None
+    assert cliente.obtener("deployment", "d-canary", "otro") is not None
+    # Los ReplicaSets del canary se eliminan en cascada
+    assert not [rs for rs in cliente.listar("replicaset")
+                if rs["metadata"]["name"].startswith("a-canary")]
+
+    viejos, eliminados, _ = canary_manager.recolectar_canaries(
+        cliente, 24 * HORA
+    )
+    assert eliminados == 2
+    assert {objeto["metadata"]["namespace"] for _, objeto, _ in viejos} \
+        == {"otro"}
+
+
+def test_gc_por_lotes_con_kubectl(monkeypatch):
+    llamadas = []
+
+    def kubectl(self, *args, entrada=None, namespace=None):
+        llamadas.append((args, namespace))
+        return "".join(f'deployment.apps "{nombre}" deleted\n'
+                       for nombre in args[2:-1])
+
+    monkeypatch.setattr(BackendKubectl, "_kubectl", kubectl)
+    viejos = [("deployment", {"metadata": {"name": f"app-{i}-canary",
+                                           "namespace": "apps"}}, HORA)
+              for i in range(5)]
+    lotes = canary_manager.lotes_eliminacion(viejos, 2)
+    assert [len(nombres) for _, _, nombres in lotes] == [2, 2, 1]
+    cliente = BackendKubectl()
+    assert sum(cliente.eliminar_lote(tipo, nombres, namespace)
+               for tipo, namespace, nombres in lotes) == 5
+    assert llamadas[0] == (('delete', 'deployment', 'app-0-canary',
+                            'app-1-canary', '--ignore-not-found'), "apps")
+
+
+def test_gc_dry_run_desde_el_cli(cliente, capsys):
+    canary_manager.desplegar_canary("web", "nginx:2", "ana")
+    envejecer(cliente, 2)
+    assert canary_manager.main(["--gc", "--older-than", "1h",
+                                "--dry-run"]) == 0
+    salida = capsys.readouterr().out
+    assert "KIND         NAMESPACE   NAME" in salida
+    assert "2h" in salida
+    assert "2 objetos canary se eliminarian" in salida
+    assert cliente.obtener("deployment", "web-canary") is not None
+    assert canary_manager.main(["--gc", "--older-than", "3h"]) == 0
+    assert "No hay canaries para eliminar" in capsys.readouterr().out
+    assert canary_manager.main(["--gc", "--older-than", "1h"]) == 0
+    assert "2 objetos canary eliminados" in capsys.readouterr().out
+    assert cliente.obtener("deployment", "web-canary") is None
+
+
+def test_gc_por_http_lista_todos_los_namespaces():
+    backend = BackendMemoria()
+    for namespace in ("apps", "default"):
+        backend.namespace = namespace
+        backend.crear(canary_manager.objetos_canary("web", "nginx:2")[0])
+    with ServidorAPIFalso(backend) as api:
+        viejos, eliminados, _ = canary_manager.recolectar_canaries(
+            BackendHTTP(api.url), 0, ahora=time.time() + HORA
+        )
+    assert eliminados == 2
+    assert [peticion for peticion in api.peticiones
+            if peticion[0] == "GET"] == [
+        ("GET", "/apis/apps/v1/deployments?labelSelector="
+                "manifest-generator%2Fcanary%3Dtrue"),
+        ("GET", "/api/v1/services?labelSelector="
+                "manifest-generator%2Fcanary%3Dtrue"),
+    ]
+
+
+def test_gc_por_http_elimina_cada_lote_con_un_delete():
+    backend = BackendMemoria()
+    for app in ("a", "b", "c"):
+        for objeto in canary_manager.objetos_canary(app, "nginx:2", "ana"):
+            backend.crear(objeto)
+    envejecer(backend, 30)
+    for objeto in canary_manager.objetos_canary("nuevo", "nginx:2", "ana"):
+        backend.crear(objeto)
+    with ServidorAPIFalso(backend) as api:
+        viejos, eliminados, errores = canary_manager.recolectar_canaries(
+            BackendHTTP(api.url), 24 * HORA
+        )
+    assert (len(viejos), eliminados, errores) == (6, 6, [])
+    # Los lotes se eliminan en paralelo: el orden no esta fijo
+    assert sorted(peticion for peticion in api.peticiones
+                  if peticion[0] == "DELETE") == [
+        ("DELETE", "/api/v1/namespaces/default/services?"
+                   "labelSelector=manifest-generator%2Fcanary%3Dtrue%2C"
+                   "manifest-generator%2Fapp+in+%28a%2Cb%2Cc%29"),
+        ("DELETE", "/apis/apps/v1/namespaces/default/deployments?"
+                   "labelSelector=manifest-generator%2Fcanary%3Dtrue%2C"
+                   "manifest-generator%2Fapp+in+%28a%2Cb%2Cc%29"),
+    ]
+    assert backend.obtener("deployment", "nuevo-canary") is not None
+    assert backend.obtener("service", "nuevo-canary-service") is not None
+    assert backend.obtener("deployment", "a-canary") is None
+
+
+def test_selector_lote():
+    assert canary_manager.selector_lote(["b", "a"]) == \
+        "manifest-generator/canary=true,manifest-generator/app in (a,b)"
+    assert canary_manager.selector_lote(["a", "a"]) is None
+    assert canary_manager.selector_lote(["a", None]) is None
@@ -0,0 +1,151 @@
+import json
+import os
+import threading
+
+import pytest
+import src.chart_version as chart_version
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    templates = tmp_path / "templates"
+    templates.mkdir()
+    (templates / "deployment.yaml.template").write_text("kind: Deployment\n")
+    (templates / "service.yaml.template").write_text("kind: Service\n")
+    (templates / "values.yaml").write_text("replicas: 1\n")
+    return templates
+
+
+def contar_blobs():
+    return sum(len(archivos) for _, _, archivos
+               in os.walk(chart_version.BLOBS_DIR))
+
+
+def test_versiones_deduplican_archivos_iguales(repo):
+    chart_version.save_all_templates("v1")
+    (repo / "values.yaml").write_text("replicas: 2\n")
+    chart_version.save_all_templates("v2")
+    # 3 archivos en v1 y solo values.yaml cambia en v2
+    assert contar_blobs() == 4
+
+
+def test_listar_versiones_de_un_archivo(repo, capsys):
+    chart_version.save_all_templates("v1")
+    (repo / "values.yaml").write_text("replicas: 20\n")
+    chart_version.save_all_templates("v2")
+    capsys.readouterr()
+    chart_version.list_template_versions()
+    salida = capsys.readouterr().out
+    assert "values.yaml: v1, v2" in salida
+    chart_version.list_template_versions("values.yaml")
+    lineas = capsys.readouterr().out.splitlines()
+    assert lineas[0] == "Versiones de values.yaml:"
+    assert lineas[1].split()[0] == "v1"
+    assert lineas[2].split()[0] == "v2"
+    assert "13 bytes" in lineas[2]
+
+
+def test_mostrar_archivo_sin_restaurar(repo, capsys):
+    chart_version.save_all_templates("v1", compress=True)
+    (repo / "values.yaml").write_text("replicas: 5\n")
+    capsys.readouterr()
+    assert chart_version.main(["show", "v1", "values.yaml"]) == 0
+    assert capsys.readouterr().out == "replicas: 1\n"
+    assert (repo / "values.yaml").read_text() == "replicas: 5\n"
+    assert chart_version.main(["show", "v1", "otro.yaml"]) == 1
+
+
+def test_diff_entre_versiones(repo, capsys, monkeypatch):
+    chart_version.save_all_templates("v1")
+    (repo / "values.yaml").write_text("replicas: 2\n")
+    (repo / "service.yaml.template").unlink()
+    chart_version.save_all_templates("v2")
+    capsys.readouterr()
+    leidos = []
+    leer = chart_version.AlmacenBlobs.leer
+    monkeypatch.setattr(chart_version.AlmacenBlobs, "leer",
+                        lambda self, suma: leidos.append(suma) or
+                        leer(self, suma))
+    assert chart_version.main(["diff", "v1", "v2"]) == 0
+    salida = capsys.readouterr().out
+    assert "--- v1/values.yaml" in salida
+    assert "-replicas: 1" in salida and "+replicas: 2" in salida
+    assert "+++ /dev/null" in salida
+    assert "deployment.yaml.template" not in salida
+    assert "1 archivos sin cambios" in salida
+    # Solo se leen los blobs de archivos con hash distinto
+    assert len(leidos) == 3
+    assert chart_version.main(["diff", "v1", "v9"]) == 1
+
+
+def test_guardados_concurrentes(repo):
+    errores = []
+
+    def guardar(version):
+        try:
+            chart_version.save_all_templates(version)
+        except Exception as error:
+            errores.append(error)
+
+    hilos = [threading.Thread(target=guardar, args=(f"v{i}",))
+             for i in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert errores == []
+    conn = chart_version.connect()
+    versiones = conn.execute("SELECT count(*) FROM versions").fetchone()[0]
+    archivos = conn.execute("SELECT count(*) FROM files").fetchone()[0]
+    conn.close()
+    assert (versiones, archivos) == (8, 24)
+
+
+def test_migra_index_json_antiguo(repo):
+    store = chart_version.AlmacenBlobs(chart_version.BLOBS_DIR)
+    suma = store.guardar_archivo(str(repo / "values.yaml"))
+    os.makedirs(chart_version.SNAPSHOTS_DIR)
+    with open(os.path.join(chart_version.SNAPSHOTS_DIR, "v1.json"),
+              "w") as f:
+        json.dump({"values.yaml": suma}, f)
+    with open(chart_version.INDEX_FILE, "w") as f:
+        json.dump({"values.yaml": ["v1"]}, f)
+    (repo / "values.yaml").write_text("replicas: 7\n")
+    chart_version.load_all_templates("v1")
+    assert (repo / "values.yaml").read_text() == "replicas: 1\n"
+
+
+def test_restaurar_version(repo, capsys):
+    chart_version.save_all_templates("v1")
+    (repo / "values.yaml").write_text("replicas: 5\n")
+    chart_version.load_all_templates("v1")
+    assert (repo / "values.yaml").read_text() == "replicas: 1\n"
+    salida = capsys.readouterr().out
+    assert "Restaurado: values.yaml desde version v1" in salida
+    assert "Sin cambios: service.yaml.template en version v1" in salida
+
+
+def test_version_comprimida(repo):
+    chart_version.save_all_templates("v1", compress=True)
+    blobs = [nombre for _, _, archivos in os.walk(chart_version.BLOBS_DIR)
+             for nombre in archivos]
+    assert all(nombre.endswith(".gz") for nombre in blobs)
+    (repo / "deployment.yaml.template").write_text("roto\n")
+    chart_version.load_all_templates("v1")
+    assert (repo / "deployment.yaml.template").read_text() == \
+        "kind: Deployment\n"
+
+
+def test_version_antigua_con_copia_completa(repo):
+    legacy = os.path.join(chart_version.VERSIONS_DIR, "v0")
+    os.makedirs(legacy)
+    with open(os.path.join(legacy, "values.yaml"), "w") as f:
+        f.write("replicas: 9\n")
+    chart_version.load_all_templates("v0")
+    assert (repo / "values.yaml").read_text() == "replicas: 9\n"
+
+
+def test_version_inexistente(repo, capsys):
+    chart_version.load_all_templates("v9")
+    assert "Version v9 no existe" in capsys.readouterr().out
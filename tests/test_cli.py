@@ -0,0 +1,83 @@
+import os
+import subprocess
+import sys
+
+import yaml
+import src.cli as cli
+from tests.datos import TEMPLATES, values
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUB_KUBECTL = os.path.join(RAIZ, "benchmarks", "stub")
+PESADOS = {"jinja2", "jsonschema"}
+# Presupuesto de milisegundos de import despues del arranque del interprete
+PRESUPUESTO_AYUDA_MS = 100
+PRESUPUESTO_CANARY_MS = 300
+
+
+def tiempos_import(*argumentos):
+    """
+    Corre python -X importtime -m src y devuelve los modulos importados y
+    los ms de import de todo lo que se carga despues de site
+    """
+    entorno = dict(os.environ, MANIFEST_CLUSTER_BACKEND="kubectl",
+                   PATH=STUB_KUBECTL + os.pathsep + os.environ["PATH"])
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "src", *argumentos],
+        cwd=RAIZ, env=entorno, stdin=subprocess.DEVNULL,
+        capture_output=True, text=True
+    )
+    modulos = set()
+    microsegundos = 0
+    despues_de_site = False
+    for linea in proceso.stderr.splitlines():
+        if not linea.startswith("import time:") or "cumulative" in linea:
+            continue
+        _, acumulado, nombre = linea[len("import time:"):].split("|")
+        modulos.add(nombre.strip())
+        if nombre.startswith(" ") and not nombre.startswith("  "):
+            # Modulo de primer nivel: su acumulado incluye a los anidados
+            if despues_de_site:
+                microsegundos += int(acumulado)
+            despues_de_site |= nombre.strip() == "site"
+    return proceso.returncode, modulos, microsegundos / 1000
+
+
+def paquetes(modulos):
+    return {modulo.split(".")[0] for modulo in modulos}
+
+
+def test_ayuda_rapida():
+    codigo, modulos, ms = tiempos_import("--help")
+    assert codigo == 0
+    assert not paquetes(modulos) & (PESADOS | {"yaml"})
+    assert "src.manifest_generator" not in modulos
+    assert ms < PRESUPUESTO_AYUDA_MS
+
+
+def test_canary_status_no_importa_el_render():
+    codigo, modulos, ms = tiempos_import("canary", "--app", "web",
+                                         "--status")
+    assert codigo == 0
+    assert "src.cluster_client" in modulos
+    assert not paquetes(modulos) & PESADOS
+    assert ms < PRESUPUESTO_CANARY_MS
+
+
+def test_render_por_subcomando(tmp_path, capsys):
+    ruta_values = tmp_path / "values.yaml"
+    ruta_values.write_text(yaml.safe_dump(values))
+    programa = sys.argv[0]
+    assert cli.main([
+        'render', '-t', *TEMPLATES, '-v', str(ruta_values),
+        '--validator', 'offline', '--no-cache', '-o', str(tmp_path / "out")
+    ]) == 0
+    assert sys.argv[0] == programa
+    assert sorted(os.listdir(tmp_path / "out")) == ["deployment.yaml",
+                                                    "service.yaml"]
+
+
+def test_subcomando_desconocido(capsys):
+    assert cli.main(["deploy"]) == 2
+    assert "subcomando desconocido deploy" in capsys.readouterr().err
+    assert cli.main([]) == 2
+    assert "render" in capsys.readouterr().out
@@ -0,0 +1,210 @@
+import os
+
+import pytest
+import yaml
+import src.canary_manager as canary_manager
+import src.cluster_client as cluster_client
+import src.manifest_generator as manifest_generator
+import src.rollback_manager as rollback_manager
+from src.checksum import anotar_manifiesto
+from src.cluster_client import BackendHTTP, BackendKubectl, ErrorCluster
+from tests.datos import deployment
+from tests.servidor_api_falso import ServidorAPIFalso
+
+
+def imagen(objeto):
+    return objeto["spec"]["template"]["spec"]["containers"][0]["image"]
+
+
+@pytest.fixture
+def servidor():
+    with ServidorAPIFalso() as servidor:
+        cliente = BackendHTTP(servidor.url)
+        cluster_client.establecer_cliente(cliente)
+        yield servidor, cliente
+        cluster_client.establecer_cliente(None)
+
+
+def test_operaciones_reutilizan_una_conexion(servidor):
+    api, cliente = servidor
+    assert cliente.aplicar([deployment("web", "nginx:1")]) == [
+        "deployment/web-deployment created"
+    ]
+    assert cliente.aplicar([deployment("web", "nginx:2")]) == [
+        "deployment/web-deployment configured"
+    ]
+    assert imagen(cliente.obtener("deployment", "web-deployment")) == \
+        "nginx:2"
+    assert cliente.obtener("deployment", "otro") is None
+    listados = cliente.listar("deployment", selector="app=web")
+    assert [d["kind"] for d in listados] == ["Deployment"]
+    assert cliente.listar("deployment", selector="app=otra") == []
+    assert cliente.eliminar("deployment", "web-deployment")
+    assert not cliente.eliminar("deployment", "web-deployment")
+    assert len(api.peticiones) == 8
+    assert api.conexiones == 1
+
+
+def test_errores_de_la_api(servidor):
+    _, cliente = servidor
+    cliente.crear(deployment("web", "nginx:1"))
+    with pytest.raises(ErrorCluster) as error:
+        cliente.crear(deployment("web", "nginx:1"))
+    assert error.value.codigo == 409
+    assert "ya existe" in str(error.value)
+
+
+def test_rollout_undo_e_historial(servidor):
+    _, cliente = servidor
+    cliente.aplicar([deployment("web", "nginx:1", "version 1")])
+    cliente.aplicar([deployment("web", "nginx:2", "version 2")])
+    assert cliente.historial_rollout("web-deployment") == [
+        (1, "version 1"), (2, "version 2")
+    ]
+    mensaje = cliente.deshacer_rollout("web-deployment")
+    assert mensaje.endswith("revertido a la revision 1")
+    vivo = cliente.obtener("deployment", "web-deployment")
+    assert imagen(vivo) == "nginx:1"
+    assert cluster_client.revision(vivo) == 3
+    assert cliente.esperar_rollout("web-deployment", timeout=1) == (
+        True, 'deployment "web-deployment" desplegado correctamente'
+    )
+    with pytest.raises(ErrorCluster, match="revision 7"):
+        cliente.deshacer_rollout("web-deployment", revision_destino=7)
+
+
+def test_rollback_manager_usa_el_cliente(servidor, capsys):
+    _, cliente = servidor
+    cliente.aplicar([deployment("web", "nginx:1")])
+    cliente.aplicar([deployment("web", "nginx:2")])
+    assert rollback_manager.rollback_deployment("web", revision=1)
+    assert imagen(cliente.obtener("deployment", "web-deployment")) == \
+        "nginx:1"
+    assert rollback_manager.mostrar_historial_deployment("web")
+    salida = capsys.readouterr().out
+    assert "Rollback completado exitosamente" in salida
+    assert "REVISION   CHANGE-CAUSE" in salida
+    assert not rollback_manager.rollback_deployment("otra")
+
+
+def test_canary_desplegar_y_promover(servidor):
+    _, cliente = servidor
+    cliente.aplicar([deployment("web", "nginx:1")])
+    assert canary_manager.desplegar_canary("web", "registry/nginx:2")
+    canary = cliente.obtener("deployment", "web-canary")
+    assert canary["spec"]["template"]["spec"]["containers"][0] == {
+        "name": "nginx", "image": "registry/nginx:2"
+    }
+    service = cliente.obtener("service", "web-canary-service")
+    assert service["spec"]["selector"] == {"app": "web-canary"}
+    assert not canary_manager.desplegar_canary("web", "registry/nginx:2")
+    assert canary_manager.promover_canary("web", "registry/nginx:2")
+    assert imagen(cliente.obtener("deployment", "web-deployment")) == \
+        "registry/nginx:2"
+    assert cliente.obtener("deployment", "web-canary") is None
+    assert cliente.obtener("service", "web-canary-service") is None
+
+
+def test_despliegue_por_http_omite_objetos_sin_cambios(
+        servidor, tmp_path, capsys):
+    api, _ = servidor
+    manifiesto = yaml.safe_dump(deployment("web", "nginx:1"))
+    (tmp_path / "deployment.yaml").write_text(anotar_manifiesto(manifiesto))
+    assert manifest_generator.desplegar_manifiestos(str(tmp_path))
+    assert "1 objetos aplicados, 0 sin cambios" in capsys.readouterr().out
+    assert manifest_generator.desplegar_manifiestos(str(tmp_path))
+    assert "0 objetos aplicados, 1 sin cambios" in capsys.readouterr().out
+    assert api.conexiones == 1
+
+
+def test_obtener_lote_lista_una_vez_por_tipo(servidor):
+    api, cliente = servidor
+    deployments = [deployment(f"app-{i}", "nginx:1") for i in range(5)]
+    cliente.aplicar(deployments[:4] + [deployment("otra", "nginx:1")])
+    service = {"apiVersion": "v1", "kind": "Service",
+               "metadata": {"name": "app-0-service"}}
+    del api.peticiones[:]
+    vivos = cliente.obtener_lote(deployments + [service])
+    assert sorted(vivos) == [
+        (None, "deployment", f"app-{i}-deployment") for i in range(4)
+    ]
+    assert imagen(vivos[(None, "deployment", "app-0-deployment")]) == \
+        "nginx:1"
+    assert api.peticiones == [
+        ("GET", "/apis/apps/v1/namespaces/default/deployments"),
+        ("GET", "/api/v1/namespaces/default/services/app-0-service"),
+    ]
+
+
+def test_kubeconfig_con_token(tmp_path, monkeypatch):
+    kubeconfig = tmp_path / "config"
+    kubeconfig.write_text(yaml.safe_dump({
+        "current-context": "local",
+        "contexts": [{"name": "local", "context": {
+            "cluster": "kind", "user": "admin", "namespace": "apps"
+        }}],
+        "clusters": [{"name": "kind", "cluster": {
+            "server": "https://127.0.0.1:6443",
+            "insecure-skip-tls-verify": True
+        }}],
+        "users": [{"name": "admin", "user": {"token": "secreto"}}],
+    }))
+    monkeypatch.setenv("KUBECONFIG", str(kubeconfig))
+    monkeypatch.delenv("KUBERNETES_SERVICE_HOST", raising=False)
+    backend = cluster_client.crear_backend("auto")
+    assert isinstance(backend, BackendHTTP)
+    assert backend.servidor == "https://127.0.0.1:6443"
+    assert backend.namespace == "apps"
+    assert backend.sesion.headers["Authorization"] == "Bearer secreto"
+    assert backend.sesion.verify is False
+
+
+def test_kubeconfig_con_plugin_usa_kubectl(tmp_path, monkeypatch):
+    kubeconfig = tmp_path / "config"
+    kubeconfig.write_text(yaml.safe_dump({
+        "current-context": "nube",
+        "contexts": [{"name": "nube", "context": {
+            "cluster": "c", "user": "u"
+        }}],
+        "clusters": [{"name": "c", "cluster": {"server": "https://x"}}],
+        "users": [{"name": "u", "user": {"exec": {"command": "aws"}}}],
+    }))
+    monkeypatch.setenv("KUBECONFIG", str(kubeconfig))
+    monkeypatch.delenv("KUBERNETES_SERVICE_HOST", raising=False)
+    assert isinstance(cluster_client.crear_backend("auto"), BackendKubectl)
+    with pytest.raises(ErrorCluster, match="plugin"):
+        cluster_client.crear_backend("http")
+
+
+def test_fusion_estrategica_por_nombre():
+    base = {"containers": [{"name": "a", "image": "1", "ports": [80]},
+                           {"name": "b", "image": "1"}]}
+    parche = {"containers": [{"name": "b", "image": "2"},
+                             {"name": "c", "image": "1"}]}
+    assert cluster_client.fusion_estrategica(base, parche) == {
+        "containers": [{"name": "a", "image": "1", "ports": [80]},
+                       {"name": "b", "image": "2"},
+                       {"name": "c", "image": "1"}]
+    }
+
+
+def test_errores_de_conexion_son_errores_del_cluster():
+    with ServidorAPIFalso() as api:
+        url = api.url
+    with pytest.raises(ErrorCluster, match="no se pudo conectar"):
+        BackendHTTP(url, timeout=1).obtener("deployment", "web-deployment")
+
+
+def test_estado_canary_con_el_cluster_caido(tmp_path, monkeypatch, capsys):
+    kubectl = tmp_path / "kubectl"
+    kubectl.write_text("#!/bin/sh\necho 'connection refused' >&2\nexit 1\n")
+    kubectl.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    cluster_client.establecer_cliente(BackendKubectl())
+    try:
+        assert canary_manager.main(["--app", "web", "--status"]) == 1
+    finally:
+        cluster_client.establecer_cliente(None)
+    salida = capsys.readouterr().out
+    assert "STABLE\nError: connection refused" in salida
+    assert "CANARY\nError: connection refused" in salida
@@ -0,0 +1,105 @@
+import json
+from unittest import mock
+import pytest
+import yaml
+import src.cluster_client as cluster_client
+import src.manifest_generator as manifest_generator
+from src.checksum import (ANOTACION_CHECKSUM, anotar_manifiesto,
+                          calcular_checksum, checksum_objeto)
+
+
+deployment = """apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: test-app-deployment
+spec:
+  replicas: 2
+"""
+
+service = """apiVersion: v1
+kind: Service
+metadata:
+  name: test-app-service
+spec:
+  ports:
+  - port: 80
+"""
+
+
+def test_checksum_ignora_su_propia_anotacion():
+    objeto = yaml.safe_load(deployment)
+    anotado = yaml.safe_load(anotar_manifiesto(deployment))
+    assert checksum_objeto(anotado) == calcular_checksum(objeto)
+    assert calcular_checksum(anotado) == calcular_checksum(objeto)
+
+
+def test_checksum_cambia_con_el_contenido():
+    antes = yaml.safe_load(anotar_manifiesto(deployment))
+    despues = yaml.safe_load(anotar_manifiesto(
+        deployment.replace("replicas: 2", "replicas: 3")
+    ))
+    assert checksum_objeto(antes) != checksum_objeto(despues)
+
+
+@pytest.fixture(autouse=True)
+def backend_kubectl():
+    cluster_client.establecer_cliente(cluster_client.BackendKubectl())
+    yield
+    cluster_client.establecer_cliente(None)
+
+
+def kubectl_falso(vivos):
+    """
+    Simula kubectl: get devuelve los objetos vivos y apply los acepta
+    """
+    llamadas = []
+
+    def run(cmd, **kwargs):
+        llamadas.append((cmd, kwargs))
+        if cmd[1] == 'get' and '-o' in cmd:
+            return mock.Mock(returncode=0, stderr="", stdout=json.dumps(
+                {"kind": "List", "items": vivos}
+            ))
+        return mock.Mock(returncode=0, stdout="configured", stderr="")
+    return run, llamadas
+
+
+def test_despliegue_omite_objetos_sin_cambios(tmp_path, capsys):
+    (tmp_path / "deployment.yaml").write_text(anotar_manifiesto(deployment))
+    (tmp_path / "service.yaml").write_text(anotar_manifiesto(service))
+    vivo = yaml.safe_load(anotar_manifiesto(deployment))
+    run, llamadas = kubectl_falso([vivo])
+    with mock.patch('subprocess.run', side_effect=run):
+        assert manifest_generator.desplegar_manifiestos(str(tmp_path))
+    gets = [cmd for cmd, _ in llamadas
+            if cmd[1] == 'get' and '--ignore-not-found' in cmd]
+    assert len(gets) == 1
+    assert "deployment/test-app-deployment" in gets[0]
+    assert "service/test-app-service" in gets[0]
+    applies = [kwargs["input"] for cmd, kwargs in llamadas
+               if cmd[1] == 'apply']
+    assert len(applies) == 1
+    assert "test-app-service" in applies[0]
+    assert "test-app-deployment" not in applies[0]
+    assert ("1 objetos aplicados, 1 sin cambios omitidos"
+            in capsys.readouterr().out)
+
+
+def test_despliegue_sin_cambios_no_aplica(tmp_path, capsys):
+    (tmp_path / "deployment.yaml").write_text(anotar_manifiesto(deployment))
+    vivo = yaml.safe_load(anotar_manifiesto(deployment))
+    run, llamadas = kubectl_falso([vivo])
+    with mock.patch('subprocess.run', side_effect=run):
+        assert manifest_generator.desplegar_manifiestos(str(tmp_path))
+    assert not [cmd for cmd, _ in llamadas if cmd[1] == 'apply']
+    assert ("0 objetos aplicados, 1 sin cambios omitidos"
+            in capsys.readouterr().out)
+
+
+def test_objetos_sin_anotacion_siempre_se_aplican(tmp_path):
+    (tmp_path / "service.yaml").write_text(service)
+    run, llamadas = kubectl_falso([])
+    with mock.patch('subprocess.run', side_effect=run):
+        assert manifest_generator.desplegar_manifiestos(str(tmp_path))
+    assert [cmd[1] for cmd, _ in llamadas] == ['apply', 'get', 'get']
+    assert ANOTACION_CHECKSUM not in llamadas[0][1]["input"]
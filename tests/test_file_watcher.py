@@ -0,0 +1,92 @@
+import os
+import threading
+
+import pytest
+import yaml
+import src.build_cache as build_cache
+import src.file_watcher as file_watcher
+import src.manifest_generator as manifest_generator
+from tests.datos import TEMPLATES, values
+
+
+def escribir_despues(ruta, texto, segundos=0.05):
+    def escribir():
+        with open(ruta, "w") as f:
+            f.write(texto)
+    temporizador = threading.Timer(segundos, escribir)
+    temporizador.start()
+    return temporizador
+
+
+def test_polling_ve_archivos_nuevos_y_cambiados(tmp_path):
+    (tmp_path / "a.yaml").write_text("a: 1\n")
+    vigilante = file_watcher.VigilantePolling([str(tmp_path)],
+                                              intervalo=0.01)
+    assert vigilante.esperar(timeout=0.05) == set()
+    (tmp_path / "notas.txt").write_text("no se vigila")
+    (tmp_path / "b.yaml").write_text("b: 1\n")
+    (tmp_path / "a.yaml").write_text("a: 22\n")
+    assert vigilante.cambios(debounce=0.05) == {str(tmp_path / "a.yaml"),
+                                                str(tmp_path / "b.yaml")}
+
+
+def test_inotify_junta_una_rafaga_de_cambios(tmp_path):
+    ruta = tmp_path / "values.yaml"
+    ruta.write_text("a: 1\n")
+    try:
+        vigilante = file_watcher.crear_vigilante([str(ruta)], "inotify")
+    except OSError:
+        pytest.skip("inotify no disponible")
+    with vigilante:
+        escribir_despues(ruta, "a: 2\n").join()
+        otro = escribir_despues(tmp_path / "otro.yaml", "b: 1\n")
+        # Un editor que guarda con un archivo temporal y un rename
+        temporal = tmp_path / ".values.yaml.swp"
+        temporal.write_text("a: 3\n")
+        os.replace(temporal, ruta)
+        assert vigilante.cambios(debounce=0.1, timeout=2) == {str(ruta)}
+        otro.join()
+        assert vigilante.esperar(timeout=0.05) == set()
+
+
+class VigilanteGuionado:
+    nombre = "guionado"
+
+    def __init__(self, ruta_values):
+        self.ruta_values = ruta_values
+        self.ciclos = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def cambios(self, debounce):
+        self.ciclos += 1
+        if self.ciclos > 1:
+            raise KeyboardInterrupt
+        with open(self.ruta_values, "w") as f:
+            yaml.safe_dump(dict(values, service_port=9090), f)
+        return {self.ruta_values}
+
+
+def test_watch_regenera_solo_lo_que_cambio(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(build_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    ruta_values = str(tmp_path / "values.yaml")
+    with open(ruta_values, "w") as f:
+        yaml.safe_dump(values, f)
+    monkeypatch.setattr(file_watcher, "crear_vigilante",
+                        lambda rutas: VigilanteGuionado(ruta_values))
+    assert manifest_generator.main([
+        '-t', *TEMPLATES, '-v', ruta_values, '--validator', 'offline',
+        '-o', str(tmp_path / "out"), '--watch'
+    ]) == 0
+    salida = capsys.readouterr().out
+    assert "Vigilando templates y values con guionado" in salida
+    assert "Ciclo 1 (values.yaml): " in salida
+    # El deployment no usa service_port: sale del cache en memoria
+    ciclo = salida.split("Vigilando")[1]
+    assert ciclo.count("Manifiesto obtenido desde cache de build") == 1
+    assert "port: 9090" in (tmp_path / "out" / "service.yaml").read_text()
+    assert manifest_generator._memoria_build is None
@@ -0,0 +1,126 @@
+import threading
+
+import src.canary_manager as canary_manager
+import src.cluster_client as cluster_client
+from src.cluster_client import BackendHTTP, BackendMemoria, ErrorCluster
+from src.fleet_status import EstadoFlota, vigilar
+from tests.datos import deployment
+from tests.servidor_api_falso import ServidorAPIFalso
+
+
+def flota(cliente, apps, namespace="default"):
+    cliente.namespace = namespace
+    for app in apps:
+        cliente.crear(deployment(app, f"{app}:1"))
+    cliente.namespace = "default"
+
+
+def test_estado_une_stable_y_canary_por_app():
+    cliente = BackendMemoria()
+    flota(cliente, ["api", "web"])
+    flota(cliente, ["web"], namespace="staging")
+    for objeto in canary_manager.objetos_canary("web", "web:2", "ana"):
+        cliente.crear(objeto)
+    cliente.crear({"apiVersion": "apps/v1", "kind": "Deployment",
+                   "metadata": {"name": "suelto", "labels": {"app": "x"}},
+                   "spec": {"template": {"spec": {"containers": []}}}})
+    estado = EstadoFlota()
+    estado.cargar(cliente)
+    filas = [fila[:6] for fila in estado.filas()]
+    assert filas == [
+        ("api", "default", "api:1", "2/2", "<none>", "-"),
+        ("web", "default", "web:1", "2/2", "web:2", "1/1"),
+        ("web", "staging", "web:1", "2/2", "<none>", "-"),
+    ]
+    estado = EstadoFlota(["api"])
+    estado.cargar(cliente)
+    assert [fila[0] for fila in estado.filas()] == ["api"]
+
+
+def test_watch_actualiza_sin_volver_a_listar():
+    cliente = BackendMemoria()
+    flota(cliente, ["web"])
+    estado = EstadoFlota()
+    estado.cargar(cliente)
+    listados = []
+    cliente_listar = cliente.listar_version
+
+    def listar_version(*args, **kwargs):
+        listados.append(args)
+        return cliente_listar(*args, **kwargs)
+
+    cliente.listar_version = listar_version
+
+    def cambios():
+        for objeto in canary_manager.objetos_canary("web", "web:2"):
+            cliente.crear(objeto)
+        cliente.parchear("deployment", "web-canary", {"spec": {
+            "replicas": 3
+        }})
+        cliente.crear({"apiVersion": "v1", "kind": "Service",
+                       "metadata": {"name": "web", "labels": {"app": "web"}}})
+
+    vistas = []
+    hilo = threading.Timer(0.05, cambios)
+    hilo.start()
+    vigilar(cliente, estado, lambda e: vistas.append(e.filas()[0][4:6]),
+            duracion=0.3, timeout=0.1)
+    hilo.join()
+    assert vistas == [("web:2", "1/1"), ("web:2", "3/3")]
+    assert listados == []
+    assert estado.version == str(cliente.version)
+
+    cliente.eliminar("deployment", "web-canary")
+    vigilar(cliente, estado, lambda e: vistas.append(e.filas()[0][4:6]),
+            duracion=0.05, timeout=0.05)
+    assert vistas[-1] == ("<none>", "-")
+
+
+def test_version_expirada_vuelve_a_listar():
+    cliente = BackendMemoria(eventos=2)
+    flota(cliente, ["web"])
+    estado = EstadoFlota()
+    estado.cargar(cliente)
+    flota(cliente, ["a", "b", "c"])
+    vigilar(cliente, estado, lambda e: None, duracion=0.05, timeout=0.05)
+    assert [fila[0] for fila in estado.filas()] == ["a", "b", "c", "web"]
+
+
+def test_watch_por_http():
+    backend = BackendMemoria()
+    flota(backend, ["web"])
+    with ServidorAPIFalso(backend) as api:
+        cliente = BackendHTTP(api.url)
+        items, version = cliente.listar_version("deployment",
+                                                todos_namespaces=True)
+        assert len(items) == 1 and version == str(backend.version)
+        flota(backend, ["api"])
+        backend.eliminar("deployment", "web-deployment")
+        eventos = [(evento, objeto["metadata"]["name"])
+                   for evento, objeto in cliente.observar(
+                       "deployment", version, selector="app",
+                       todos_namespaces=True, timeout=1)]
+        assert eventos == [("ADDED", "api-deployment"),
+                           ("DELETED", "web-deployment")]
+        backend.eventos.clear()
+        backend.eventos.append((int(version) + 5, None, None, None))
+        try:
+            list(cliente.observar("deployment", version, timeout=1))
+        except ErrorCluster as e:
+            assert e.codigo == 410
+        else:
+            raise AssertionError("se esperaba un 410")
+
+
+def test_cli_fleet(capsys):
+    cliente = BackendMemoria()
+    flota(cliente, ["web"])
+    cluster_client.establecer_cliente(cliente)
+    try:
+        assert canary_manager.main(["--fleet"]) == 0
+    finally:
+        cluster_client.establecer_cliente(None)
+    salida = capsys.readouterr().out
+    assert "APP   NAMESPACE   IMAGE   READY   CANARY   CANARY-READY   AGE" \
+        in salida
+    assert "web   default     web:1   2/2     <none>   -" in salida
@@ -0,0 +1,166 @@
+import os
+from unittest import mock
+import yaml
+import src.build_cache as build_cache
+import src.manifest_generator as manifest_generator
+from tests.datos import TEMPLATES, escribir_flota, values
+
+
+def argumentos(ruta_values, output=None, jobs=1, no_cache=False):
+    argv = ['-t', *TEMPLATES, '-v', ruta_values, '-j', str(jobs)]
+    if output:
+        argv += ['-o', output]
+    if no_cache:
+        argv.append('--no-cache')
+    return manifest_generator.crear_parser().parse_args(argv)
+
+
+def kubectl_falso(directorio, monkeypatch):
+    bin_dir = directorio / "bin"
+    bin_dir.mkdir()
+    kubectl = bin_dir / "kubectl"
+    kubectl.write_text("#!/bin/sh\ncat > /dev/null\nexit 0\n")
+    kubectl.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+
+def test_resolver_values_directorio_y_glob(tmp_path):
+    """
+    Test que --values acepte un directorio o un glob
+    """
+    escribir_flota(tmp_path, ["b-app", "a-app"])
+    (tmp_path / "notas.txt").write_text("no es values")
+    esperados = [str(tmp_path / "a-app.yaml"), str(tmp_path / "b-app.yaml")]
+    assert manifest_generator.resolver_values(str(tmp_path)) == esperados
+    patron = str(tmp_path / "*-app.yaml")
+    assert manifest_generator.resolver_values(patron) == esperados
+    assert manifest_generator.es_flota(patron)
+    assert not manifest_generator.es_flota("templates/values.yaml")
+
+
+def test_renderizar_par_devuelve_error():
+    """
+    Test que un par invalido devuelva los mensajes como error
+    """
+    resultado = manifest_generator.renderizar_par(values, "no_existe.template")
+    assert resultado["manifiesto"] is None
+    assert "No se encontro el archivo" in resultado["error"]
+
+
+def test_generar_flota_valida_con_una_llamada(tmp_path):
+    """
+    Test que la flota valide todos los manifiestos con un solo kubectl
+    """
+    escribir_flota(tmp_path, ["app-1", "app-2"])
+    args = argumentos(str(tmp_path), no_cache=True)
+    mock_result = mock.Mock(returncode=0, stdout="", stderr="")
+    with mock.patch('subprocess.run', return_value=mock_result) as run:
+        assert manifest_generator.generar_flota(args) == 0
+    assert run.call_count == 1
+    assert run.call_args.kwargs["input"].count("kind: Deployment") == 2
+
+
+def test_generar_flota_subdirectorio_por_app(tmp_path, monkeypatch, capsys):
+    """
+    Test que la flota genere un subdirectorio de output por app
+    """
+    kubectl_falso(tmp_path, monkeypatch)
+    flota = tmp_path / "flota"
+    flota.mkdir()
+    escribir_flota(flota, ["app-1", "app-2", "app-3"])
+    output = tmp_path / "output"
+    args = argumentos(str(flota), output=str(output), jobs=2, no_cache=True)
+    assert manifest_generator.generar_flota(args) == 0
+    for app in ["app-1", "app-2", "app-3"]:
+        assert sorted(os.listdir(output / app)) == ["deployment.yaml",
+                                                    "service.yaml"]
+    assert "6 manifiestos exitosos, 0 fallidos" in capsys.readouterr().out
+
+
+def test_generar_flota_reporta_fallos(tmp_path, monkeypatch, capsys):
+    """
+    Test que los values invalidos o repetidos se reporten en el resumen
+    """
+    kubectl_falso(tmp_path, monkeypatch)
+    escribir_flota(tmp_path, ["app-1"])
+    with open(tmp_path / "copia.yaml", "w") as f:
+        yaml.safe_dump(dict(values, app_name="app-1"), f)
+    with open(tmp_path / "mala.yaml", "w") as f:
+        yaml.safe_dump(dict(values, replicas="dos"), f)
+    args = argumentos(str(tmp_path), no_cache=True)
+    assert manifest_generator.generar_flota(args) == 1
+    salida = capsys.readouterr().out
+    assert "2 manifiestos exitosos, 2 fallidos" in salida
+    assert "repetido" in salida
+
+
+def test_generar_flota_rechaza_app_name_fuera_del_output(tmp_path,
+                                                         monkeypatch, capsys):
+    """
+    Test que un app_name que no es un nombre DNS no arme rutas fuera del
+    output y se reporte como fallo
+    """
+    kubectl_falso(tmp_path, monkeypatch)
+    flota = tmp_path / "flota"
+    flota.mkdir()
+    escribir_flota(flota, ["app-1"])
+    for nombre, app_name in (("sube", "../fuera"),
+                             ("absoluta", str(tmp_path / "abs"))):
+        with open(flota / f"{nombre}.yaml", "w") as f:
+            yaml.safe_dump(dict(values, app_name=app_name), f)
+    output = tmp_path / "output"
+    args = argumentos(str(flota), output=str(output), no_cache=True)
+    assert manifest_generator.generar_flota(args) == 1
+    salida = capsys.readouterr().out
+    assert "2 manifiestos exitosos, 2 fallidos" in salida
+    assert "app_name invalido: '../fuera'" in salida
+    assert os.listdir(output) == ["app-1"]
+    assert not (tmp_path / "fuera").exists()
+    assert not (tmp_path / "abs").exists()
+
+
+def test_generar_flota_usa_cache_de_build(tmp_path, monkeypatch):
+    """
+    Test que una segunda ejecucion sin cambios no renderice ni valide
+    """
+    monkeypatch.setattr(build_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    flota = tmp_path / "flota"
+    flota.mkdir()
+    escribir_flota(flota, ["app-1", "app-2"])
+    args = argumentos(str(flota))
+    mock_result = mock.Mock(returncode=0, stdout="", stderr="")
+    with mock.patch('subprocess.run', return_value=mock_result) as run:
+        assert manifest_generator.generar_flota(args) == 0
+        assert manifest_generator.generar_flota(args) == 0
+    assert run.call_count == 1
+
+
+def test_flota_solo_renderiza_templates_afectados(tmp_path, monkeypatch,
+                                                  capsys):
+    """
+    Test que cambiar una clave solo vuelva a renderizar los templates que
+    la usan, y que las variables faltantes se avisen antes de renderizar
+    """
+    monkeypatch.setattr(build_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    flota = tmp_path / "flota"
+    flota.mkdir()
+    escribir_flota(flota, ["app-1"])
+    args = argumentos(str(flota))
+    mock_result = mock.Mock(returncode=0, stdout="", stderr="")
+    with mock.patch('subprocess.run', return_value=mock_result):
+        assert manifest_generator.generar_flota(args) == 0
+        # service_port solo lo usa service.yaml.template
+        with open(flota / "app-1.yaml", "w") as f:
+            yaml.safe_dump(dict(values, app_name="app-1", service_port=9090,
+                                sin_usar=1), f)
+        capsys.readouterr()
+        assert manifest_generator.generar_flota(args) == 0
+    assert "Renderizando 1 manifiestos de 1 apps" in capsys.readouterr().out
+    datos = {clave: valor for clave, valor in values.items()
+             if clave != "image"}
+    assert manifest_generator.avisar_faltantes(
+        datos, {"image": [TEMPLATES[0]], "replicas": [TEMPLATES[0]]},
+        "app-1.yaml"
+    ) == 1
+    assert "Aviso: app-1.yaml no define image, usada en " \
+        "deployment.yaml.template" in capsys.readouterr().out
@@ -0,0 +1,68 @@
+import json
+import os
+
+import yaml
+import src.manifest_generator as manifest_generator
+from src.metrics import Histograma, Metricas
+from tests.datos import TEMPLATES, escribir_flota, values
+
+
+def test_histograma_acumulativo():
+    histograma = Histograma(buckets=(0.01, 0.1))
+    for valor in (0.005, 0.05, 2):
+        histograma.observar(valor)
+    assert histograma.cuentas == [1, 2]
+    assert histograma.cantidad == 3
+
+
+def test_prometheus_textfile(tmp_path):
+    metricas = Metricas()
+    metricas.registrar("render", "deployment.yaml", 0.002)
+    metricas.incrementar("manifiestos_renderizados", 2)
+    ruta = tmp_path / "generador.prom"
+    metricas.exportar(str(ruta))
+    texto = ruta.read_text()
+    assert "manifest_generator_manifiestos_renderizados_total 2\n" in texto
+    assert ('manifest_generator_fase_segundos_bucket{fase="render",'
+            'le="0.005"} 1') in texto
+    assert 'manifest_generator_fase_segundos_count{fase="render"} 1' in texto
+    assert os.listdir(tmp_path) == ["generador.prom"]
+
+
+def test_timings_y_metricas_json(tmp_path, capsys):
+    (tmp_path / "flota").mkdir()
+    escribir_flota(tmp_path / "flota", ["a", "b"])
+    (tmp_path / "flota" / "mala.yaml").write_text(
+        yaml.safe_dump(dict(values, replicas=0))
+    )
+    codigo = manifest_generator.main([
+        '-t', *TEMPLATES, '-v', str(tmp_path / "flota"), '-j', '1',
+        '-o', str(tmp_path / "out"), '--validator', 'offline', '--no-cache',
+        '--timings', '--metrics', str(tmp_path / "m.json")
+    ])
+    assert codigo == 1
+    salida = capsys.readouterr().out
+    assert "OBJETIVO          CARGA-MS" in salida
+    metricas = json.loads((tmp_path / "m.json").read_text())
+    assert metricas["contadores"]["manifiestos_renderizados"] == 4
+    assert metricas["contadores"]["values_invalidos"] == 1
+    assert set(metricas["tiempos"]) == {"deployment.yaml", "service.yaml",
+                                        "values"}
+    assert set(metricas["tiempos"]["deployment.yaml"]) == {
+        "carga", "render", "validacion", "escritura"
+    }
+    assert metricas["histogramas"]["esquema"]["cantidad"] == 3
+
+
+def test_profile_guarda_estadisticas(tmp_path, capsys):
+    ruta_values = tmp_path / "values.yaml"
+    ruta_values.write_text(yaml.safe_dump(values))
+    perfil = tmp_path / "perfil.prof"
+    assert manifest_generator.main([
+        '-t', *TEMPLATES, '-v', str(ruta_values), '--validator', 'offline',
+        '--no-cache', '--profile', str(perfil), '--profile-top', '3'
+    ]) == 0
+    assert perfil.stat().st_size > 0
+    errores = capsys.readouterr().err
+    assert "Ordered by: cumulative time" in errores
+    assert "generar_individual" in errores
@@ -0,0 +1,146 @@
+import copy
+import pytest
+import src.offline_validator as offline_validator
+
+
+deployment = {
+    "apiVersion": "apps/v1",
+    "kind": "Deployment",
+    "metadata": {"name": "test-app-deployment", "labels": {"app": "test-app"}},
+    "spec": {
+        "replicas": 2,
+        "selector": {"matchLabels": {"app": "test-app"}},
+        "template": {
+            "metadata": {"labels": {"app": "test-app"}},
+            "spec": {
+                "containers": [{
+                    "name": "test-app",
+                    "image": "nginx:latest",
+                    "ports": [{"containerPort": 80}]
+                }]
+            }
+        }
+    }
+}
+
+service = {
+    "apiVersion": "v1",
+    "kind": "Service",
+    "metadata": {"name": "test-app-service"},
+    "spec": {
+        "selector": {"app": "test-app"},
+        "ports": [{"protocol": "TCP", "port": 8080, "targetPort": 80}]
+    }
+}
+
+
+@pytest.fixture(autouse=True)
+def limpiar_registrados():
+    yield
+    offline_validator._esquemas_registrados.clear()
+    offline_validator.obtener_validador.cache_clear()
+
+
+def test_objetos_validos():
+    assert offline_validator.errores_objeto(deployment) == []
+    assert offline_validator.errores_objeto(service) == []
+
+
+@pytest.mark.parametrize("ruta, valor", [
+    (("spec", "replicas"), "dos"),
+    (("spec", "template", "spec", "containers"), []),
+    (("metadata", "name"), "Nombre_Invalido"),
+    (("spec", "replikas"), 3),
+])
+def test_deployment_invalido(ruta, valor):
+    objeto = copy.deepcopy(deployment)
+    destino = objeto
+    for clave in ruta[:-1]:
+        destino = destino[clave]
+    destino[ruta[-1]] = valor
+    errores = offline_validator.errores_objeto(objeto)
+    assert errores
+    assert errores[0].startswith("Deployment/")
+
+
+def test_service_puerto_fuera_de_rango():
+    objeto = copy.deepcopy(service)
+    objeto["spec"]["ports"][0]["port"] = 70000
+    errores = offline_validator.errores_objeto(objeto)
+    assert len(errores) == 1
+    assert "$.spec.ports[0].port" in errores[0]
+
+
+def test_campos_no_modelados_se_aceptan():
+    objeto = copy.deepcopy(deployment)
+    pod = objeto["spec"]["template"]
+    pod["metadata"]["generateName"] = "web-"
+    pod["spec"].update({
+        "automountServiceAccountToken": False,
+        "hostAliases": [{"ip": "10.0.0.1", "hostnames": ["interno"]}],
+        "dnsConfig": {"nameservers": ["1.1.1.1"]},
+        "enableServiceLinks": False,
+        "schedulerName": "default-scheduler",
+        "runtimeClassName": "gvisor",
+    })
+    pod["spec"]["containers"][0].update({
+        "stdinOnce": False,
+        "resizePolicy": [{"resourceName": "cpu",
+                          "restartPolicy": "NotRequired"}],
+        "restartPolicy": "Always",
+    })
+    assert offline_validator.errores_objeto(objeto) == []
+    # Los campos modelados se siguen revisando
+    pod["spec"]["containers"][0]["image"] = 3
+    assert offline_validator.errores_objeto(objeto)
+    objeto = copy.deepcopy(service)
+    objeto["spec"]["trafficDistribution"] = "PreferClose"
+    assert offline_validator.errores_objeto(objeto) == []
+
+
+def test_tipo_sin_esquema():
+    objeto = {"apiVersion": "v1", "kind": "ConfigMap",
+              "metadata": {"name": "config"}}
+    errores = offline_validator.errores_objeto(objeto)
+    assert "no hay esquema" in errores[0]
+
+
+def test_registrar_esquema_nuevo_tipo():
+    offline_validator.registrar_esquema("v1", "ConfigMap", {
+        "type": "object",
+        "required": ["data"],
+        "properties": {"data": {"type": "object"}}
+    })
+    objeto = {"apiVersion": "v1", "kind": "ConfigMap",
+              "metadata": {"name": "config"}}
+    assert offline_validator.errores_objeto(objeto)
+    objeto["data"] = {"clave": "valor"}
+    assert offline_validator.errores_objeto(objeto) == []
+
+
+def test_validador_se_compila_una_vez():
+    primero = offline_validator.obtener_validador("apps/v1", "Deployment")
+    segundo = offline_validator.obtener_validador("apps/v1", "Deployment")
+    assert primero is segundo
+
+
+def test_esquema_no_compilable_usa_jsonschema():
+    offline_validator.registrar_esquema("v1", "ConfigMap", {
+        "type": "object",
+        "oneOf": [{"required": ["data"]}, {"required": ["binaryData"]}]
+    })
+    objeto = {"apiVersion": "v1", "kind": "ConfigMap",
+              "metadata": {"name": "config"}}
+    assert offline_validator.errores_objeto(objeto)
+    objeto["data"] = {}
+    assert offline_validator.errores_objeto(objeto) == []
+
+
+def test_validar_lote_offline():
+    manifiesto_malo = "apiVersion: v1\nkind: Service\nmetadata: {}\n"
+    errores = offline_validator.validar_manifiestos_offline_lote([
+        ("bueno", "apiVersion: v1\nkind: Service\nmetadata:\n  name: svc\n"),
+        ("malo", manifiesto_malo),
+    ])
+    assert errores["bueno"] is None
+    assert "'name' is a required property" in errores["malo"]
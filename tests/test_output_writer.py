@@ -0,0 +1,50 @@
+import os
+from src.output_writer import ESCRITO, SIN_CAMBIOS, EscritorManifiestos
+
+
+def test_no_reescribe_archivo_sin_cambios(tmp_path):
+    ruta = tmp_path / "out" / "deployment.yaml"
+    escritor = EscritorManifiestos()
+    assert escritor.escribir("kind: Deployment\n", str(ruta)) == ESCRITO
+    mtime = os.stat(ruta).st_mtime_ns
+    assert escritor.escribir("kind: Deployment\n", str(ruta)) == SIN_CAMBIOS
+    assert os.stat(ruta).st_mtime_ns == mtime
+    assert escritor.escribir("kind: Service\n", str(ruta)) == ESCRITO
+    assert ruta.read_text() == "kind: Service\n"
+    assert (escritor.escritos, escritor.sin_cambios) == (2, 1)
+
+
+def test_escritura_atomica_no_deja_temporales(tmp_path):
+    escritor = EscritorManifiestos()
+    for i in range(3):
+        escritor.escribir(f"replicas: {i}\n", str(tmp_path / "app.yaml"))
+    assert os.listdir(tmp_path) == ["app.yaml"]
+    assert os.stat(tmp_path / "app.yaml").st_mode & 0o777 != 0o600
+
+
+def test_directorio_se_crea_una_vez(tmp_path, monkeypatch):
+    escritor = EscritorManifiestos()
+    llamadas = []
+    makedirs = os.makedirs
+
+    def makedirs_contado(directorio, **kwargs):
+        llamadas.append(directorio)
+        makedirs(directorio, **kwargs)
+    monkeypatch.setattr(os, "makedirs", makedirs_contado)
+    escritor.escribir("a: 1\n", str(tmp_path / "app" / "a.yaml"))
+    escritor.escribir("b: 1\n", str(tmp_path / "app" / "b.yaml"))
+    assert len(llamadas) == 1
+
+
+def test_podar_elimina_manifiestos_no_producidos(tmp_path):
+    (tmp_path / "viejo").mkdir()
+    (tmp_path / "viejo" / "service.yaml").write_text("kind: Service\n")
+    (tmp_path / "notas.txt").write_text("no es manifiesto")
+    escritor = EscritorManifiestos()
+    escritor.escribir("kind: Deployment\n",
+                      str(tmp_path / "app" / "deployment.yaml"))
+    eliminados = escritor.podar(str(tmp_path))
+    assert eliminados == [str(tmp_path / "viejo" / "service.yaml")]
+    assert sorted(os.listdir(tmp_path)) == ["app", "notas.txt"]
+    assert escritor.resumen() == ("Archivos: 1 escritos, 0 sin cambios, "
+                                  "1 eliminados")
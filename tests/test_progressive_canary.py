@@ -0,0 +1,184 @@
+import pytest
+import src.canary_manager as canary_manager
+import src.cluster_client as cluster_client
+import src.progressive_canary as progressive_canary
+from src.cluster_client import BackendMemoria
+from src.progressive_canary import (CanaryProgresivo, Planificador,
+                                    RelojSimulado, gate_siempre)
+
+
+def stable(app, replicas=4):
+    etiquetas = {"app": app}
+    return {
+        "apiVersion": "apps/v1",
+        "kind": "Deployment",
+        "metadata": {"name": f"{app}-deployment", "labels": etiquetas},
+        "spec": {
+            "replicas": replicas,
+            "selector": {"matchLabels": etiquetas},
+            "template": {
+                "metadata": {"labels": etiquetas},
+                "spec": {"containers": [{"name": app, "image": "app:1"}]}
+            }
+        }
+    }
+
+
+def replicas(cliente, nombre):
+    deployment = cliente.obtener("deployment", nombre)
+    return deployment["spec"]["replicas"] if deployment else None
+
+
+def planificador_simulado():
+    reloj = RelojSimulado()
+    return Planificador(reloj=reloj, dormir=reloj.dormir)
+
+
+def test_planificador_intercala_tareas_por_tiempo():
+    planificador = planificador_simulado()
+    eventos = []
+
+    def tarea(nombre, demoras):
+        def ejecutar():
+            eventos.append((planificador.reloj(), nombre))
+            return demoras.pop(0) if demoras else None
+        return ejecutar
+
+    planificador.programar(0, tarea("a", [10, 10]))
+    planificador.programar(5, tarea("b", [10]))
+    planificador.ejecutar()
+    assert eventos == [(0, "a"), (5, "b"), (10, "a"), (15, "b"), (20, "a")]
+
+
+def test_replicas_canary():
+    assert [progressive_canary.replicas_canary(4, peso)
+            for peso in (0, 10, 25, 50, 100)] == [0, 1, 1, 2, 4]
+
+
+def test_simulacion_avanza_las_apps_en_paralelo():
+    canaries, planificador, _ = progressive_canary.simular(200, espera=60)
+    assert {canary.resultado for canary in canaries} == {"completado"}
+    # Los 4 pasos de todas las apps se solapan en el tiempo
+    assert planificador.reloj() == 240
+    assert planificador.ejecuciones == 200 * 5
+
+
+def test_canary_completo_promueve_y_elimina_el_canary():
+    cliente = BackendMemoria()
+    cliente.crear(stable("web"))
+    pesos = []
+
+    def gate(cliente, app, canary):
+        pesos.append((replicas(cliente, canary),
+                      replicas(cliente, "web-deployment")))
+        return True, "ok"
+
+    canaries = progressive_canary.ejecutar_canaries(
+        cliente, ["web"], "app:2", espera=10, gate=gate,
+        planificador=planificador_simulado()
+    )
+    assert canaries[0].resultado == "completado"
+    assert pesos == [(1, 3), (1, 3), (2, 2), (4, 0)]
+    vivo = cliente.obtener("deployment", "web-deployment")
+    assert vivo["spec"]["replicas"] == 4
+    assert vivo["spec"]["template"]["spec"]["containers"][0]["image"] == \
+        "app:2"
+    assert cliente.obtener("deployment", "web-canary") is None
+
+
+def test_control_de_salud_fallido_revierte():
+    cliente = BackendMemoria()
+    cliente.crear(stable("web"))
+    planificador = planificador_simulado()
+    canary = CanaryProgresivo(
+        cliente, "web", "app:2", espera=10, reloj=planificador.reloj,
+        gate=lambda cliente, app, canary: (
+            replicas(cliente, canary) < 2, "errores 5xx"
+        )
+    )
+    planificador.programar(0, canary)
+    planificador.ejecutar()
+    assert canary.resultado == "abortado"
+    assert "paso 50%" in canary.detalle
+    assert replicas(cliente, "web-deployment") == 4
+    assert cliente.obtener("deployment", "web-canary") is None
+
+
+def test_control_de_salud_sin_respuesta_vence():
+    cliente = BackendMemoria()
+    cliente.crear(stable("web"))
+    planificador = planificador_simulado()
+    canary = CanaryProgresivo(
+        cliente, "web", "app:2", espera=10, intervalo=5, timeout_paso=60,
+        gate=lambda *args: (None, "sin metricas"), reloj=planificador.reloj
+    )
+    planificador.programar(0, canary)
+    planificador.ejecutar()
+    assert canary.resultado == "abortado"
+    assert canary.detalle == "timeout en el paso 10%: sin metricas"
+    assert planificador.reloj() == 60
+
+
+def test_stable_sin_contenedor_de_la_app_aborta():
+    cliente = BackendMemoria()
+    deployment = stable("web")
+    deployment["spec"]["template"]["spec"]["containers"][0]["name"] = "main"
+    cliente.crear(deployment)
+    canaries = progressive_canary.ejecutar_canaries(
+        cliente, ["web"], "app:2", gate=gate_siempre,
+        planificador=planificador_simulado()
+    )
+    assert canaries[0].resultado == "abortado"
+    assert canaries[0].detalle == "el deployment no tiene un contenedor web"
+    assert cliente.obtener("deployment", "web-canary") is None
+    assert replicas(cliente, "web-deployment") == 4
+
+
+def test_canary_de_otro_pipeline_no_se_toca():
+    cliente = BackendMemoria()
+    cliente.crear(stable("web"))
+    ajeno = progressive_canary.objeto_canary(stable("web"), "app:3", "web",
+                                             "otro")
+    ajeno["spec"]["replicas"] = 2
+    cliente.crear(ajeno)
+    canaries = progressive_canary.ejecutar_canaries(
+        cliente, ["web"], "app:2", gate=gate_siempre,
+        planificador=planificador_simulado()
+    )
+    assert canaries[0].resultado == "abortado"
+    assert "ya existe" in canaries[0].detalle
+    vivo = cliente.obtener("deployment", "web-canary")
+    assert vivo["spec"]["template"]["spec"]["containers"][0]["image"] == \
+        "app:3"
+    assert vivo["spec"]["replicas"] == 2
+    assert replicas(cliente, "web-deployment") == 4
+
+
+def gate_de_prueba(cliente, app, canary):
+    return True, "gate de prueba"
+
+
+def test_cli_progresivo(capsys):
+    cliente = BackendMemoria()
+    for app in ("web", "api"):
+        cliente.crear(stable(app))
+    cluster_client.establecer_cliente(cliente)
+    try:
+        assert canary_manager.main([
+            "--app", "web", "api", "--progressive", "app:2", "--dwell", "0",
+            "--steps", "50,100",
+            "--gate", "tests.test_progressive_canary:gate_de_prueba"
+        ]) == 0
+        assert canary_manager.main(["--app", "otra", "--progressive",
+                                    "app:2", "--dwell", "0"]) == 1
+    finally:
+        cluster_client.establecer_cliente(None)
+    salida = capsys.readouterr().out
+    assert "pasos 50/100%" in salida
+    assert "no encontrado" in salida
+
+
+@pytest.mark.parametrize("pasos", ["10,5,100", "10,50", "0,100", "x"])
+def test_pasos_invalidos(pasos):
+    with pytest.raises(ValueError):
+        canary_manager.leer_pasos(pasos)
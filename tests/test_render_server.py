@@ -0,0 +1,150 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import yaml
+import src.render_client as render_client
+import src.render_server as render_server
+from tests.datos import values
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NOMBRES = ["deployment.yaml.template", "service.yaml.template"]
+
+
+@pytest.fixture
+def socket_render(tmp_path):
+    ruta = str(tmp_path / "render.sock")
+    servidor = render_server.crear_servidor(ruta)
+    hilo = threading.Thread(target=servidor.serve_forever)
+    hilo.start()
+    yield ruta
+    servidor.shutdown()
+    servidor.server_close()
+    hilo.join()
+
+
+def test_clientes_concurrentes(socket_render):
+    def pedir(numero):
+        return render_client.pedir({
+            "templates": NOMBRES,
+            "values": dict(values, app_name=f"app-{numero}")
+        }, socket_render)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        respuestas = list(pool.map(pedir, range(16)))
+    for numero, respuesta in enumerate(respuestas):
+        assert respuesta["errores"] == []
+        documentos = [yaml.safe_load(documento["contenido"])
+                      for documento in respuesta["documentos"]]
+        assert [d["metadata"]["name"] for d in documentos] == [
+            f"app-{numero}-deployment", f"app-{numero}-service"
+        ]
+
+
+def test_errores_de_values_y_de_manifiesto(socket_render):
+    respuesta = render_client.pedir({
+        "templates": NOMBRES, "values": dict(values, replicas=0)
+    }, socket_render)
+    assert respuesta["documentos"] == []
+    assert respuesta["errores"] == [
+        "values $.replicas: 0 is less than the minimum of 1"
+    ]
+    respuesta = render_client.pedir({
+        "templates": ["no_existe.template"], "values": values
+    }, socket_render)
+    assert respuesta["errores"] == [
+        "no_existe.template: no se pudo cargar el template"
+    ]
+
+
+def test_peticion_mal_formada_no_corta_la_conexion(socket_render):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conexion:
+        conexion.connect(socket_render)
+        conexion.sendall(json.dumps({
+            "templates": NOMBRES, "values": values, "set": [1]
+        }).encode() + b"\n" + json.dumps({
+            "templates": NOMBRES, "values": values
+        }).encode() + b"\n")
+        with conexion.makefile('rb') as respuestas:
+            mala = json.loads(respuestas.readline())
+            buena = json.loads(respuestas.readline())
+    assert mala["documentos"] == []
+    assert mala["errores"][0].startswith("peticion invalida: TypeError")
+    assert buena["errores"] == []
+    assert len(buena["documentos"]) == 2
+
+
+def test_cliente_escribe_el_output(socket_render, tmp_path, capsys):
+    ruta_values = tmp_path / "values.yaml"
+    ruta_values.write_text(yaml.safe_dump(values))
+    assert render_client.main([
+        '-t', *NOMBRES, '-v', str(ruta_values), '--set', 'replicas=5',
+        '-o', str(tmp_path / "out"), '-s', socket_render
+    ]) == 0
+    deployment = yaml.safe_load(
+        (tmp_path / "out" / "deployment.yaml").read_text()
+    )
+    assert deployment["spec"]["replicas"] == 5
+    assert "Render: 2 manifiestos, 0 errores" in capsys.readouterr().err
+    # Una segunda pasada igual no reescribe los archivos
+    ruta = tmp_path / "out" / "deployment.yaml"
+    os.utime(ruta, ns=(0, 0))
+    assert render_client.main([
+        '-t', *NOMBRES, '-v', str(ruta_values), '--set', 'replicas=5',
+        '-o', str(tmp_path / "out"), '-s', socket_render
+    ]) == 0
+    assert ruta.stat().st_mtime_ns == 0
+    assert "Archivos: 0 escritos, 2 sin cambios" in capsys.readouterr().err
+    assert sorted(os.listdir(tmp_path / "out")) == ["deployment.yaml",
+                                                    "service.yaml"]
+
+
+def test_manifiesto_invalido_no_se_guarda(socket_render, tmp_path, capsys):
+    invalido = tmp_path / "roto.yaml.template"
+    invalido.write_text(
+        "apiVersion: v1\nkind: Service\n"
+        "metadata: {name: '{{ app_name }}-service'}\n"
+        "spec: {ports: [{port: abc}]}\n"
+    )
+    respuesta = render_client.pedir({
+        "templates": [NOMBRES[0], str(invalido)], "values": values
+    }, socket_render)
+    assert respuesta["documentos"] == []
+    assert respuesta["errores"] == [
+        "roto.yaml: Service/test-app-service: $.spec.ports[0].port: 'abc' "
+        "is not of type 'integer'"
+    ]
+    ruta_values = tmp_path / "values.yaml"
+    ruta_values.write_text(yaml.safe_dump(values))
+    assert render_client.main([
+        '-t', NOMBRES[0], str(invalido), '-v', str(ruta_values),
+        '-o', str(tmp_path / "out"), '-s', socket_render
+    ]) == 1
+    assert not (tmp_path / "out").exists()
+    assert "NO son validos" in capsys.readouterr().err
+
+
+def test_socket_ocupado_y_sin_servidor(socket_render, tmp_path, capsys):
+    with pytest.raises(OSError):
+        render_server.crear_servidor(socket_render)
+    assert render_client.main([
+        '-t', *NOMBRES, '-v', 'values.yaml',
+        '-s', str(tmp_path / "otro.sock")
+    ]) == 1
+    assert "no se pudo usar el servidor de render" in \
+        capsys.readouterr().err
+
+
+def test_cliente_no_importa_dependencias_pesadas():
+    codigo = (
+        "import sys; sys.path.insert(0, 'src'); import render_client; "
+        "print(sorted({'yaml', 'jinja2', 'jsonschema'} & set(sys.modules)))"
+    )
+    salida = subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ,
+                            capture_output=True, text=True, check=True)
+    assert salida.stdout.strip() == "[]"
@@ -0,0 +1,87 @@
+import os
+import pytest
+import yaml
+import src.cluster_client as cluster_client
+import src.manifest_generator as manifest_generator
+import src.revision_ledger as revision_ledger
+import src.rollback_manager as rollback_manager
+from src.cluster_client import BackendMemoria
+from src.revision_ledger import Ledger
+
+TEMPLATES = [os.path.abspath(os.path.join("templates", nombre)) for nombre in
+             ("deployment.yaml.template", "service.yaml.template")]
+
+
+def contar_blobs(directorio):
+    return sum(len(archivos) for _, _, archivos
+               in os.walk(os.path.join(directorio, "blobs")))
+
+
+def test_ledger_deduplica_manifiestos(tmp_path):
+    ledger = Ledger(str(tmp_path))
+    service = "kind: Service\n"
+    assert ledger.registrar("web", [("deployment.yaml", "image: 1\n"),
+                                    ("service.yaml", service)])
+    assert ledger.registrar("web", [("deployment.yaml", "image: 1\n"),
+                                    ("service.yaml", service)]) is None
+    assert ledger.registrar("web", [("deployment.yaml", "image: 2\n"),
+                                    ("service.yaml", service)])
+    assert ledger.registrar("api", [("service.yaml", service)])
+    assert contar_blobs(str(tmp_path)) == 3
+    assert [e["revision"] for e in ledger.historial("web")] == [1, 2]
+    assert ledger.apps() == ["api", "web"]
+    assert ledger.buscar("web")["revision"] == 1
+    assert ledger.buscar("web", 2)["revision"] == 2
+    assert ledger.buscar("web", 9) is None
+    assert ledger.buscar("api") is None
+    with pytest.raises(ValueError):
+        ledger.historial("../otra")
+
+
+@pytest.fixture
+def cluster(tmp_path, monkeypatch):
+    monkeypatch.setattr(revision_ledger, "LEDGER_DIR",
+                        str(tmp_path / "ledger"))
+    backend = BackendMemoria()
+    cluster_client.establecer_cliente(backend)
+    yield backend
+    cluster_client.establecer_cliente(None)
+
+
+def desplegar(tmp_path, imagen, puerto):
+    values = tmp_path / "values.yaml"
+    values.write_text(yaml.safe_dump({
+        "app_name": "web", "protocol": "TCP", "image": imagen,
+        "replicas": 2, "container_port": 80, "service_port": puerto
+    }))
+    return manifest_generator.main([
+        "-t", *TEMPLATES, "-v", str(values), "-o", str(tmp_path / "output"),
+        "--validator", "offline", "--no-cache", "--deploy"
+    ])
+
+
+def test_rollback_desde_el_ledger(cluster, tmp_path, capsys):
+    assert desplegar(tmp_path, "nginx:1", 8080) == 0
+    assert desplegar(tmp_path, "nginx:2", 9090) == 0
+    historial = Ledger().historial("web")
+    assert [e["origen"] for e in historial] == ["deploy", "deploy"]
+    assert historial[0]["values"] != historial[1]["values"]
+    assert sorted(historial[0]["manifiestos"]) == ["deployment.yaml",
+                                                   "service.yaml"]
+    capsys.readouterr()
+
+    assert rollback_manager.main(["--rollback", "web", "--ledger"]) == 0
+    assert "Rollback completado exitosamente" in capsys.readouterr().out
+    deployment = cluster.obtener("deployment", "web-deployment")
+    contenedor = deployment["spec"]["template"]["spec"]["containers"][0]
+    assert contenedor["image"] == "nginx:1"
+    # El service tambien vuelve a la revision anterior
+    service = cluster.obtener("service", "web-service")
+    assert service["spec"]["ports"][0]["port"] == 8080
+
+    assert rollback_manager.main(["--history", "web", "--ledger"]) == 0
+    salida = capsys.readouterr().out
+    assert "rollback a revision 1" in salida
+    assert len(Ledger().historial("web")) == 3
+    assert rollback_manager.main(["--rollback", "web", "--ledger",
+                                  "--rollback-revision", "7"]) == 1
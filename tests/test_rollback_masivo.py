@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+
+import pytest
+import src.cluster_client as cluster_client
+import src.rollback_manager as rollback_manager
+from src.cluster_client import BackendMemoria
+
+
+def deployment(app, imagen, tier="backend"):
+    etiquetas = {"app": app}
+    return {
+        "apiVersion": "apps/v1",
+        "kind": "Deployment",
+        "metadata": {"name": f"{app}-deployment",
+                     "labels": dict(etiquetas, tier=tier)},
+        "spec": {
+            "replicas": 1,
+            "selector": {"matchLabels": etiquetas},
+            "template": {
+                "metadata": {"labels": etiquetas},
+                "spec": {"containers": [{"name": app, "image": imagen}]}
+            }
+        }
+    }
+
+
+class BackendContado(BackendMemoria):
+    def __init__(self):
+        super().__init__()
+        self.listados = 0
+        self.fallos = 0
+
+    def listar(self, tipo, namespace=None, selector=None):
+        if tipo == "deployment":
+            self.listados += 1
+            if self.fallos:
+                self.fallos -= 1
+                raise cluster_client.ErrorCluster("servicio no disponible",
+                                                  503)
+        return super().listar(tipo, namespace, selector)
+
+
+@pytest.fixture
+def cluster():
+    backend = BackendContado()
+    for app in ("web", "api", "worker"):
+        backend.aplicar([deployment(app, "app:1")])
+        backend.aplicar([deployment(app, "app:2")])
+    backend.aplicar([deployment("front", "app:1", tier="frontend")])
+    cluster_client.establecer_cliente(backend)
+    yield backend
+    cluster_client.establecer_cliente(None)
+
+
+def imagen(backend, app):
+    vivo = backend.obtener("deployment", f"{app}-deployment")
+    return vivo["spec"]["template"]["spec"]["containers"][0]["image"]
+
+
+def test_rollback_masivo_con_un_listado_por_vuelta(cluster):
+    resultados = rollback_manager.rollback_masivo(
+        ["web-deployment", "api-deployment", "otra-deployment"], jobs=2
+    )
+    assert resultados["web-deployment"]["resultado"] == "ok"
+    assert resultados["api-deployment"]["resultado"] == "ok"
+    assert resultados["otra-deployment"]["resultado"] == "error"
+    assert "no encontrado" in resultados["otra-deployment"]["detalle"]
+    assert imagen(cluster, "web") == "app:1"
+    assert imagen(cluster, "worker") == "app:2"
+    assert cluster.listados == 1
+
+
+def test_rollback_masivo_respeta_los_timeouts(cluster):
+    # Sin controlador los rollouts nunca terminan
+    cluster.reconciliar = False
+    inicio = time.monotonic()
+    resultados = rollback_manager.rollback_masivo(
+        ["web-deployment", "api-deployment"], timeout=0.2,
+        intervalo=0.05
+    )
+    assert time.monotonic() - inicio < 1
+    assert {datos["resultado"] for datos in resultados.values()} == \
+        {"timeout"}
+    resultados = rollback_manager.rollback_masivo(
+        ["web-deployment"], timeout=5, timeout_global=0.1, intervalo=0.05
+    )
+    assert resultados["web-deployment"]["resultado"] == "timeout global"
+
+
+def test_rollback_masivo_reintenta_el_listado(cluster):
+    cluster.fallos = 2
+    resultados = rollback_manager.rollback_masivo(
+        ["web-deployment", "api-deployment"], intervalo=0.01
+    )
+    assert {datos["resultado"] for datos in resultados.values()} == {"ok"}
+    assert cluster.listados == 3
+    cluster.fallos = 1000
+    resultados = rollback_manager.rollback_masivo(
+        ["web-deployment"], timeout=0.2, intervalo=0.05
+    )
+    assert resultados["web-deployment"] == dict(
+        resultados["web-deployment"], resultado="timeout",
+        detalle="error consultando el cluster: servicio no disponible"
+    )
+
+
+def test_undo_colgado_vence_con_el_limite_global(cluster):
+    liberar = threading.Event()
+
+    def deshacer_uno(nombre):
+        if nombre == "web-deployment":
+            liberar.wait(5)
+        else:
+            cluster.deshacer_rollout(nombre)
+
+    inicio = time.monotonic()
+    try:
+        resultados = rollback_manager.rollback_masivo(
+            ["web-deployment", "api-deployment", "worker-deployment"],
+            jobs=1, timeout_global=0.3, intervalo=0.05,
+            deshacer_uno=deshacer_uno
+        )
+    finally:
+        liberar.set()
+    assert time.monotonic() - inicio < 1
+    # Con un solo hilo los que esperaban turno tampoco llegan a empezar
+    assert {nombre: datos["resultado"]
+            for nombre, datos in resultados.items()} == {
+        "web-deployment": "timeout global",
+        "api-deployment": "timeout global",
+        "worker-deployment": "timeout global",
+    }
+    assert resultados["web-deployment"]["detalle"] == \
+        "el undo no termino antes del limite global"
+
+
+def test_plazo_corta_el_undo_por_kubectl(tmp_path, monkeypatch):
+    kubectl = tmp_path / "kubectl"
+    kubectl.write_text("#!/bin/sh\nexec sleep 5\n")
+    kubectl.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    cluster_client.establecer_cliente(cluster_client.BackendKubectl())
+    inicio = time.monotonic()
+    try:
+        resultados = rollback_manager.rollback_masivo(
+            ["web-deployment", "api-deployment"], timeout=0.3,
+            timeout_global=5
+        )
+    finally:
+        cluster_client.establecer_cliente(None)
+    assert time.monotonic() - inicio < 2
+    assert {datos["resultado"] for datos in resultados.values()} == \
+        {"timeout"}
+    assert "kubectl no respondio" in resultados["web-deployment"]["detalle"]
+
+
+def test_rollback_por_selector(cluster, capsys):
+    assert rollback_manager.main(["--selector", "tier=backend"]) == 0
+    salida = capsys.readouterr().out
+    assert "3 de 3 rollbacks completados" in salida
+    assert "front-deployment" not in salida
+    assert imagen(cluster, "worker") == "app:1"
+    assert imagen(cluster, "front") == "app:1"
+    assert rollback_manager.main(["--rollback", "web", "front"]) == 1
+    salida = capsys.readouterr().out
+    assert "DEPLOYMENT" in salida and "no hay una revision anterior" in salida
@@ -0,0 +1,115 @@
+import os
+import subprocess
+import sys
+
+import pytest
+import yaml
+import src.cluster_client as cluster_client
+import src.manifest_generator as manifest_generator
+from src.cluster_client import BackendMemoria
+from tests.datos import TEMPLATES, escribir_flota, values
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLANTILLAS = [os.path.join(RAIZ, template) for template in TEMPLATES]
+
+
+@pytest.fixture
+def directorio(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "values.yaml").write_text(yaml.safe_dump(values))
+    return tmp_path
+
+
+def test_output_stdout_es_un_stream_yaml(directorio, capsys):
+    assert manifest_generator.main([
+        '-t', *PLANTILLAS, '-v', 'values.yaml', '--validator', 'offline',
+        '-o', '-'
+    ]) == 0
+    capturado = capsys.readouterr()
+    documentos = list(yaml.safe_load_all(capturado.out))
+    assert [d["kind"] for d in documentos] == ["Deployment", "Service"]
+    assert capturado.out.startswith("---\n")
+    assert "Manifiesto deployment.yaml.template válido" in capturado.err
+    assert "Manifiesto generado:" not in capturado.err
+    # Solo el cache de build toca el disco
+    assert sorted(os.listdir(directorio)) == [".manifest-cache",
+                                              "values.yaml"]
+
+
+def test_flota_a_stdout_en_modo_silencioso(directorio, capsys):
+    (directorio / "flota").mkdir()
+    escribir_flota(directorio / "flota", ["b", "a"])
+    assert manifest_generator.main([
+        '-t', *PLANTILLAS, '-v', 'flota', '-j', '1', '--no-cache',
+        '--validator', 'offline', '-o', '-', '--quiet'
+    ]) == 0
+    capturado = capsys.readouterr()
+    nombres = [d["metadata"]["name"]
+               for d in yaml.safe_load_all(capturado.out)]
+    assert nombres == ["a-deployment", "a-service", "b-deployment",
+                       "b-service"]
+    assert "Renderizando" not in capturado.err
+    assert "Resumen flota: 2 values, 4 manifiestos exitosos" in capturado.err
+
+
+def test_quiet_no_muestra_los_manifiestos(directorio, capsys):
+    assert manifest_generator.main([
+        '-t', *PLANTILLAS, '-v', 'values.yaml', '--validator', 'offline',
+        '-o', 'out', '--quiet'
+    ]) == 0
+    assert capsys.readouterr().out == ""
+    assert sorted(os.listdir(directorio / "out")) == ["deployment.yaml",
+                                                      "service.yaml"]
+
+
+def test_deploy_desde_memoria(directorio, monkeypatch, capsys):
+    cliente = BackendMemoria()
+    cluster_client.establecer_cliente(cliente)
+
+    def leer_output(*args):
+        raise AssertionError("no se debe releer el output")
+
+    monkeypatch.setattr(manifest_generator, "leer_objetos_output",
+                        leer_output)
+    try:
+        assert manifest_generator.main([
+            '-t', *PLANTILLAS, '-v', 'values.yaml', '--validator',
+            'offline', '-o', '-', '--deploy'
+        ]) == 0
+    finally:
+        cluster_client.establecer_cliente(None)
+    assert cliente.obtener("deployment", "test-app-deployment") is not None
+    assert cliente.obtener("service", "test-app-service") is not None
+    capturado = capsys.readouterr()
+    assert "Despliegue exitoso! 2 objetos aplicados" in capturado.err
+    assert len(list(yaml.safe_load_all(capturado.out))) == 2
+
+
+def test_prune_necesita_un_directorio(directorio, capsys):
+    assert manifest_generator.main([
+        '-t', *PLANTILLAS, '-v', 'values.yaml', '-o', '-', '--prune'
+    ]) == 1
+    assert "--prune necesita --output" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("flota", [False, True])
+def test_pipe_cerrado_termina_sin_traceback(directorio, flota):
+    if flota:
+        (directorio / "flota").mkdir()
+        escribir_flota(directorio / "flota", ["a", "b"])
+    # El lector ya cerro su extremo, como | head al terminar
+    lectura, escritura = os.pipe()
+    os.close(lectura)
+    try:
+        proceso = subprocess.run(
+            [sys.executable, "-m", "src", "render", "-t", *PLANTILLAS,
+             "-v", "flota" if flota else "values.yaml", "--validator",
+             "offline", "--no-cache", "-o", "-"],
+            cwd=directorio, stdout=escritura, stderr=subprocess.PIPE,
+            env=dict(os.environ, PYTHONPATH=RAIZ), text=True
+        )
+    finally:
+        os.close(escritura)
+    assert proceso.returncode == 1
+    assert "Traceback" not in proceso.stderr
+    assert "BrokenPipeError" not in proceso.stderr
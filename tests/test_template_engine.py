@@ -0,0 +1,97 @@
+import os
+import pytest
+import src.template_engine as template_engine
+
+
+@pytest.fixture(autouse=True)
+def entorno_limpio(tmp_path, monkeypatch):
+    monkeypatch.setattr(template_engine, "BYTECODE_DIR",
+                        str(tmp_path / "bytecode"))
+    template_engine.reiniciar_entorno()
+    yield
+    template_engine.reiniciar_entorno()
+
+
+def test_template_compilado_se_reutiliza(tmp_path):
+    """
+    Test que el mismo archivo sin cambios no se vuelve a compilar
+    """
+    ruta = tmp_path / "app.yaml.template"
+    ruta.write_text("name: {{ app_name }}\n")
+    primero = template_engine.obtener_template(str(ruta))
+    segundo = template_engine.obtener_template(str(ruta))
+    assert primero is segundo
+    assert primero.render(app_name="demo") == "name: demo"
+
+
+def test_template_se_recompila_si_cambia_mtime(tmp_path):
+    """
+    Test que editar el archivo invalida el template en memoria
+    """
+    ruta = tmp_path / "app.yaml.template"
+    ruta.write_text("name: {{ app_name }}\n")
+    primero = template_engine.obtener_template(str(ruta))
+    ruta.write_text("nombre: {{ app_name }}\n")
+    stat = os.stat(ruta)
+    os.utime(ruta, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    segundo = template_engine.obtener_template(str(ruta))
+    assert primero is not segundo
+    assert segundo.render(app_name="demo") == "nombre: demo"
+
+
+def test_bytecode_se_persiste_en_disco(tmp_path):
+    """
+    Test que la compilacion deja bytecode reutilizable por otra ejecucion
+    """
+    template_engine.obtener_template_desde_texto("replicas: {{ replicas }}")
+    assert os.listdir(template_engine.BYTECODE_DIR)
+    template_engine.reiniciar_entorno()
+    template = template_engine.obtener_template_desde_texto(
+        "replicas: {{ replicas }}"
+    )
+    assert template.render(replicas=3) == "replicas: 3"
+
+
+def test_template_de_templates_dir():
+    """
+    Test que los templates del repo se cargan por el FileSystemLoader
+    """
+    ruta = os.path.join(template_engine.TEMPLATES_DIR,
+                        "service.yaml.template")
+    template = template_engine.obtener_template(ruta)
+    assert template.name == "service.yaml.template"
+
+
+def test_template_inexistente():
+    """
+    Test manejo de template que no existe
+    """
+    assert template_engine.obtener_template("no_existe.template") is None
+
+
+def test_variables_del_template():
+    """
+    Test que se detecten las variables que el template lee de los values
+    """
+    variables = template_engine.variables_template(
+        "{% set puerto = service_port %}\n"
+        "name: {{ app_name }}-{{ puerto }}\n"
+        "{% for e in entorno %}{{ e.nombre }}: {{ range(3)|length }}"
+        "{% endfor %}\n"
+    )
+    assert variables == {"app_name", "service_port", "entorno"}
+    mapa = template_engine.mapa_dependencias({
+        "a.template": {"app_name", "image"}, "b.template": {"app_name"}
+    })
+    assert mapa == {"app_name": ["a.template", "b.template"],
+                    "image": ["a.template"]}
+
+
+def test_variables_desconocidas_con_include():
+    """
+    Test que un template que incluye otros dependa de todos los values
+    """
+    assert template_engine.variables_template(
+        "{% include 'base.template' %}"
+    ) is None
+    assert template_engine.variables_template("{{ sin_cerrar") is None
@@ -1,5 +1,6 @@
 from unittest import mock
-from src.manifest_generator import validar_manifiesto_k8s
+from src.manifest_generator import (validar_manifiesto_k8s,
+                                    validar_manifiestos_k8s_lote)
 
 
 def test_validar_manifiesto_k8s_valido():
@@ -63,3 +64,63 @@ def test_validar_manifiesto_k8s_exception():
     ])
     with mock.patch('subprocess.run', side_effect=Exception("otro error")):
         assert validar_manifiesto_k8s(manifiesto, "test-pod.yaml") is False
+
+
+def pod(nombre):
+    return "\n".join([
+        "apiVersion: v1",
+        "kind: Pod",
+        "metadata:",
+        f"  name: {nombre}",
+        "spec:",
+        "  containers:",
+        "  - name: test",
+        "    image: nginx",
+    ])
+
+
+def test_validar_lote_una_sola_llamada_por_stdin():
+    mock_result = mock.Mock(returncode=0, stdout="", stderr="")
+    with mock.patch('subprocess.run', return_value=mock_result) as run:
+        errores = validar_manifiestos_k8s_lote([("a", pod("pod-a")),
+                                                ("b", pod("pod-b"))])
+    assert errores == {"a": None, "b": None}
+    assert run.call_count == 1
+    assert run.call_args.args[0][-2:] == ['-f', '-']
+    assert "pod-a" in run.call_args.kwargs["input"]
+    assert "pod-b" in run.call_args.kwargs["input"]
+
+
+def test_validar_lote_asigna_error_al_objeto():
+    mock_result = mock.Mock(
+        returncode=1,
+        stdout="pod/pod-a created (dry run)\n",
+        stderr='The Pod "pod-b" is invalid: spec.containers: Required\n'
+    )
+    with mock.patch('subprocess.run', return_value=mock_result) as run:
+        errores = validar_manifiestos_k8s_lote([("a", pod("pod-a")),
+                                                ("b", pod("pod-b"))])
+    assert errores["a"] is None
+    assert "pod-b" in errores["b"]
+    assert run.call_count == 1
+
+
+def test_validar_lote_errores_sin_nombre_se_revalidan():
+    lote = mock.Mock(returncode=1, stdout="",
+                     stderr="error: error validating data\n")
+    valido = mock.Mock(returncode=0, stdout="", stderr="")
+    invalido = mock.Mock(returncode=1, stdout="",
+                         stderr="error: error validating data\n")
+    with mock.patch('subprocess.run',
+                    side_effect=[lote, valido, invalido]) as run:
+        errores = validar_manifiestos_k8s_lote([("a", pod("pod-a")),
+                                                ("b", pod("pod-b"))])
+    assert errores["a"] is None
+    assert "error validating data" in errores["b"]
+    assert run.call_count == 3
+
+
+def test_validar_lote_kubectl_no_encontrado():
+    with mock.patch('subprocess.run', side_effect=FileNotFoundError):
+        errores = validar_manifiestos_k8s_lote([("a", pod("pod-a"))])
+    assert "kubectl no encontrado" in errores["a"]
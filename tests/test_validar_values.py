@@ -1,4 +1,7 @@
-from src.manifest_generator import validar_values
+import io
+import json
+from src.manifest_generator import (errores_values, validar_archivos_values,
+                                    validar_values)
 
 
 def test_validar_values_campo_faltante():
@@ -58,3 +61,33 @@ def test_validar_values_valido():
         "service_port": 80
     }
     assert validar_values(values) is True
+
+
+def test_errores_values_reporta_todos_con_ruta():
+    values = {
+        "app_name": "mi-app",
+        "protocol": "TCP",
+        "image": "nginx!@",
+        "replicas": "tres",
+        "container_port": 898989
+    }
+    errores = errores_values(values)
+    rutas = [error["ruta"] for error in errores]
+    assert rutas == ["$", "$.container_port", "$.image", "$.replicas"]
+    assert "'service_port' is a required property" in errores[0]["mensaje"]
+
+
+def test_validar_archivos_values_reporte_jsonl(tmp_path):
+    (tmp_path / "ok.yaml").write_text(
+        "app_name: a\nprotocol: TCP\nimage: nginx\nreplicas: 1\n"
+        "container_port: 80\nservice_port: 80\n"
+    )
+    (tmp_path / "roto.yaml").write_text("app_name: [sin cerrar\n")
+    reporte = io.StringIO()
+    rutas = [str(tmp_path / "ok.yaml"), str(tmp_path / "roto.yaml"),
+             str(tmp_path / "no_existe.yaml")]
+    assert validar_archivos_values(rutas, reporte) == 2
+    lineas = [json.loads(linea) for linea in reporte.getvalue().splitlines()]
+    assert [linea["valido"] for linea in lineas] == [True, False, False]
+    assert "YAML invalido" in lineas[1]["errores"][0]["mensaje"]
+    assert lineas[2]["errores"][0]["mensaje"] == "archivo no encontrado"
@@ -0,0 +1,99 @@
+import pytest
+import yaml
+import src.manifest_generator as manifest_generator
+import src.values_layers as values_layers
+from tests.datos import TEMPLATES, values
+
+
+def test_fusion_profunda_comparte_la_base():
+    base = {"recursos": {"cpu": "100m", "memoria": "128Mi"},
+            "etiquetas": {"equipo": "web"}, "puertos": [80]}
+    capa = {"recursos": {"cpu": "500m"}, "puertos": [443],
+            "etiquetas": None}
+    fusion = values_layers.fusionar(base, capa)
+    assert fusion == {"recursos": {"cpu": "500m", "memoria": "128Mi"},
+                      "puertos": [443]}
+    assert base["recursos"]["cpu"] == "100m"
+    assert "etiquetas" in base
+    # Los subarboles que la capa no toca no se copian
+    assert values_layers.fusionar(base, {"x": 1})["recursos"] is \
+        base["recursos"]
+
+
+def test_set_interpreta_tipos():
+    capa = values_layers.capa_asignaciones([
+        "replicas=3", "recursos.limits.cpu=500m", "debug=true",
+        "recursos.limits.memoria=1Gi", "vacio="
+    ])
+    assert capa == {"replicas": 3, "debug": True, "vacio": "",
+                    "recursos": {"limits": {"cpu": "500m",
+                                            "memoria": "1Gi"}}}
+    with pytest.raises(ValueError):
+        values_layers.leer_asignacion("replicas")
+
+
+def test_set_null_elimina_la_clave_de_la_base(tmp_path):
+    ruta = tmp_path / "base.yaml"
+    ruta.write_text(yaml.safe_dump({
+        "debug": True, "etiquetas": {"equipo": "web", "tier": "front"}
+    }))
+    asignaciones = values_layers.capa_asignaciones([
+        "debug=null", "etiquetas.tier=null", "nuevo=null", "nuevo=1"
+    ])
+    assert asignaciones == {"debug": None, "etiquetas": {"tier": None},
+                            "nuevo": 1}
+    fusion = manifest_generator.aplicar_capas(
+        values_layers.fusionar_capas([str(ruta)]), dict(values),
+        asignaciones
+    )
+    assert fusion == dict(values, etiquetas={"equipo": "web"}, nuevo=1)
+
+
+def test_capas_base_se_leen_una_vez(tmp_path, monkeypatch):
+    ruta = tmp_path / "base.yaml"
+    ruta.write_text(yaml.safe_dump({"replicas": 2}))
+    lecturas = []
+    leer_capa = values_layers.leer_capa
+
+    def contar(ruta_capa):
+        lecturas.append(ruta_capa)
+        return leer_capa(ruta_capa)
+
+    monkeypatch.setattr(values_layers, "leer_capa", contar)
+    primera = values_layers.fusionar_capas([str(ruta)])
+    assert values_layers.fusionar_capas([str(ruta)]) is primera
+    assert len(lecturas) == 1
+    # Un cambio en el archivo invalida la fusion memorizada
+    ruta.write_text(yaml.safe_dump({"replicas": 30}))
+    assert values_layers.fusionar_capas([str(ruta)]) == {"replicas": 30}
+    assert len(lecturas) == 2
+
+
+def test_flota_con_capa_base_y_set(tmp_path):
+    (tmp_path / "flota").mkdir()
+    comunes = {k: v for k, v in values.items() if k != "app_name"}
+    for app in ("a", "b"):
+        (tmp_path / "flota" / f"{app}.yaml").write_text(
+            yaml.safe_dump({"app_name": app, "replicas": 4})
+        )
+    (tmp_path / "base.yaml").write_text(yaml.safe_dump(comunes))
+    assert manifest_generator.main([
+        '-t', *TEMPLATES, '-v', str(tmp_path / "base.yaml"),
+        '-v', str(tmp_path / "flota"), '--set', 'image=nginx:1.27',
+        '-j', '1', '--no-cache', '--validator', 'offline',
+        '-o', str(tmp_path / "out")
+    ]) == 0
+    for app in ("a", "b"):
+        deployment = yaml.safe_load(
+            (tmp_path / "out" / app / "deployment.yaml").read_text()
+        )
+        assert deployment["spec"]["replicas"] == 4
+        contenedor = deployment["spec"]["template"]["spec"]["containers"][0]
+        assert contenedor["image"] == "nginx:1.27"
+
+
+def test_set_invalido_es_error_de_uso(capsys):
+    with pytest.raises(SystemExit):
+        manifest_generator.main(['-t', *TEMPLATES, '-v', 'values.yaml',
+                                 '--set', 'replicas'])
+    assert "--set invalido" in capsys.readouterr().err
@@ -0,0 +1,41 @@
+import yaml
+import src.manifest_generator as manifest_generator
+import src.yaml_io as yaml_io
+from benchmarks import yaml_parsing
+from tests.datos import values
+
+
+def test_misma_salida_con_y_sin_libyaml(monkeypatch):
+    texto = yaml.safe_dump_all([values, {"lista": [1, "dos", None]}])
+    con_libyaml = list(yaml_io.cargar_todos(texto))
+    volcado = yaml_io.volcar_todos(con_libyaml, sort_keys=False)
+    monkeypatch.setattr(yaml_io, "Cargador", yaml.SafeLoader)
+    monkeypatch.setattr(yaml_io, "Volcador", yaml.SafeDumper)
+    assert list(yaml_io.cargar_todos(texto)) == con_libyaml
+    assert yaml_io.volcar_todos(con_libyaml, sort_keys=False) == volcado
+
+
+def test_values_se_parsean_una_vez(tmp_path, monkeypatch):
+    ruta = tmp_path / "values.yaml"
+    ruta.write_text(yaml.safe_dump(values))
+    parseos = []
+    cargar = yaml_io.cargar
+
+    def contar(stream):
+        parseos.append(stream)
+        return cargar(stream)
+
+    monkeypatch.setattr(yaml_io, "cargar", contar)
+    primero = manifest_generator.cargar_values(str(ruta))
+    assert manifest_generator.cargar_values(str(ruta)) is primero
+    assert len(parseos) == 1
+    ruta.write_text(yaml.safe_dump(dict(values, replicas=10)))
+    assert manifest_generator.cargar_values(str(ruta))["replicas"] == 10
+    assert len(parseos) == 2
+
+
+def test_benchmark_de_lectura():
+    resultado = yaml_parsing.ejecutar(cantidad_apps=2, lecturas=2,
+                                      repeticiones=1)
+    assert set(resultado["modos"]) == set(yaml_parsing.MODOS)
+    assert resultado["modos"]["python"]["aceleracion"] == 1.0